@@ -0,0 +1,230 @@
+# bulk decoder for archived uplinks: every chunk of messages is decoded a column at a time with NumPy (one array
+# per fport, read with a fixed-width structured dtype or unpacked into bits) instead of one message at a time
+# TTN exports of any size are streamed: JSON lines, or a single JSON array, of uplink messages (optionally wrapped
+# in {"result": ...} as returned by the Storage Integration API); the layouts come from software/schema.py through
+# payload.tables(), so this decodes exactly like payload.decode and the TTN formatter: every frame with the schema
+# version of its length, so frames of boxes on older firmware are decoded too; frames that are not decoded (too
+# short, unknown fport, diagnostics) are counted and reported
+#
+# usage (from the extras folder):
+#   python bulk.py export.json                      decode, and count the frames per fport
+#   python bulk.py export.json --csv decoded        write decoded/fport_<n>.csv for every fport
+#   python bulk.py export.json --verify             also decode every frame with payload.decode, and compare
+import argparse
+import base64
+import csv
+import json
+import os
+import sys
+
+import numpy as np
+
+import payload
+
+CHUNK = 100000                                      # messages decoded at once
+_READ = 1 << 20                                     # characters read from the export at once
+_SEPARATORS = ' \t\r\n[],'                          # between the messages of JSON lines or a JSON array
+
+def messages(f, read = _READ):
+    """Yield the messages of a TTN export file object, reading read characters at a time."""
+    decoder = json.JSONDecoder()
+    buffer, position, eof = '', 0, False
+    while True:
+        while position < len(buffer) and buffer[position] in _SEPARATORS:
+            position += 1
+        try:
+            if position == len(buffer):
+                raise ValueError
+            message, position = decoder.raw_decode(buffer, position)
+        except ValueError:                          # the buffer ends before the message does
+            if eof:
+                if buffer[position:].strip(_SEPARATORS):
+                    raise ValueError("invalid JSON at the end of the export")
+                return
+            data = f.read(read)
+            eof = not data
+            buffer, position = buffer[position:] + data, 0
+            continue
+        yield message.get('result', message)
+
+def uplinks(f, read = _READ):
+    """Yield (device, received_at, fport, payload) of every uplink with a payload in a TTN export."""
+    for message in messages(f, read):
+        uplink = message.get('uplink_message')
+        if not uplink or 'frm_payload' not in uplink:
+            continue                                # join accepts, downlink events and the like
+        yield (message.get('end_device_ids', {}).get('device_id', ''), message.get('received_at', ''),
+               uplink.get('f_port', 0), base64.b64decode(uplink['frm_payload']))
+
+def _dtype(layout):
+    """Structured dtype of a byte aligned frame: big endian integers, 3 byte fields as a subarray of bytes."""
+    fields = []
+    for key, bits, offset, precision, decimals, masks in layout:
+        size = bits // 8
+        fields.append((key, '>u{}'.format(size)) if size in (1, 2, 4) else (key, 'u1', (size,)))
+    return np.dtype(fields)
+
+def _mark_missing(columns, raw, masks):
+    """Set the measurements that the bits of the raw miss column mark as missing (bit 0: masks[0]) to None; such a
+    column becomes an object array."""
+    for i, key in enumerate(masks):
+        missing = (raw >> i & 1).astype(bool)
+        if missing.any():
+            columns[key] = columns[key].astype(object)
+            columns[key][missing] = None
+
+def decode_column(payloads, layout):
+    """Decode a list of payloads of the same layout (at least as long as the frame) to {key: array}; a field with
+    missing measurements is an object array, with None for them."""
+    size = (sum(field[1] for field in layout) + 7) // 8
+    data = b''.join(payload[:size] for payload in payloads)
+    columns = {}
+    marked = []
+    if all(field[1] % 8 == 0 for field in layout):
+        frames = np.frombuffer(data, _dtype(layout))
+        for key, bits, offset, precision, decimals, masks in layout:
+            raw = frames[key].astype(np.int64)
+            if raw.ndim == 2:                       # big endian bytes to integer
+                raw = (raw << (8 * np.arange(raw.shape[1] - 1, -1, -1))).sum(axis = 1)
+            columns[key] = np.round(raw * precision - offset, decimals)
+            if masks:
+                marked.append((raw, masks))
+    else:
+        bits = np.unpackbits(np.frombuffer(data, np.uint8).reshape(len(payloads), size), axis = 1)
+        position = 0
+        for key, length, offset, precision, decimals, masks in layout:
+            weights = 1 << np.arange(length - 1, -1, -1, dtype = np.int64)
+            raw = bits[:, position:position + length] @ weights
+            columns[key] = np.round(raw * precision - offset, decimals)
+            if masks:
+                marked.append((raw, masks))
+            position += length
+    for raw, masks in marked:
+        _mark_missing(columns, raw, masks)
+    return columns
+
+def decode_chunk(chunk, layout):
+    """Decode a list of (device, received_at, fport, payload) to {fport: {column: array}}, with the columns device,
+    received_at (and record, for batches) before the fields. Every frame is decoded with the schema version of its
+    length (payload.select); fields that an older version lacks are None. Diagnostics (fport 3), unknown fports and
+    frames that are too short are not decoded but counted: returns (decoded, {fport: frames skipped})."""
+    layouts, names, not_run, batch, version = layout
+    rows, skipped, selections = {}, {}, {}
+    for device, received_at, fport, data in chunk:
+        shape = (fport, len(data), data[0] if fport == batch and data else 0)   # all select() looks at
+        if shape not in selections:
+            selections[shape] = payload.select(fport, data, layout) if fport in layouts else None
+        selected = selections[shape]
+        if selected is None:
+            skipped[fport] = skipped.get(fport, 0) + 1
+            continue
+        frame_version, fields = selected
+        if fport == batch:                          # one row per record
+            size = payload.frame_size(fields)
+            for i in range(data[0]):
+                rows.setdefault(fport, []).append((device, received_at, i, frame_version,
+                                                   data[1 + i * size:1 + (i + 1) * size]))
+        else:
+            rows.setdefault(fport, []).append((device, received_at, frame_version, data))
+    decoded = {}
+    for fport, frames in rows.items():
+        columns = {'device': np.array([frame[0] for frame in frames]),
+                   'received_at': np.array([frame[1] for frame in frames])}
+        if fport == batch:
+            columns['record'] = np.array([frame[2] for frame in frames])
+        keys = []                                   # the fields of every version, newest first
+        for frame_version, fields in layouts[fport]:
+            keys += [field[0] for field in fields if field[0] not in keys]
+        everywhere = set.intersection(*(set(field[0] for field in fields) for frame_version, fields in layouts[fport]))
+        versions = np.array([frame[-2] for frame in frames])
+        for frame_version, fields in layouts[fport]:
+            index = np.flatnonzero(versions == frame_version)
+            if not len(index):
+                continue
+            for key, values in decode_column([frames[i][-1] for i in index], fields).items():
+                if key not in columns:
+                    columns[key] = np.empty(len(frames), values.dtype) if key in everywhere else \
+                                   np.full(len(frames), None, object)
+                elif values.dtype == object and columns[key].dtype != object:
+                    columns[key] = columns[key].astype(object)      # missing measurements in this version only
+                columns[key][index] = values
+        for key in keys:                            # a field of a version without frames in this chunk
+            if key not in columns:
+                columns[key] = np.full(len(frames), None, object)
+        decoded[fport] = {key: columns[key] for key in list(columns)[:3 if fport == batch else 2] + keys}
+    return decoded, skipped
+
+def chunks(f, size = CHUNK, read = _READ):
+    """Yield the uplinks of a TTN export in lists of at most size."""
+    chunk = []
+    for uplink in uplinks(f, read):
+        chunk.append(uplink)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def verify(chunk, decoded, layout):
+    """Compare the bulk decoded chunk with payload.decode, frame by frame. Returns the number of differences."""
+    layouts, names, not_run, batch, version = layout
+    expected = {}
+    for device, received_at, fport, data in chunk:
+        try:
+            frame = payload.decode(fport, data, layout)
+        except (ValueError, IndexError):
+            continue
+        if fport in layouts:
+            expected.setdefault(fport, []).extend(frame['records'] if fport == batch else [frame])
+    errors = 0
+    for fport, frames in expected.items():
+        columns = decoded.get(fport, {})
+        for i, frame in enumerate(frames):
+            for key, value in frame.items():
+                if key not in columns or i >= len(columns[key]) or columns[key][i] != value:
+                    errors += 1
+    return errors
+
+def main():
+    parser = argparse.ArgumentParser(description = "Decode a TTN export of MJLO uplinks in bulk")
+    parser.add_argument('export', help = "TTN export: JSON lines or a JSON array of uplink messages ('-': stdin)")
+    parser.add_argument('--csv', metavar = 'DIR', help = "write the decoded frames to DIR/fport_<n>.csv")
+    parser.add_argument('--verify', action = 'store_true', help = "compare every frame with payload.decode")
+    parser.add_argument('--chunk', type = int, default = CHUNK, help = "messages decoded at once")
+    args = parser.parse_args()
+
+    layout = payload.tables()
+    counts, skipped, errors, files = {}, {}, 0, {}
+    f = sys.stdin if args.export == '-' else open(args.export)
+    try:
+        for chunk in chunks(f, args.chunk):
+            decoded, dropped = decode_chunk(chunk, layout)
+            for fport, count in dropped.items():
+                skipped[fport] = skipped.get(fport, 0) + count
+            if args.verify:
+                errors += verify(chunk, decoded, layout)
+            for fport, columns in decoded.items():
+                counts[fport] = counts.get(fport, 0) + len(columns['device'])
+                if args.csv:
+                    if fport not in files:
+                        os.makedirs(args.csv, exist_ok = True)
+                        files[fport] = open(os.path.join(args.csv, 'fport_{}.csv'.format(fport)), 'w', newline = '')
+                        csv.writer(files[fport]).writerow(columns)
+                    csv.writer(files[fport]).writerows(zip(*(column.tolist() for column in columns.values())))
+    finally:
+        for output in files.values():
+            output.close()
+        if f is not sys.stdin:
+            f.close()
+
+    for fport in sorted(counts):
+        print("fport {}: {} {}".format(fport, counts[fport], "records" if fport == layout[3] else "frames"))
+    for fport in sorted(skipped):
+        reason = "diagnostics" if fport == 3 else "too short" if fport in layout[0] else "unknown fport"
+        print("fport {}: {} frames skipped ({})".format(fport, skipped[fport], reason))
+    if args.verify:
+        print("{} differences with payload.decode".format(errors))
+        sys.exit(1 if errors else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+# energy per wake cycle, split into phases, from a current trace: either a bench measurement (CSV export of the
+# multimeter, like power_consumption.csv) or a cycle of the simulator; projects the battery life from it
+# and serves as a benchmark that fails when the energy per cycle regresses
+#
+# usage (from the extras folder):
+#   python energy.py power_consumption.csv                  analyse a bench measurement
+#   python energy.py --simulate 4                           analyse simulated cycles (power-on cycle + 4 timer wakes)
+#   python energy.py --compare old.csv new.csv              exit 1 if new uses more energy per cycle than old
+#   python energy.py --simulate 4 --baseline energy_baseline.json [--update]
+#                                                           exit 1 if the simulated cycles regress against the baseline
+import argparse
+import csv
+import json
+import os
+import sys
+
+CAPACITY_MAH = 5200                                 # KP26650 battery
+T_INT = 600                                         # default interval between wake cycles (NVS 't_int') in seconds
+
+# phase boundaries in mA, see classify()
+SLEEP_MA = 5.0                                      # below this the box is in deepsleep
+DISPLAY_MA = 20.0                                   # light sleep with the display on stays below this
+SENSING_MA = 80.0                                   # the SDS011 fan alone draws 110 mA
+
+PHASES = ('boot', 'sensing', 'lora', 'display', 'sleep')
+_UNITS = {'A': 1000.0, 'mA': 1.0, 'uA': 0.001, 'µA': 0.001}
+
+def load_csv(path):
+    """Read a multimeter export (index, DC, value, unit, hh:mm:ss, date) as a list of (start s, duration s, mA).
+    The timestamps only have a resolution of one second, so the samples are spread evenly over the whole trace."""
+    samples, seconds = [], []
+    with open(path, newline = '') as f:
+        for row in csv.reader(f):
+            row = [field.strip() for field in row]
+            if len(row) < 5 or row[3] not in _UNITS:
+                continue
+            samples.append(float(row[2]) * _UNITS[row[3]])
+            h, m, s = (int(x) for x in row[4].split(':'))
+            seconds.append(3600 * h + 60 * m + s)
+    if not samples:
+        raise ValueError("no samples in {}".format(path))
+    duration = (seconds[-1] - seconds[0]) % 86400 + 1
+    step = duration / len(samples)
+    return [(n * step, step, ma) for n, ma in enumerate(samples)]
+
+def classify(trace, sleep_ma = SLEEP_MA, display_ma = DISPLAY_MA, sensing_ma = SENSING_MA):
+    """Label every segment of a single cycle with a phase: the box boots until the SDS011 fan starts (sensing, which
+    includes the GPS fix), transmits until the current drops to light sleep level (lora), shows the display and
+    finally enters deepsleep. Returns a list of (phase, start s, duration s, mA)."""
+    awake = [i for i, (t, s, ma) in enumerate(trace) if ma >= sleep_ma]
+    end = awake[-1] + 1 if awake else 0             # first segment of the final deepsleep
+    sensing = [i for i in range(end) if trace[i][2] >= sensing_ma]
+    first = sensing[0] if sensing else end
+    last = first
+    while last < end and trace[last][2] >= sensing_ma:
+        last += 1
+    low = [i for i in range(last, end) if trace[i][2] < display_ma]
+    hold = low[-1] if low else end                  # the display is shown until the last light sleep segment
+    lora = [i for i in range(last, hold) if trace[i][2] >= display_ma]
+    after = lora[-1] + 1 if lora else last
+
+    labelled = []
+    for i, (t, s, ma) in enumerate(trace):
+        if i >= end:
+            phase = 'sleep'
+        elif i < first:
+            phase = 'boot'
+        elif i < last:
+            phase = 'sensing'
+        elif i < after:
+            phase = 'lora'
+        else:
+            phase = 'display'
+        labelled.append((phase, t, s, ma))
+    return labelled
+
+def spans(labelled):
+    """Merge consecutive segments of the same phase into (phase, start s, duration s)."""
+    merged = []
+    for phase, t, s, ma in labelled:
+        if merged and merged[-1][0] == phase:
+            merged[-1][2] += s
+        else:
+            merged.append([phase, t, s])
+    return [tuple(span) for span in merged]
+
+class Profile:
+    """Time and charge per phase of one wake cycle."""
+    def __init__(self, trace, name = ''):
+        self.name = name
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.mAh = dict.fromkeys(PHASES, 0.0)
+        for phase, t, s, ma in classify(trace):
+            self.seconds[phase] += s
+            self.mAh[phase] += s * ma / 3600
+
+    @property
+    def awake_s(self):
+        return sum(self.seconds[phase] for phase in PHASES if phase != 'sleep')
+
+    @property
+    def awake_mAh(self):
+        return sum(self.mAh[phase] for phase in PHASES if phase != 'sleep')
+
+    @property
+    def sleep_ma(self):
+        """Deepsleep current; falls back to the simulator value for traces that end awake."""
+        return self.mAh['sleep'] * 3600 / self.seconds['sleep'] if self.seconds['sleep'] else 2.4
+
+    def cycle_mAh(self, t_int = T_INT):
+        """Charge of a complete cycle: the awake part, then deepsleep for the remainder of the interval."""
+        return self.awake_mAh + self.sleep_ma * max(0, t_int - self.awake_s) / 3600
+
+    def battery_days(self, t_int = T_INT, capacity = CAPACITY_MAH):
+        return capacity / (self.cycle_mAh(t_int) * 86400 / t_int)
+
+    def report(self, t_int = T_INT, capacity = CAPACITY_MAH):
+        lines = ["{}".format(self.name)] if self.name else []
+        lines.append("{:>8} {:>9} {:>9} {:>8} {:>6}".format("phase", "time (s)", "mA (avg)", "mAh", "share"))
+        total = self.cycle_mAh(t_int)
+        for phase in PHASES:
+            seconds, mAh = self.seconds[phase], self.mAh[phase]
+            if phase == 'sleep':                    # projected onto the interval instead of the measured length
+                seconds, mAh = max(0, t_int - self.awake_s), total - self.awake_mAh
+            average = mAh * 3600 / seconds if seconds else 0
+            lines.append("{:>8} {:>9.1f} {:>9.1f} {:>8.4f} {:>5.1f}%".format(
+                         phase, seconds, average, mAh, 100 * mAh / total if total else 0))
+        lines.append("{:>8} {:>9.1f} {:>9} {:>8.4f}".format("cycle", t_int, "", total))
+        lines.append("battery life at t_int = {} s: {:.1f} days ({} mAh)".format(
+                     t_int, self.battery_days(t_int, capacity), capacity))
+        return "\n".join(lines)
+
+def simulate(cycles, seed = 0):
+    """Run the simulator for a power-on cycle plus a number of timer wakes, returning a Profile of each cycle."""
+    from simulator import Simulator
+    sim = Simulator(seed = seed)
+    profiles = []
+    for n, cycle in enumerate(sim.run(1 + cycles)):
+        if cycle.exit != 'deepsleep':
+            raise RuntimeError("simulated cycle {} ended in {} ({!r})".format(n, cycle.exit, cycle.error))
+        profiles.append(Profile(cycle.trace, "simulated cycle {} ({})".format(n, "power-on" if n == 0 else "timer")))
+    return profiles
+
+def metrics(profiles, t_int = T_INT):
+    """Benchmark figures: energy of the power-on cycle (GPS fix) and the mean of the timer wake cycles."""
+    first, rest = profiles[0], profiles[1:] or profiles[:1]
+    return {'poweron_mAh': round(first.cycle_mAh(t_int), 5),
+            'cycle_mAh':   round(sum(p.cycle_mAh(t_int) for p in rest) / len(rest), 5),
+            'awake_s':     round(sum(p.awake_s for p in rest) / len(rest), 3)}
+
+def regressions(old, new, tolerance):
+    """Names of the figures in which new exceeds old by more than the (relative) tolerance."""
+    return [key for key in ('poweron_mAh', 'cycle_mAh')
+            if key in old and key in new and new[key] > old[key] * (1 + tolerance)]
+
+def main():
+    parser = argparse.ArgumentParser(description = "Energy per MJLO wake cycle from a current trace")
+    parser.add_argument('traces', nargs = '*', help = "multimeter CSV export(s)")
+    parser.add_argument('--simulate', type = int, metavar = 'N', help = "simulate a power-on cycle and N timer wakes")
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--compare', action = 'store_true', help = "compare the second trace against the first")
+    parser.add_argument('--baseline', metavar = 'JSON', help = "compare the simulated cycles against this baseline")
+    parser.add_argument('--update', action = 'store_true', help = "write the results to the baseline instead")
+    parser.add_argument('--tolerance', type = float, default = 0.02, help = "allowed relative regression (0.02)")
+    parser.add_argument('--t_int', type = int, default = T_INT, help = "interval between wake cycles in seconds")
+    parser.add_argument('--capacity', type = float, default = CAPACITY_MAH, help = "battery capacity in mAh")
+    args = parser.parse_args()
+
+    profiles = [Profile(load_csv(path), path) for path in args.traces]
+    if args.simulate is not None:
+        profiles += simulate(args.simulate, args.seed)
+    if not profiles:
+        parser.error("nothing to analyse")
+    for profile in profiles:
+        print(profile.report(args.t_int, args.capacity))
+        print()
+
+    failed = []
+    if args.compare:
+        if len(args.traces) != 2:
+            parser.error("--compare takes exactly two traces")
+        old, new = profiles[0].cycle_mAh(args.t_int), profiles[1].cycle_mAh(args.t_int)
+        print("energy per cycle: {:.4f} -> {:.4f} mAh ({:+.1f}%)".format(old, new, 100 * (new / old - 1)))
+        if new > old * (1 + args.tolerance):
+            failed.append('cycle_mAh')
+
+    if args.baseline:
+        if args.simulate is None:
+            parser.error("--baseline needs --simulate")
+        result = metrics(profiles[len(args.traces):], args.t_int)
+        if args.update or not os.path.exists(args.baseline):
+            with open(args.baseline, 'w') as f:
+                json.dump(dict(result, t_int = args.t_int), f, indent = 2)
+                f.write("\n")
+            print("baseline written to {}".format(args.baseline))
+        else:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+            if baseline.get('t_int', T_INT) != args.t_int:
+                parser.error("baseline was made with t_int = {}".format(baseline.get('t_int')))
+            for key in ('poweron_mAh', 'cycle_mAh', 'awake_s'):
+                print("{:>12}: {:.4f} -> {:.4f} ({:+.1f}%)".format(key, baseline[key], result[key],
+                                                                   100 * (result[key] / baseline[key] - 1)))
+            failed += regressions(baseline, result, args.tolerance)
+
+    if failed:
+        print("REGRESSION in {} (tolerance {:.0%})".format(", ".join(failed), args.tolerance))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,457 @@
+# decoder for the uplinks of the kastjes on the host, encoder of configuration downlinks, and generator of the TTN
+# payload formatter (JavaScript); the frame layouts and commands are read from the firmware itself (software/schema.py,
+# software/spans.py and software/downlink.py), so there is a single definition of every field; regenerate
+# ttn_formatter.js after changing them
+#
+# usage (from the extras folder):
+#   python payload.py 1 2f435a27955af20b4900fa4d0f0717e80055007e   decode a payload (fport, hex)
+#   python payload.py --formatter ttn_formatter.js                 write the TTN payload formatter
+#   python payload.py --check 4                                    compare plain and bit-packed frames of simulated cycles
+#   python payload.py --roundtrip 100                              pack random values with the firmware and decode them
+#   python payload.py --downlink t_int=1800 sf_l=9 sf_h=12          encode a configuration downlink (fport 10, hex)
+import argparse
+import ast
+import importlib.util
+import json
+import math
+import os
+import random
+import shutil
+import subprocess
+import sys
+
+SOFTWARE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'software')
+FORMATTER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ttn_formatter.js')
+
+def _assignments(path, names):
+    """Literal values of the module level assignments names in a Python source file."""
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    found = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            if node.targets[0].id in names:
+                found[node.targets[0].id] = ast.literal_eval(node.value)
+    return found
+
+def load_schema(software = SOFTWARE):
+    """The firmware module schema.py (plain Python without MicroPython imports), not registered in sys.modules."""
+    spec = importlib.util.spec_from_file_location('schema', os.path.join(software, 'schema.py'))
+    schema = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(schema)
+    return schema
+
+def _decimals(precision):
+    """Number of decimals that a value with this precision needs."""
+    return len(repr(float(precision)).split('.')[1].rstrip('0'))
+
+def tables(software = SOFTWARE):
+    """Layouts of every fport in every schema version that changed it, as {fport: [(version, [(key, bits, offset,
+    precision, decimals, masks)])]}, newest version first (from schema.layout, as used by the firmware packer), where
+    masks lists the fields that the bits of the miss field mark as missing, bit 0 first (None for other fields), the
+    phase names of fport 3, the batch fport (the number of records, then the records) and the current schema version."""
+    schema = load_schema(software)
+    spans = _assignments(os.path.join(software, 'spans.py'), ('NAMES', 'NOT_RUN'))
+    layouts = {}
+    for version in sorted(schema.LAYOUTS, reverse = True):
+        for fport in schema.LAYOUTS[version]:
+            fields, size = schema.layout(fport, version)
+            fields = [(key, bits, offset, precision, _decimals(precision),
+                       list(schema.MISSING) if key == 'miss' else None)
+                      for key, position, bits, offset, precision, maximum in fields]
+            newer = layouts.setdefault(fport, [])
+            if any(other == fields for other_version, other in newer):
+                continue                            # unchanged in this version
+            if any(frame_size(other) == size for other_version, other in newer):
+                raise ValueError("fport {} has the same length in two schema versions".format(fport))
+            newer.append((version, fields))
+    return layouts, spans['NAMES'], spans['NOT_RUN'], schema.BATCH, schema.VERSION
+
+def frame_size(fields):
+    """Frame (or batch record) size in bytes of a layout from tables()."""
+    return (sum(field[1] for field in fields) + 7) // 8
+
+def select(fport, payload, layout):
+    """The (version, fields) a frame was sent with: the newest schema version whose frame has the length of the
+    payload, or else the newest version the payload is long enough for; None if it is too short for every version."""
+    layouts, names, not_run, batch, version = layout
+    start, count = (1, payload[0] if payload else 0) if fport == batch else (0, 1)
+    fitting = None
+    for version, fields in layouts[fport]:
+        length = start + count * frame_size(fields)
+        if length == len(payload):
+            return version, fields
+        if length <= len(payload) and fitting is None:
+            fitting = version, fields
+    return fitting
+
+def commands(software = SOFTWARE):
+    """Fport of the configuration downlinks, and its commands as {type: (NVS keys, bytes per key, minimum, maximum)}."""
+    downlink = _assignments(os.path.join(software, 'downlink.py'), ('PORT', '_commands'))
+    return downlink['PORT'], downlink['_commands']
+
+def encode(settings, downlink = None):
+    """Configuration downlink that writes settings (a dict of NVS keys, e.g. {'t_int': 1800}) to NVS; downlink is the
+    result of commands(). Returns (fport, payload)."""
+    port, table = downlink or commands()
+    settings = {key: int(value) for key, value in settings.items()}
+    payload = bytearray()
+    unknown = set(settings)
+    for type, (keys, size, minimum, maximum) in sorted(table.items()):
+        given = [key for key in keys if key in settings]
+        if not given:
+            continue
+        if len(given) < len(keys):
+            raise ValueError("{} go together".format(" and ".join(keys)))
+        payload.append(type)
+        for key in keys:
+            value = settings[key]
+            if not minimum <= value <= maximum:
+                raise ValueError("{} out of range: {}".format(key, value))
+            payload += value.to_bytes(size, 'big') if size else b''
+            unknown.discard(key)
+    if unknown:
+        raise ValueError("unknown setting {}".format(", ".join(sorted(unknown))))
+    if settings.get('sf_l', 0) > settings.get('sf_h', 12):
+        raise ValueError("sf_l above sf_h")
+    return port, bytes(payload)
+
+def decode(fport, payload, layout = None):
+    """Decode an uplink to a dict of values; layout is the result of tables() (read from the firmware if None)."""
+    layout = layout or tables()
+    layouts, names, not_run, batch, version = layout
+    payload = bytes(payload)
+    if fport == 3:                                  # diagnostics, see spans.summary()
+        data = {'records': payload[0]}
+        for i, name in enumerate(names):
+            mean, top = (int.from_bytes(payload[1 + 4 * i + j:3 + 4 * i + j], 'big') for j in (0, 2))
+            data[name] = None if mean == not_run else {'mean': mean, 'max': top}
+        return data
+    if fport not in layouts:
+        raise ValueError("unknown fport {}".format(fport))
+    selected = select(fport, payload, layout)
+    if selected is None:
+        raise ValueError("payload too short for fport {}: {} bytes".format(fport, len(payload)))
+    fields = selected[1]
+    if fport == batch:
+        size = frame_size(fields)
+        return {'records': [_decode_fields(payload[1 + i * size:1 + (i + 1) * size], fport, fields)
+                            for i in range(payload[0])]}
+    return _decode_fields(payload, fport, fields)
+
+def _decode_fields(payload, fport, layout):
+    """Read all fields from the payload as a single integer: every field is a shift and a mask away."""
+    total = 8 * len(payload)
+    if sum(field[1] for field in layout) > total:
+        raise ValueError("payload too short for fport {}: {} bytes".format(fport, len(payload)))
+    frame = int.from_bytes(payload, 'big')
+    data = {}
+    missing = []
+    position = 0
+    for key, bits, offset, precision, decimals, masks in layout:
+        position += bits
+        raw = (frame >> (total - position)) & ((1 << bits) - 1)
+        data[key] = round(raw * precision - offset, decimals)
+        missing += [masked for i, masked in enumerate(masks or ()) if raw >> i & 1]
+    for key in missing:
+        data[key] = None
+    return data
+
+_FORMATTER = """// TTN payload formatter of the MJLO kastjes, generated by extras/payload.py from software/schema.py - do not edit
+// schema version {version}
+// per fport, the layout of every schema version (newest first): [version, fields]; a frame is decoded with the version
+// of its length, so boxes that still run older firmware are decoded too
+// fields: [name, bits, offset, precision, decimals, fields marked missing by the bits of this one, bit 0 first]
+var LAYOUTS = {layouts};
+var PHASES = {phases};
+var NOT_RUN = {not_run};
+var BATCH = {batch};
+// configuration downlinks: [type, NVS keys, bytes per key, minimum, maximum]
+var DOWNLINK_PORT = {downlink_port};
+var COMMANDS = {commands};
+
+function readBits(bytes, position, bits) {{
+  var value = 0;
+  for (var i = position; i < position + bits; i++) {{
+    value = value * 2 + ((bytes[i >> 3] >> (7 - (i & 7))) & 1);
+  }}
+  return value;
+}}
+
+function frameSize(layout) {{
+  var bits = 0;
+  for (var f = 0; f < layout.length; f++) {{
+    bits += layout[f][1];
+  }}
+  return Math.ceil(bits / 8);
+}}
+
+function selectLayout(versions, bytes, batch) {{
+  var start = batch ? 1 : 0, count = batch ? bytes[0] : 1, fitting = null;
+  for (var v = 0; v < versions.length; v++) {{
+    var length = start + count * frameSize(versions[v][1]);
+    if (length === bytes.length) {{
+      return versions[v][1];
+    }}
+    if (length <= bytes.length && !fitting) {{
+      fitting = versions[v][1];
+    }}
+  }}
+  return fitting;
+}}
+
+function decodeUplink(input) {{
+  var bytes = input.bytes, data = {{}};
+  if (input.fPort === 3) {{
+    data.records = bytes[0];
+    for (var p = 0; p < PHASES.length; p++) {{
+      var mean = readBits(bytes, 8 + 32 * p, 16), max = readBits(bytes, 24 + 32 * p, 16);
+      data[PHASES[p]] = mean === NOT_RUN ? null : {{mean: mean, max: max}};
+    }}
+    return {{data: data}};
+  }}
+  var versions = LAYOUTS[input.fPort];
+  if (!versions) {{
+    return {{errors: ["unknown fport " + input.fPort]}};
+  }}
+  var layout = selectLayout(versions, bytes, input.fPort === BATCH);
+  if (!layout) {{
+    return {{errors: ["payload too short for fport " + input.fPort]}};
+  }}
+  if (input.fPort === BATCH) {{
+    var size = frameSize(layout);
+    data.records = [];
+    for (var r = 0; r < bytes[0]; r++) {{
+      var record = decodeFields(bytes.slice(1 + r * size, 1 + (r + 1) * size), layout);
+      if (!record) {{
+        return {{errors: ["payload too short for fport " + input.fPort]}};
+      }}
+      data.records.push(record);
+    }}
+    return {{data: data}};
+  }}
+  data = decodeFields(bytes, layout);
+  if (!data) {{
+    return {{errors: ["payload too short for fport " + input.fPort]}};
+  }}
+  return {{data: data}};
+}}
+
+function decodeFields(bytes, layout) {{
+  var data = {{}}, missing = [], position = 0;
+  for (var f = 0; f < layout.length; f++) {{
+    var field = layout[f];
+    if (position + field[1] > 8 * bytes.length) {{
+      return null;
+    }}
+    var raw = readBits(bytes, position, field[1]);
+    data[field[0]] = Number((raw * field[3] - field[2]).toFixed(field[4]));
+    for (var m = 0; field[5] && m < field[5].length; m++) {{
+      if ((raw >> m) & 1) {{
+        missing.push(field[5][m]);
+      }}
+    }}
+    position += field[1];
+  }}
+  for (m = 0; m < missing.length; m++) {{
+    data[missing[m]] = null;
+  }}
+  return data;
+}}
+
+function encodeDownlink(input) {{
+  var bytes = [];
+  for (var c = 0; c < COMMANDS.length; c++) {{
+    var keys = COMMANDS[c][1], size = COMMANDS[c][2], given = 0;
+    for (var k = 0; k < keys.length; k++) {{
+      given += input.data[keys[k]] === undefined ? 0 : 1;
+    }}
+    if (!given) {{
+      continue;
+    }}
+    if (given < keys.length) {{
+      return {{errors: [keys.join(" and ") + " go together"]}};
+    }}
+    bytes.push(COMMANDS[c][0]);
+    for (k = 0; k < keys.length; k++) {{
+      var value = Number(input.data[keys[k]]);
+      if (!(value >= COMMANDS[c][3] && value <= COMMANDS[c][4]) || Math.floor(value) !== value) {{
+        return {{errors: [keys[k] + " out of range: " + input.data[keys[k]]]}};
+      }}
+      for (var b = size - 1; b >= 0; b--) {{
+        bytes.push(Math.floor(value / Math.pow(256, b)) % 256);
+      }}
+    }}
+  }}
+  if (input.data.sf_l > input.data.sf_h) {{
+    return {{errors: ["sf_l above sf_h"]}};
+  }}
+  return {{bytes: bytes, fPort: DOWNLINK_PORT}};
+}}
+"""
+
+def formatter(layout = None, downlink = None):
+    """Return the TTN payload formatter (JavaScript) for all fports, with the configuration downlink encoder."""
+    layouts, names, not_run, batch, version = layout or tables()
+    port, table = downlink or commands()
+    return _FORMATTER.format(version = version, layouts = json.dumps({str(k): v for k, v in layouts.items()}),
+                             phases = json.dumps(list(names)), not_run = not_run, batch = batch, downlink_port = port,
+                             commands = json.dumps([[type] + list(table[type]) for type in sorted(table)]))
+
+def _differences(plain, packed, precision):
+    """Print and count the values of packed that differ from plain by more than precision (per key)."""
+    errors = 0
+    for key, value in plain.items():
+        if value is None or packed.get(key) is None:
+            wrong = value != packed.get(key, math.inf)
+        else:
+            wrong = abs(packed.get(key, math.inf) - value) > precision[key]
+        if wrong:
+            print("  {}: {} != {}".format(key, value, packed.get(key)))
+            errors += 1
+    return errors
+
+def check(cycles):
+    """Run the simulator with plain and with bit-packed frames, and compare the decoded values within precision.
+    Then run cycles that are over the airtime budget, and compare the records of the fport 7 frames they are sent
+    with later on to the plain frames. Returns the number of differences."""
+    from simulator import Simulator
+    layout = tables()
+    precision = {}
+    for port in layout[0]:
+        for version, fields in layout[0][port]:
+            for key, bits, offset, step, decimals, masks in fields:
+                precision[key] = max(step, precision.get(key, 0))
+    decoded = []
+    for packed in (0, 1):
+        sim = Simulator()
+        sim.nvs['packed'] = packed
+        frames = [(u['fport'], u['payload']) for cycle in sim.run(cycles) for u in cycle.uplinks if u['fport'] != 3]
+        decoded.append([(fport, len(payload), decode(fport, payload, layout)) for fport, payload in frames])
+    errors = 0
+    for (port1, size1, plain), (port2, size2, packed) in zip(*decoded):
+        print("fport {} ({} bytes) -> fport {} ({} bytes)".format(port1, size1, port2, size2))
+        errors += _differences(plain, packed, precision)
+
+    deferred = []
+    for over in (False, True):
+        sim = Simulator()
+        sim.sds011.noise = sim.analog.noise = 0     # the same readings in both runs
+        sim.run(1)
+        for _ in range(cycles):
+            if over:
+                sim.nvs['at_now'] = 30000           # the fair use budget of the current hour is spent
+            sim.run(1)
+        if over:                                    # the budget is back, and the queue is sent with the next frame
+            for key in ('at_hour', 'at_now', 'at_past'):
+                del sim.nvs[key]
+            sim.run(1)
+        frames = [decode(u['fport'], u['payload'], layout) for u in sim.uplinks if u['fport'] == (7 if over else 1)]
+        deferred.append([record for data in frames for record in data.get('records', [data])])
+    print("{} measurements over the airtime budget -> {} fport 7 records".format(len(deferred[0]), len(deferred[1])))
+    if len(deferred[1]) != len(deferred[0]):
+        errors += 1
+    for plain, record in zip(deferred[0], deferred[1]):
+        errors += _differences(plain, record, precision)
+    return errors
+
+def _node(js, frames):
+    """Decode (fport, payload) frames with the TTN formatter under node."""
+    script = js + "\nvar frames = " + json.dumps([(fport, list(payload)) for fport, payload in frames]) + ";\n" + \
+             "console.log(JSON.stringify(frames.map(function (f) { return decodeUplink({fPort: f[0], bytes: f[1]}); })));"
+    result = subprocess.run(['node'], input = script.encode(), stdout = subprocess.PIPE, check = True)
+    return json.loads(result.stdout)
+
+def roundtrip(count, seed = 0, js = FORMATTER):
+    """Pack count sets of random values for every fport with the firmware packer (schema.pack), and check that the
+    decoder returns them within precision. If node is installed, the TTN formatter has to decode the same; the
+    formatter in js also has to be up to date with the schema. Returns the number of differences."""
+    schema = load_schema()
+    layout = tables()
+    rng = random.Random(seed)
+    errors = 0
+    frames = []
+    for version, fport in ((version, fport) for version in schema.LAYOUTS for fport in schema.LAYOUTS[version]):
+        fields, size = schema.layout(fport, version)
+        for i in range(count):
+            records = 1 + i % 3 if fport == schema.BATCH else 1
+            payload = bytearray()
+            sent = []
+            for _ in range(records):
+                values = {key: rng.randint(0, maximum) * precision - offset
+                          for key, position, bits, offset, precision, maximum in fields}
+                for key in schema.MISSING:
+                    if key in values and 'miss' in values and rng.random() < 0.2:
+                        values[key] = None          # no measurement
+                if 'miss' in values:
+                    values['miss'] = schema.missing(values)
+                buffer = bytearray(size)
+                schema.pack(buffer, 0, fields, values)
+                payload += buffer
+                sent.append(values)
+            if fport == schema.BATCH:
+                payload = bytes([records]) + payload
+            decoded = decode(fport, payload, layout)
+            for values, data in zip(sent, decoded['records'] if fport == schema.BATCH else [decoded]):
+                for key, position, bits, offset, precision, maximum in fields:
+                    if values[key] is None or data[key] is None:
+                        wrong = data[key] is not values[key]
+                    else:
+                        wrong = abs(data[key] - values[key]) > precision / 2
+                    if wrong:
+                        print("fport {} (version {}) {}: {} != {}".format(fport, version, key, data[key], values[key]))
+                        errors += 1
+            frames.append((fport, bytes(payload), decoded))
+    print("{} frames packed and decoded".format(len(frames)))
+
+    generated = formatter(layout)
+    with open(js) as f:
+        if f.read() != generated:
+            print("{} is stale: regenerate it with --formatter (schema version {})".format(js, layout[4]))
+            errors += 1
+    if shutil.which('node'):
+        for (fport, payload, decoded), result in zip(frames, _node(generated, [frame[:2] for frame in frames])):
+            if json.loads(json.dumps(decoded)) != result.get('data'):
+                print("fport {} {}: formatter {} != {}".format(fport, payload.hex(), result, decoded))
+                errors += 1
+        print("{} frames decoded by the TTN formatter".format(len(frames)))
+    else:
+        print("node not found: TTN formatter not checked")
+    return errors
+
+def main():
+    parser = argparse.ArgumentParser(description = "Decode MJLO uplinks, or generate the TTN payload formatter")
+    parser.add_argument('fport', type = int, nargs = '?')
+    parser.add_argument('payload', nargs = '?', help = "payload as hex")
+    parser.add_argument('--formatter', metavar = 'JS', help = "write the TTN payload formatter to this file ('-': stdout)")
+    parser.add_argument('--check', type = int, metavar = 'N', help = "compare plain and bit-packed frames of N cycles")
+    parser.add_argument('--roundtrip', type = int, metavar = 'N',
+                        help = "pack and decode N random frames per fport, also with the TTN formatter (node)")
+    parser.add_argument('--downlink', nargs = '+', metavar = 'KEY=VALUE',
+                        help = "encode a configuration downlink, e.g. t_int=1800 sf_l=9 sf_h=12 adr=3 gps_req=1 display=0")
+    args = parser.parse_args()
+
+    if args.formatter:
+        js = formatter()
+        if args.formatter == '-':
+            sys.stdout.write(js)
+        else:
+            with open(args.formatter, 'w') as f:
+                f.write(js)
+    elif args.downlink:
+        try:
+            port, data = encode(dict(setting.split('=', 1) for setting in args.downlink))
+        except ValueError as e:
+            parser.error(str(e))
+        print("fport {}: {}".format(port, data.hex()))
+    elif args.roundtrip:
+        sys.exit(1 if roundtrip(args.roundtrip) else 0)
+    elif args.check:
+        sys.exit(1 if check(args.check) else 0)
+    elif args.payload:
+        print(json.dumps(decode(args.fport, bytes.fromhex(args.payload)), indent = 2))
+    else:
+        parser.print_help()
+
+if __name__ == '__main__':
+    main()
@@ -1,24 +1,33 @@
+import os
 import matplotlib.pyplot as plt
 import numpy as np
 
-data = np.genfromtxt("extras\power_consumption.csv", delimiter = ',')
+import energy
+
+folder = os.path.dirname(os.path.abspath(__file__))
+trace = energy.load_csv(os.path.join(folder, "power_consumption.csv"))
+data = np.array(trace)
+duration = data[-1, 0] + data[-1, 1]
+
+# phases are found from the current levels, see energy.classify()
+colors = {'boot': 'red', 'sensing': 'green', 'lora': 'dodgerblue', 'display': 'yellow', 'sleep': 'gray'}
+labels = {'boot': 'programma\nstarten', 'sensing': 'sensoren\nmeten', 'lora': 'LoRa\ntransmissie',
+          'display': 'waarden\nweergeven', 'sleep': 'diepe\nslaap'}
 
 plt.figure(figsize = (8, 5))
-plt.plot(np.linspace(0, 44, len(data[:, 2])), data[:, 2])
+plt.plot(data[:, 0], data[:, 2])
 plt.title("Stroomgebruik tijdens meting - FW v2.7.0")
 plt.xlabel("$tijd$ (s)")
 plt.ylabel("$stroomsterkte$ (mA)")
-plt.xlim(0, 44)
+plt.xlim(0, duration)
 plt.ylim(bottom = 0)
 plt.grid()
-plt.axvspan( 0,  3, 0, 200, alpha = 0.15, color = 'red',        label = 'programma\nstarten')
-plt.axvspan( 3, 28, 0, 200, alpha = 0.15, color = 'green',      label = 'sensoren\nmeten')
-plt.axvspan(28, 32, 0, 200, alpha = 0.15, color = 'dodgerblue', label = 'LoRa\ntransmissie')
-plt.axvspan(32, 37, 0, 200, alpha = 0.15, color = 'yellow',     label = 'waarden\nweergeven')
-plt.axvspan(37, 44, 0, 200, alpha = 0.15, color = 'gray',       label = 'diepe\nslaap')
+spans = energy.spans(energy.classify(trace))
+for phase, start, length in spans:
+    plt.axvspan(start, start + length, 0, 200, alpha = 0.15, color = colors[phase], label = labels[phase])
 plt.legend(loc = 'upper right')
-plt.xticks([0, 3, 5, 10, 15, 20, 25, 28, 32, 35, 37, 40, 44])
-plt.savefig("extras\Stroomgebruik_MJLO_v2_7_0.png", dpi=1200)
-plt.savefig("extras\Stroomgebruik_MJLO_v2_7_0.svg")
-plt.savefig("extras\Stroomgebruik_MJLO_v2_7_0.pdf")
-plt.show(block = True)
\ No newline at end of file
+plt.xticks(sorted(set([0, round(duration)] + [round(start) for phase, start, length in spans] + list(range(5, int(duration), 5)))))
+plt.savefig(os.path.join(folder, "Stroomgebruik_MJLO_v2_7_0.png"), dpi=1200)
+plt.savefig(os.path.join(folder, "Stroomgebruik_MJLO_v2_7_0.svg"))
+plt.savefig(os.path.join(folder, "Stroomgebruik_MJLO_v2_7_0.pdf"))
+plt.show(block = True)
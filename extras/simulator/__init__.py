@@ -0,0 +1,224 @@
+"""
+Virtual-clock hardware simulator for the MJLO firmware.
+
+Runs the unmodified files in software/ (_main.py, error.py, updateFW.py and the drivers in lib/) on a
+laptop. The Pycom modules are replaced by stand-ins whose sleeps advance a virtual clock instantly, and the
+peripherals are scriptable byte-level models, so a complete wake cycle takes milliseconds of real time.
+
+    from simulator import Simulator
+    sim = Simulator()
+    for cycle in sim.run(3):
+        print(cycle)
+"""
+import builtins
+import os
+import random
+import runpy
+import sys
+
+from . import power
+from .clock import Clock, Timeout
+from .devices import AnalogSources, BME680, NEO6M, SCD41, SDS011, SSD1306, TSL2591, VEML6070
+from .hardware import (DeepSleep, Reset, build_modules, time_on_air_ms,
+                       PWRON_RESET, WDT_RESET, DEEPSLEEP_RESET, PWRON_WAKE, PIN_WAKE, RTC_WAKE)
+
+SOFTWARE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'software')
+
+# NVS registers as written by upgrade.py when a box is provisioned
+DEFAULT_NVS = {'node': 1, 'fwversion': 271, 'error': 0, 'lora': 0, 'sf_l': 10, 'sf_h': 12, 'adr': 3,
+               't_int': 600, 'fcnt': 0, 'fwsize': 0}
+
+class Cycle:
+    """Outcome of a single wake cycle."""
+    def __init__(self, reset_cause, wake_reason, exit, awake_ms, sleep_ms, uplinks, error = None, trace = (), awake = 0):
+        self.reset_cause = reset_cause
+        self.wake_reason = wake_reason
+        self.exit = exit                            # 'deepsleep', 'reset' or 'timeout'
+        self.awake_ms = awake_ms
+        self.sleep_ms = sleep_ms
+        self.uplinks = uplinks
+        self.error = error                          # exception that made _main.py fall through to error.py
+        self.trace = list(trace)                    # (start s, duration s, mA) from boot up to the next boot
+        self._awake = awake                         # number of trace segments before deepsleep
+
+    @property
+    def awake_mAh(self):
+        return sum(s * ma for t, s, ma in self.trace[:self._awake]) / 3600
+
+    @property
+    def mAh(self):
+        """Charge drawn during the whole cycle, deepsleep included."""
+        return sum(s * ma for t, s, ma in self.trace) / 3600
+
+    def __repr__(self):
+        return "<Cycle {} after {:.0f} ms awake, {} uplink(s){}>".format(
+            self.exit, self.awake_ms, len(self.uplinks), ", error: {!r}".format(self.error) if self.error else "")
+
+class Simulator:
+    def __init__(self, nvs = None, seed = 0, software = SOFTWARE, sd_dir = None, boot_ms = 3000, limit_ms = 600000):
+        self.software = software
+        self.clock = Clock(limit_ms)
+        self.rng = random.Random(seed)
+        self.boot_ms = boot_ms                      # time spent in the bootloader before _main.py starts
+        self.sd_dir = sd_dir                        # host directory that acts as the SD card (None: no card)
+        self.world_epoch = 1697500000               # true UTC time at the start of the simulation
+
+        self.nvs = dict(DEFAULT_NVS if nvs is None else nvs)
+        self.nvs_reads = 0
+        self.nvs_writes = 0
+        self.pins = {}
+        self.held = {}
+        self.ota = bytearray()
+
+        # peripherals
+        self.bme680 = BME680(self.clock)
+        self.tsl2591 = TSL2591(self.clock)
+        self.veml6070 = VEML6070(self.clock)
+        self.scd41 = SCD41(self.clock)
+        self.display = SSD1306(self.clock)
+        self.i2c_devices = {}
+        for device in (self.bme680, self.tsl2591, self.veml6070, self.scd41, self.display):
+            for address in device.addresses:
+                self.i2c_devices[address] = device
+        self.i2c_stats = {}                         # address: (transactions, bytes)
+        self.i2c_baudrate = None
+        self.sds011 = SDS011(self.clock, self.rng, lambda: self.pins.get('P21', 0) == 1)
+        self.neo6m = NEO6M(self.clock, lambda: self.pins.get('P21', 0) == 1 and self.pins.get('P22', 1) == 0,
+                           self.world_time)
+        self.analog = AnalogSources(self.clock, self.rng)
+        self.adc_sample_us = 75                     # >13000 samples per second measured on a LoPy4
+
+        # LoRaWAN
+        self.coverage = True                        # does a join request reach a gateway?
+        self.join_delay_ms = 5000                   # OTAA join accept delay (RX1 / RX2 window)
+        self.lora_session = None
+        self.lora_nvram = None
+        self.lora_stats = None                      # lora.stats() of the last received downlink
+        self.snr = 3.0                              # mean SNR of the link with the gateway in dB (both directions)
+        self.snr_sigma = 2.0
+        self.link_rng = random.Random(seed)         # separate from the sensor noise, so it does not shift readings
+        self.join_requests = 0
+        self.uplinks = []
+        self.downlinks = []                         # (port, payload) delivered after the next uplink
+        self.airtime_ms = 0.0
+
+        self.reset_cause = PWRON_RESET
+        self.wake_reason = (PWRON_WAKE, None)
+        self.light_sleep_ms = 0
+        self._button = False
+
+        # current model
+        self.currents = dict(power.CURRENT_MA)      # mA per state, see simulator/power.py
+        self.trace = []                             # [start us, duration us, mA], consecutive equal currents merged
+        self.clock.on_advance = self._draw
+
+    def host_path(self, path):
+        """Map a path on the device onto the host: /sd is the SD card directory."""
+        if self.sd_dir is not None and (path == '/sd' or path.startswith('/sd/')):
+            return os.path.join(self.sd_dir, path[4:])
+        return path
+
+    def _open(self, file, *args, **kwargs):
+        if isinstance(file, str):
+            file = self.host_path(file)
+        return self._builtin_open(file, *args, **kwargs)
+
+    def world_time(self):
+        return self.world_epoch + self.clock.us / 1e6
+
+    def time_on_air_ms(self, sf, length):
+        return time_on_air_ms(sf, length)
+
+    def _draw(self, start_us, us, mode):
+        ma = power.current_ma(self, mode, self.currents)
+        last = self.trace[-1] if self.trace else None
+        if last is not None and last[2] == ma and last[0] + last[1] == start_us:
+            last[1] += us
+        else:
+            self.trace.append([start_us, us, ma])
+
+    def pins_changed(self):
+        """Called on every pin write, so power switched peripherals see the exact switching time."""
+        self.neo6m.update()
+
+    def press_button(self):
+        """Wake the next cycle through the green button instead of the timer."""
+        self._button = True
+
+    def power_cycle(self):
+        """Remove and re-insert the battery: RAM, RTC, LoRa session and pin holds are lost, NVS persists."""
+        self.reset_cause = PWRON_RESET
+        self.wake_reason = (PWRON_WAKE, None)
+        self.lora_session = self.lora_nvram = None
+        self.pins.clear()
+        self.held.clear()
+        self.scd41.awake = True                     # the SCD41 powers up in idle mode
+        self.display.on = False
+        self.clock.power_on()
+
+    def _execute(self, script):
+        runpy.run_path(os.path.join(self.software, script), run_name = '__main__')
+
+    def boot(self):
+        """Run a single wake cycle: _main.py, followed by error.py if _main.py raised an exception."""
+        if self.reset_cause == PWRON_RESET:
+            self.clock.power_on()
+        elif self._button and self.reset_cause == DEEPSLEEP_RESET:
+            self.wake_reason = (PIN_WAKE, ['P2'])
+        self._button = False
+        self.clock.reset()
+        uplinks = len(self.uplinks)
+        traced = len(self.trace)
+        boot_us = self.clock.us
+        reset_cause, wake_reason = self.reset_cause, self.wake_reason
+
+        saved_modules = dict(sys.modules)
+        saved_path = list(sys.path)
+        sys.modules.update(build_modules(self))
+        sys.path.insert(0, self.software)
+        builtins.const = lambda value: value        # MicroPython knows const() without an import
+        self._builtin_open, builtins.open = builtins.open, self._open
+
+        exit, sleep_ms, error = 'timeout', 0, None
+        try:
+            self.clock.advance_ms(self.boot_ms)
+            try:
+                self._execute('_main.py')
+            except (DeepSleep, Reset, Timeout):
+                raise
+            except Exception as e:                  # the firmware continues with error.py after an exception
+                error = e
+                self._execute('error.py')
+        except DeepSleep as e:
+            exit, sleep_ms = 'deepsleep', e.ms
+        except Reset:
+            exit = 'reset'
+        except Timeout:
+            pass
+        finally:
+            for name in list(sys.modules):
+                if name not in saved_modules:
+                    del sys.modules[name]
+            sys.modules.update(saved_modules)
+            sys.path[:] = saved_path
+            del builtins.const
+            builtins.open = self._builtin_open
+
+        awake_ms = self.clock.awake_ms
+        awake = len(self.trace) - traced
+        if exit == 'deepsleep':
+            self.clock.skip_ms(sleep_ms)
+            self.reset_cause = DEEPSLEEP_RESET
+            self.wake_reason = (RTC_WAKE, None)
+            self.lora_session = None                # RAM is lost, only nvram_save() survives
+        else:
+            self.reset_cause = WDT_RESET            # machine.reset() (and a stuck node) end in a watchdog reset
+            self.wake_reason = (PWRON_WAKE, None)
+            self.lora_session = None
+
+        trace = [((start - boot_us) / 1e6, us / 1e6, ma) for start, us, ma in self.trace[traced:]]
+        return Cycle(reset_cause, wake_reason, exit, awake_ms, sleep_ms, self.uplinks[uplinks:], error, trace, awake)
+
+    def run(self, cycles):
+        """Run a number of consecutive wake cycles, returning a list of Cycle results."""
+        return [self.boot() for _ in range(cycles)]
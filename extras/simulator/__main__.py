@@ -0,0 +1,53 @@
+# run a number of simulated wake cycles and report the (simulated) awake time of each
+# usage (from the extras folder): python -m simulator [cycles] [--no-coverage] [--no-sky] [--hdop H] [--snr DB] [--button N] [--downlink HEX]
+import argparse
+
+from . import Simulator
+
+def main():
+    parser = argparse.ArgumentParser(description = "Simulate MJLO wake cycles on a virtual clock")
+    parser.add_argument('cycles', type = int, nargs = '?', default = 3, help = "number of wake cycles")
+    parser.add_argument('--no-coverage', action = 'store_true', help = "LoRa join requests are never answered")
+    parser.add_argument('--no-sky', action = 'store_true', help = "GPS never gets a fix")
+    parser.add_argument('--hdop', type = float, help = "hdop the GPS fix converges to (poor sky view)")
+    parser.add_argument('--snr', type = float, help = "mean SNR of the link with the gateway in dB (default 3)")
+    parser.add_argument('--button', type = int, action = 'append', default = [],
+                        help = "press the button before this (0-based) cycle, may be repeated")
+    parser.add_argument('--downlink', metavar = 'HEX', action = 'append', default = [],
+                        help = "configuration downlink (fport 10) for the next uplinks, see payload.py --downlink")
+    parser.add_argument('--sd', metavar = 'DIR', help = "use this directory as SD card")
+    parser.add_argument('--seed', type = int, default = 0)
+    args = parser.parse_args()
+
+    sim = Simulator(seed = args.seed, sd_dir = args.sd)
+    sim.coverage = not args.no_coverage
+    if args.no_sky:
+        sim.neo6m.ttff = None
+    if args.hdop:
+        sim.neo6m.hdop_final = args.hdop
+    if args.snr is not None:
+        sim.snr = args.snr
+    sim.downlinks = [(10, bytes.fromhex(payload)) for payload in args.downlink]
+
+    total = charge = 0
+    print("{:>5} {:>6} {:>10} {:>11} {:>10} {:>8}  {}".format("cycle", "reset", "exit", "awake (ms)", "awake mAh",
+                                                              "uplinks", "fport/sf"))
+    for n in range(args.cycles):
+        if n in args.button:
+            sim.press_button()
+        cycle = sim.boot()
+        total += cycle.awake_ms
+        charge += cycle.mAh
+        ports = " ".join("{}/{}".format(u['fport'], u['sf']) for u in cycle.uplinks)
+        print("{:>5} {:>6} {:>10} {:>11.0f} {:>10.4f} {:>8}  {}".format(n, cycle.reset_cause, cycle.exit, cycle.awake_ms,
+                                                                       cycle.awake_mAh, len(cycle.uplinks), ports))
+        if cycle.error is not None:
+            print("      error: {!r}".format(cycle.error))
+    print("mean awake time: {:.0f} ms, mean charge per cycle: {:.4f} mAh, airtime: {:.0f} ms, NVS reads/writes: {}/{}".format(
+          total / max(1, args.cycles), charge / max(1, args.cycles), sim.airtime_ms, sim.nvs_reads, sim.nvs_writes))
+    uplinks = [(u['time'], sim.time_on_air_ms(u['sf'], len(u['payload']) + 13)) for u in sim.uplinks]
+    peak = max((sum(toa for t, toa in uplinks if start <= t < start + 86400) for start, _ in uplinks), default = 0)
+    print("highest airtime within 24 hours: {:.0f} ms (TTN fair use: 30000 ms), uplinks lost: {} of {}".format(
+          peak, sum(not u['delivered'] for u in sim.uplinks), len(sim.uplinks)))
+
+main()
@@ -0,0 +1,61 @@
+# virtual clock: every sleep, ADC sample and bus transaction advances simulated time instantly
+
+class Timeout(BaseException):
+    """Raised when a single wake cycle stays awake longer than the configured limit.
+    Derived from BaseException so the bare `except:` clauses in the firmware can not hide it for long."""
+
+class Clock:
+    def __init__(self, limit_ms = 600000):
+        self.us = 0                                 # simulated time since the start of the simulation
+        self.boot_us = 0                            # simulated time of the last reset (ticks start at 0)
+        self.limit_ms = limit_ms                    # maximum awake time per wake cycle
+        self._rtc_base = 0                          # RTC seconds (1970 epoch, like Pycom) at _rtc_set_us
+        self._rtc_set_us = 0
+        self.on_advance = None                      # callable(start_us, us, mode), e.g. to record a current trace
+
+    def reset(self):
+        """Mark a (re)boot: ticks start counting from zero again."""
+        self.boot_us = self.us
+
+    def power_on(self):
+        """The RTC does not survive a power-on reset."""
+        self.set_rtc(0)
+
+    def advance_us(self, us, mode = 'active'):
+        """Let awake time pass; mode tells what the processor is doing ('active', 'sleep', 'tx' or 'rx')."""
+        us = int(us)
+        if self.on_advance is not None and us > 0:
+            self.on_advance(self.us, us, mode)
+        self.us += us
+        if self.limit_ms is not None and self.awake_ms > self.limit_ms:
+            raise Timeout("awake for more than {} ms".format(self.limit_ms))
+
+    def advance_ms(self, ms, mode = 'active'):
+        self.advance_us(max(0, ms) * 1000, mode)
+
+    def skip_ms(self, ms):
+        """Let time pass without counting it as awake time (deepsleep)."""
+        us = int(max(0, ms) * 1000)
+        if self.on_advance is not None and us > 0:
+            self.on_advance(self.us, us, 'deepsleep')
+        self.us += us
+
+    @property
+    def ticks_us(self):
+        return self.us - self.boot_us
+
+    @property
+    def ticks_ms(self):
+        return self.ticks_us // 1000
+
+    @property
+    def awake_ms(self):
+        return self.ticks_us / 1000
+
+    def rtc(self):
+        """Current RTC time in (float) seconds since 1970."""
+        return self._rtc_base + (self.us - self._rtc_set_us) / 1e6
+
+    def set_rtc(self, seconds):
+        self._rtc_base = seconds
+        self._rtc_set_us = self.us
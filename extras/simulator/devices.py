@@ -0,0 +1,492 @@
+# scriptable models of the peripherals in an MJLO box
+# every model answers on the byte level like the real device, so the unmodified drivers in software/lib can talk to it
+import math
+import struct
+
+def _crc8(data):
+    """Sensirion CRC (polynomial 0x31, init 0xFF)."""
+    crc = 0xFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x31) if crc & 0x80 else (crc << 1)
+    return crc & 0xFF
+
+def _nmea(sentence):
+    """Wrap an NMEA body in '$' .. '*CS\\r\\n'."""
+    checksum = 0
+    for char in sentence:
+        checksum ^= ord(char)
+    return "${}*{:02X}\r\n".format(sentence, checksum).encode()
+
+
+class BME680:
+    """Register model of the BME680 including forced mode conversion timing."""
+    addresses = (0x77,)
+
+    # calibration of a real sensor: (name, value) as parsed by CalibrationData
+    calibration = dict(par_t1 = 26243, par_t2 = 26223, par_t3 = 3,
+                       par_p1 = 36473, par_p2 = -10415, par_p3 = 88, par_p4 = 7216, par_p5 = -103,
+                       par_p6 = 30, par_p7 = 34, par_p8 = -3187, par_p9 = -2478, par_p10 = 30,
+                       par_h1 = 835, par_h2 = 1017, par_h3 = 0, par_h4 = 45, par_h5 = 20, par_h6 = 120, par_h7 = -100,
+                       par_gh1 = -30, par_gh2 = -12336, par_gh3 = 18)
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.regs = bytearray(256)
+        self.ptr = 0
+        self._ready_at = None
+        self.conversions = 0
+
+        # raw ADC values, the defaults compensate to ~21 C, ~1013 hPa, ~45 %rH and ~23 kOhm
+        self.adc_temp = 487047
+        self.adc_pres = 336823
+        self.adc_hum = 22200
+        self.adc_gas = 600
+        self.gas_range = 5
+
+        self.regs[0xD0] = 0x61                      # chip id
+        self.regs[0x00] = 46                        # res_heat_val
+        self.regs[0x02] = 1 << 4                    # res_heat_range
+        self.regs[0x04] = 0                         # range_sw_err
+        self._write_calibration()
+
+    def _write_calibration(self):
+        cal = bytearray(41)
+        c = self.calibration
+        def word(msb, lsb, value):
+            cal[msb], cal[lsb] = (value >> 8) & 0xFF, value & 0xFF
+        word(34, 33, c['par_t1']); word(2, 1, c['par_t2']); cal[3] = c['par_t3'] & 0xFF
+        word(6, 5, c['par_p1']); word(8, 7, c['par_p2']); cal[9] = c['par_p3'] & 0xFF
+        word(12, 11, c['par_p4']); word(14, 13, c['par_p5'])
+        cal[16] = c['par_p6'] & 0xFF; cal[15] = c['par_p7'] & 0xFF
+        word(20, 19, c['par_p8']); word(22, 21, c['par_p9']); cal[23] = c['par_p10'] & 0xFF
+        cal[27] = c['par_h1'] >> 4
+        cal[26] = (c['par_h1'] & 0x0F) | ((c['par_h2'] & 0x0F) << 4)
+        cal[25] = c['par_h2'] >> 4
+        for i, name in ((28, 'par_h3'), (29, 'par_h4'), (30, 'par_h5'), (31, 'par_h6'), (32, 'par_h7'),
+                        (37, 'par_gh1'), (38, 'par_gh3')):
+            cal[i] = c[name] & 0xFF
+        word(36, 35, c['par_gh2'])
+        for i in range(41):
+            self.regs[0x89 + i if i < 25 else 0xE1 + i - 25] = cal[i]
+
+    def conversion_us(self):
+        """TPHG duration as specified by Bosch, plus the heater duration of the selected profile."""
+        cycles = (0, 1, 2, 4, 8, 16)
+        meas_cycles = (cycles[min(self.regs[0x74] >> 5, 5)] + cycles[min((self.regs[0x74] >> 2) & 0x07, 5)] +
+                       cycles[min(self.regs[0x72] & 0x07, 5)])
+        duration = meas_cycles * 1963 + 477 * 4 + 477 * 5 + 500
+        if self.regs[0x71] & 0x10:                  # run_gas
+            wait = self.regs[0x64 + (self.regs[0x71] & 0x0F)]
+            duration += (wait & 0x3F) * (4 ** (wait >> 6)) * 1000
+        return duration
+
+    def write(self, address, data):
+        if len(data) == 1:
+            self.ptr = data[0]
+            return
+        for i in range(0, len(data) - 1, 2):        # burst writes are register / value pairs
+            self._write_register(data[i], data[i + 1])
+
+    def _write_register(self, register, value):
+        if register == 0xE0:
+            if value == 0xB6:                       # soft reset
+                for reg in range(0x50, 0x76):
+                    self.regs[reg] = 0
+                self._ready_at = None
+            return
+        self.regs[register] = value
+        if register == 0x74 and value & 0x03 == 1:  # forced mode: start a conversion
+            self._ready_at = self.clock.us + self.conversion_us()
+            self.regs[0x1D] = 0x20                  # measuring, no new data
+
+    def read(self, address, length):
+        self._update()
+        out = bytes(self.regs[self.ptr:self.ptr + length])
+        return out
+
+    def _update(self):
+        if self._ready_at is None or self.clock.us < self._ready_at:
+            return
+        self._ready_at = None
+        self.conversions += 1
+        self.regs[0x74] &= ~0x03 & 0xFF             # back to sleep mode
+        profile = self.regs[0x71] & 0x0F
+        field = bytearray(17)
+        field[0] = 0x80 | profile
+        field[2], field[3], field[4] = (self.adc_pres >> 12) & 0xFF, (self.adc_pres >> 4) & 0xFF, (self.adc_pres & 0x0F) << 4
+        field[5], field[6], field[7] = (self.adc_temp >> 12) & 0xFF, (self.adc_temp >> 4) & 0xFF, (self.adc_temp & 0x0F) << 4
+        field[8], field[9] = self.adc_hum >> 8, self.adc_hum & 0xFF
+        field[13] = self.adc_gas >> 2
+        field[14] = ((self.adc_gas & 0x03) << 6) | 0x20 | 0x10 | self.gas_range
+        self.regs[0x1D:0x1D + 17] = field
+
+
+class TSL2591:
+    """Register model of the TSL2591 (command byte 0xA0 | register)."""
+    addresses = (0x29,)
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.regs = bytearray(32)
+        self.ptr = 0
+        self._enabled_at = None
+        self.full = 1200                            # CH0 counts (visible + infrared)
+        self.ir = 300                               # CH1 counts (infrared)
+
+    def write(self, address, data):
+        self.ptr = data[0] & 0x1F
+        if len(data) > 1:
+            self.regs[self.ptr] = data[1]
+            if self.ptr == 0x00:
+                self._enabled_at = self.clock.us if data[1] & 0x03 == 0x03 else None
+
+    def read(self, address, length):
+        valid = (self._enabled_at is not None and
+                 self.clock.us - self._enabled_at >= 100000 * ((self.regs[0x01] & 0x07) + 1))
+        self.regs[0x13] = 1 if valid else 0         # AVALID
+        full, ir = (self.full, self.ir) if valid else (0, 0)
+        self.regs[0x14:0x18] = bytes((full & 0xFF, full >> 8, ir & 0xFF, ir >> 8))
+        return bytes(self.regs[self.ptr:self.ptr + length])
+
+
+class VEML6070:
+    """Command register at 0x38, LSB at 0x38 and MSB at 0x39."""
+    addresses = (0x38, 0x39)
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.command = 0x03                         # shutdown
+        self.uv = 250
+
+    def write(self, address, data):
+        self.command = data[0]
+
+    def read(self, address, length):
+        value = 0 if self.command & 0x01 else self.uv
+        return bytes([(value >> 8) & 0xFF if address == 0x39 else value & 0xFF]) * length
+
+
+class SCD41:
+    """Command model of the SCD41 including sleep / wake and the 5 s single shot."""
+    addresses = (0x62,)
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.awake = False
+        self.co2 = 612
+        self.temperature = 21.5
+        self.humidity = 44.0
+        self._ready_at = None
+        self._reply = b''
+
+    def _words(self, *words):
+        out = bytearray()
+        for word in words:
+            pair = bytes((word >> 8, word & 0xFF))
+            out += pair + bytes([_crc8(pair)])
+        return bytes(out)
+
+    def write(self, address, data):
+        command = (data[0] << 8) | data[1]
+        if command == 0x36F6:                       # wake_up: the sensor does not acknowledge
+            self.awake = True
+            raise OSError("I2C bus error")
+        if not self.awake:
+            raise OSError("I2C bus error")
+        if command == 0x36E0:                       # power_down
+            self.awake = False
+            self._ready_at = None
+        elif command == 0x219D:                     # measure_single_shot
+            self._ready_at = self.clock.us + 5000000
+        elif command == 0x2196:                     # measure_single_shot_rht_only
+            self._ready_at = self.clock.us + 50000
+        elif command == 0xE4B8:                     # get_data_ready_status
+            ready = self._ready_at is not None and self.clock.us >= self._ready_at
+            self._reply = self._words(0x8006 if ready else 0x8000)
+        elif command == 0xEC05:                     # read_measurement
+            self._ready_at = None
+            self._reply = self._words(self.co2,
+                                      int((self.temperature + 45) * 65536 / 175),
+                                      int(self.humidity * 65536 / 100))
+        elif command == 0x3682:                     # get_serial_number
+            self._reply = self._words(0x1234, 0x5678, 0x9ABC)
+        else:
+            self._reply = self._words(0)
+
+    def read(self, address, length):
+        if not self.awake:
+            raise OSError("I2C bus error")
+        return self._reply[:length]
+
+
+class SSD1306:
+    """GDDRAM model of the SSD1306 with horizontal addressing."""
+    addresses = (0x3C,)
+    _ARGS = {0x81: 1, 0x20: 1, 0x21: 2, 0x22: 2, 0xA8: 1, 0xD3: 1, 0xDA: 1, 0xD5: 1, 0xD9: 1, 0xDB: 1,
+             0x8D: 1, 0xAD: 1}
+
+    def __init__(self, clock, width = 128, height = 64):
+        self.clock = clock
+        self.width = width
+        self.pages = height // 8
+        self.ram = bytearray(width * self.pages)
+        self.on = False
+        self.columns = (0, width - 1)
+        self.page_range = (0, self.pages - 1)
+        self._col = self._page = 0
+        self._pending = []                          # command plus its arguments being received
+        self.data_bytes = 0                         # number of GDDRAM bytes written
+
+    def write(self, address, data):
+        i = 0
+        while i < len(data):
+            control = data[i]
+            if control & 0x40:                      # data: the rest of the transaction
+                self._data(data[i + 1:])
+                return
+            if control & 0x80:                      # Co = 1: a single command byte follows
+                self._command(data[i + 1])
+                i += 2
+            else:                                   # Co = 0: only command bytes follow
+                for byte in data[i + 1:]:
+                    self._command(byte)
+                return
+
+    def read(self, address, length):
+        return bytes(length)
+
+    def _command(self, byte):
+        if self._pending:
+            self._pending.append(byte)
+        elif byte in self._ARGS:
+            self._pending = [byte]
+        elif byte & 0xFE == 0xAE:
+            self.on = bool(byte & 0x01)
+            return
+        else:
+            return
+        if len(self._pending) == self._ARGS[self._pending[0]] + 1:
+            command, args = self._pending[0], self._pending[1:]
+            self._pending = []
+            if command == 0x21:
+                self.columns = (args[0], args[1])
+                self._col = args[0]
+            elif command == 0x22:
+                self.page_range = (args[0], args[1])
+                self._page = args[0]
+
+    def _data(self, data):
+        for byte in data:
+            self.ram[self._page * self.width + self._col] = byte
+            self.data_bytes += 1
+            self._col += 1
+            if self._col > self.columns[1]:
+                self._col = self.columns[0]
+                self._page += 1
+                if self._page > self.page_range[1]:
+                    self._page = self.page_range[0]
+
+
+class SDS011:
+    """UART model of the SDS011 in query reporting mode; readings settle exponentially after the fan starts."""
+
+    def __init__(self, clock, rng, powered):
+        self.clock = clock
+        self.rng = rng
+        self.powered = powered                      # callable: is the voltage regulator on?
+        self.fan = False
+        self._fan_on_at = 0
+        self._rx = bytearray()
+        self.pm25 = 8.0                             # settled concentrations in ug/m3
+        self.pm10 = 12.0
+        self.start_factor = 2.5                     # readings start at this multiple of the settled value
+        self.tau = 6.0                              # settling time constant in seconds
+        self.noise = 0.1                            # absolute noise in ug/m3
+
+    def _reply(self, command, data):
+        body = bytes(data) + b'\xa1\x60'            # device id
+        self._rx += b'\xaa' + bytes([command]) + body + bytes([sum(body) & 0xFF]) + b'\xab'
+
+    def _reading(self, settled):
+        seconds = (self.clock.us - self._fan_on_at) / 1e6
+        value = settled * (1 + (self.start_factor - 1) * math.exp(-seconds / self.tau))
+        value += self.rng.uniform(-self.noise, self.noise)
+        return max(0, int(round(value * 10)))
+
+    def write(self, data):
+        if not self.powered():
+            return
+        data = bytes(data)
+        while len(data) >= 19:
+            frame, data = data[:19], data[19:]
+            if frame[0] != 0xAA or frame[1] != 0xB4:
+                continue
+            command, mode, param = frame[2], frame[3], frame[4]
+            if command == 0x06:                     # sleep / wake
+                if mode == 1:
+                    if param and not self.fan:
+                        self._fan_on_at = self.clock.us
+                    self.fan = bool(param)
+                self._reply(0xC5, (0x06, mode, int(self.fan), 0))
+            elif command == 0x02:                   # reporting mode
+                self._reply(0xC5, (0x02, mode, param, 0))
+            elif command == 0x04 and self.fan:      # query data
+                pm25, pm10 = self._reading(self.pm25), self._reading(self.pm10)
+                self._reply(0xC0, (pm25 & 0xFF, pm25 >> 8, pm10 & 0xFF, pm10 >> 8))
+
+    def any(self):
+        return len(self._rx)
+
+    def idle_us(self):
+        return 1000
+
+    def read(self, length = None):
+        if not self._rx:
+            return None
+        length = len(self._rx) if length is None else length
+        out, self._rx = bytes(self._rx[:length]), self._rx[length:]
+        return out
+
+
+class NEO6M:
+    """UART model of the NEO-6M: one GGA, GSA and RMC sentence per second once powered."""
+
+    def __init__(self, clock, powered, world_time):
+        self.clock = clock
+        self.powered = powered                      # callable: are both the regulator and the GPS switch on?
+        self.world_time = world_time                # callable: true UTC seconds since 1970
+        self.latitude = 52.0241                     # Ichthus College Veenendaal
+        self.longitude = 5.5537
+        self.altitude = 12.4
+        self.ttff = 32.0                            # cold start time to first fix in seconds (None: no sky view)
+        self.ttff_aided = 12.0                      # time to first fix after a correct position and time hint (UBX-AID-INI)
+        self.hdop_start = 9.0                       # hdop right after the first fix, improving exponentially
+        self.hdop_final = 1.1
+        self.hdop_tau = 8.0
+        self.written = bytearray()                  # everything sent to the receiver (aiding messages)
+        self.aided = None                           # effective time to first fix after an accepted hint
+        self._on_at = None
+        self._emitted = 0
+        self._rx = bytearray()
+
+    def _fix(self, seconds):
+        """Return (fix, hdop, satellites) after being powered for `seconds`."""
+        ttff = self.ttff if self.ttff is None or self.aided is None else min(self.ttff, self.aided)
+        if ttff is None:
+            return False, 99.99, 0                  # not a single satellite is tracked
+        if seconds < ttff:
+            return False, 99.99, min(3, int(seconds / 10))
+        hdop = self.hdop_final + (self.hdop_start - self.hdop_final) * math.exp(-(seconds - ttff) / self.hdop_tau)
+        return True, round(hdop, 2), min(12, 4 + int((seconds - ttff) / 3))
+
+    def _sentences(self, seconds):
+        fix, hdop, sats = self._fix(seconds)
+        utc = self.world_time()
+        hhmmss = "{:02d}{:02d}{:02d}.00".format(int(utc // 3600 % 24), int(utc // 60 % 60), int(utc % 60))
+        days = int(utc // 86400) + 719468           # civil date from days since 1970 (H. Hinnant)
+        era = days // 146097
+        doe = days - era * 146097
+        yoe = (doe - doe // 1460 + doe // 36524 - doe // 146096) // 365
+        doy = doe - (365 * yoe + yoe // 4 - yoe // 100)
+        mp = (5 * doy + 2) // 153
+        day = doy - (153 * mp + 2) // 5 + 1
+        month = mp + 3 if mp < 10 else mp - 9
+        year = yoe + era * 400 + (month <= 2)
+        ddmmyy = "{:02d}{:02d}{:02d}".format(day, month, year % 100)
+        lat = "{:02d}{:08.5f}".format(int(self.latitude), (self.latitude % 1) * 60) if fix else ""
+        lon = "{:03d}{:08.5f}".format(int(self.longitude), (self.longitude % 1) * 60) if fix else ""
+        ns, ew = ("N", "E") if fix else ("", "")
+        return (_nmea("GPGGA,{},{},{},{},{},{:d},{:02d},{},{},M,46.9,M,,".format(
+                    hhmmss, lat, ns, lon, ew, int(fix), sats, hdop if fix else "", self.altitude if fix else "")) +
+                _nmea("GPGSA,A,{},,,,,,,,,,,,,{},{},{}".format(3 if fix else 1, 2.0, hdop, 1.5)) +
+                _nmea("GPRMC,{},{},{},{},{},{},0.004,,{},,,{}".format(
+                    hhmmss, "A" if fix else "V", lat, ns, lon, ew, ddmmyy, "A" if fix else "N")))
+
+    def update(self):
+        """Emit all sentences up to the current time."""
+        if not self.powered():
+            self._on_at = None
+            self.aided = None                       # the receiver forgets the hint without power
+            return
+        if self._on_at is None:
+            self._on_at = self.clock.us
+            self._emitted = 0
+        seconds = int((self.clock.us - self._on_at) / 1e6)
+        while self._emitted < seconds:
+            self._emitted += 1
+            self._rx += self._sentences(self._emitted)
+
+    def write(self, data):
+        self.update()
+        self.written += bytes(data)
+        if self._on_at is None or (self.clock.us - self._on_at) < 500000:
+            return                                  # not powered, or still booting
+        data = bytes(data)
+        while len(data) >= 56 and data[:4] == b'\xb5\x62\x0b\x01':
+            frame, data = data[:56], data[56:]
+            ck_a = ck_b = 0
+            for byte in frame[2:54]:
+                ck_a = (ck_a + byte) & 0xFF
+                ck_b = (ck_b + ck_a) & 0xFF
+            if frame[54:] == bytes((ck_a, ck_b)):
+                self._aid_ini(frame[6:54])
+
+    def _aid_ini(self, payload):
+        """A position and time hint speeds up the first fix if both are within their stated accuracy."""
+        lat, lon, alt, pos_acc, tm_cfg, week, tow, tow_ns, t_acc_ms, t_acc_ns, clk, clk_acc, flags = \
+            struct.unpack('<iiiIhHIiIIiII', payload)
+        if flags & 0x23 != 0x23:                    # position (as lla) and time are both needed
+            return
+        error_m = math.hypot((lat / 1e7 - self.latitude) * 111320,
+                             (lon / 1e7 - self.longitude) * 111320 * math.cos(math.radians(self.latitude)))
+        gps_time = week * 604800 + tow / 1000 + 315964800 - 18
+        if error_m <= pos_acc / 100 and abs(gps_time - self.world_time()) <= t_acc_ms / 1000:
+            self.aided = (self.clock.us - self._on_at) / 1e6 + self.ttff_aided
+
+    def idle_us(self):
+        """Time until the next burst of sentences."""
+        if self._on_at is None:
+            return 1000
+        return 1000000 - (self.clock.us - self._on_at) % 1000000 + 1
+
+    def any(self):
+        self.update()
+        return len(self._rx)
+
+    def readline(self):
+        self.update()
+        if not self._rx:
+            return None
+        end = self._rx.find(b'\n')
+        end = len(self._rx) if end < 0 else end + 1
+        out, self._rx = bytes(self._rx[:end]), self._rx[end:]
+        return out
+
+    def read(self, length = None):
+        self.update()
+        if not self._rx:
+            return None
+        length = len(self._rx) if length is None else length
+        out, self._rx = bytes(self._rx[:length]), self._rx[length:]
+        return out
+
+
+class AnalogSources:
+    """Voltages on the ADC pins as a function of simulated time, in millivolts."""
+
+    def __init__(self, clock, rng):
+        self.clock = clock
+        self.rng = rng
+        self.battery = 3.85                         # battery voltage, measured through a 1:1 divider
+        self.volume = 40.0                          # amplitude of the microphone signal in mV
+        self.noise = 2.0                            # ADC noise in mV
+
+    def millivolts(self, pin):
+        noise = self.rng.uniform(-self.noise, self.noise)
+        if pin == 'P16':
+            return self.battery * 500 + noise
+        if pin == 'P15':
+            return 1650 + self.volume * math.sin(2 * math.pi * 440 * self.clock.us / 1e6) + noise
+        return noise
@@ -0,0 +1,402 @@
+# host-side stand-ins for the Pycom MicroPython modules used by the firmware
+# build_modules(sim) returns a dictionary of module objects that is placed in sys.modules while the firmware runs
+import calendar
+import collections
+import math
+import os as _os
+import time as _time
+import types
+
+# reset causes and wake reasons, with the values used by the Pycom firmware
+PWRON_RESET, HARD_RESET, WDT_RESET, DEEPSLEEP_RESET, SOFT_RESET, BROWN_OUT_RESET = range(6)
+PWRON_WAKE, PIN_WAKE, RTC_WAKE, ULP_WAKE = range(4)
+
+class DeepSleep(BaseException):
+    """machine.deepsleep() was called; ends the current wake cycle."""
+    def __init__(self, ms):
+        super().__init__(ms)
+        self.ms = ms
+
+class Reset(BaseException):
+    """machine.reset() was called; ends the current wake cycle."""
+
+
+def _module(name, **attributes):
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    return module
+
+def _i2c_time_us(nbytes, baudrate):
+    """Duration of an I2C transaction: address byte plus data, 9 clocks per byte."""
+    return (nbytes + 1) * 9 * 1e6 / baudrate + 20
+
+def build_modules(sim):
+    clock = sim.clock
+
+    # ----- machine -----
+    class Pin:
+        IN, OUT, OPEN_DRAIN = 1, 2, 7
+        PULL_UP, PULL_DOWN = 1, 2
+
+        def __init__(self, id, mode = None, pull = None, value = None):
+            self.id = id
+            if value is not None:
+                self.value(value)
+
+        def value(self, value = None):
+            if value is None:
+                return sim.pins.get(self.id, 0)
+            sim.pins[self.id] = int(bool(value))
+            sim.pins_changed()
+
+        def __call__(self, value = None):
+            return self.value(value)
+
+        def hold(self, hold = None):
+            sim.held[self.id] = bool(hold)
+
+    class I2C:
+        MASTER = 0
+
+        def __init__(self, bus = 0, mode = 0, pins = None, baudrate = 100000):
+            self.init(mode, pins = pins, baudrate = baudrate)
+
+        def init(self, mode = 0, baudrate = 100000, pins = None):
+            self.baudrate = baudrate
+            sim.i2c_baudrate = baudrate
+
+        def _device(self, address, nbytes):
+            clock.advance_us(_i2c_time_us(nbytes, self.baudrate))
+            sim.i2c_stats[address] = sim.i2c_stats.get(address, (0, 0))
+            count, total = sim.i2c_stats[address]
+            sim.i2c_stats[address] = (count + 1, total + nbytes)
+            device = sim.i2c_devices.get(address)
+            if device is None:
+                raise OSError("I2C bus error")
+            return device
+
+        def scan(self):
+            clock.advance_us(_i2c_time_us(0, self.baudrate) * 112)
+            return sorted(sim.i2c_devices)
+
+        def writeto(self, address, buf, stop = True):
+            self._device(address, len(buf)).write(address, bytes(buf))
+            return len(buf)
+
+        def readfrom(self, address, nbytes, stop = True):
+            return self._device(address, nbytes).read(address, nbytes)
+
+        def readfrom_into(self, address, buf, stop = True):
+            data = self._device(address, len(buf)).read(address, len(buf))
+            buf[:len(data)] = data
+
+        def writeto_mem(self, address, memaddr, buf, addrsize = 8):
+            self._device(address, len(buf) + 1).write(address, bytes([memaddr]) + bytes(buf))
+
+        def readfrom_mem(self, address, memaddr, nbytes, addrsize = 8):
+            device = self._device(address, nbytes + 1)
+            device.write(address, bytes([memaddr]))
+            return device.read(address, nbytes)
+
+        def readfrom_mem_into(self, address, memaddr, buf, addrsize = 8):
+            buf[:] = self.readfrom_mem(address, memaddr, len(buf), addrsize)
+
+        def deinit(self):
+            pass
+
+    class UART:
+        def __init__(self, bus, baudrate = 9600, pins = None, **kwargs):
+            self.baudrate = baudrate
+            self.device = {1: sim.sds011, 2: sim.neo6m}.get(bus)
+
+        def write(self, data):
+            clock.advance_us(len(data) * 10 * 1e6 / self.baudrate)
+            if self.device is not None:
+                self.device.write(data)
+            return len(data)
+
+        def any(self):
+            count = self.device.any() if self.device is not None else 0
+            if not count:                           # a polling loop spins until the next byte arrives
+                clock.advance_us(self.device.idle_us() if self.device is not None else 1000)
+            return count
+
+        def read(self, nbytes = None):
+            return self.device.read(nbytes) if self.device is not None else None
+
+        def readline(self):
+            return self.device.readline() if self.device is not None else None
+
+        def deinit(self):
+            pass
+
+    class ADCChannel:
+        def __init__(self, pin, attn):
+            self.pin = pin
+
+        def voltage(self):
+            clock.advance_us(sim.adc_sample_us)
+            return int(max(0, min(3900, sim.analog.millivolts(self.pin))))
+
+        def value(self):
+            return int(self.voltage() * 4095 / 3900)
+
+        def value_to_voltage(self, value):
+            return int(value * 3900 / 4095)
+
+        def __call__(self):
+            return self.value()
+
+    class ADC:
+        ATTN_0DB, ATTN_2_5DB, ATTN_6DB, ATTN_11DB = range(4)
+
+        def __init__(self, id = 0, bits = 12):
+            pass
+
+        def channel(self, pin = None, attn = 0):
+            return ADCChannel(pin, attn)
+
+    class SD:
+        def __init__(self):
+            if sim.sd_dir is None:
+                raise OSError("no SD card")
+
+        def deinit(self):
+            pass
+
+    class RTC:
+        def init(self, datetime = None, source = None):
+            seconds = 0 if datetime is None else calendar.timegm(tuple(datetime[:6]) + (0, 0, 0))
+            clock.set_rtc(seconds)
+
+        def now(self):
+            return _time.gmtime(int(clock.rtc()))[:6] + (0, None)
+
+        def synced(self):
+            return clock.rtc() > 1e9
+
+    def sleep(ms, resume_wifi_ble = False):
+        clock.advance_ms(ms, 'sleep')
+        sim.light_sleep_ms += max(0, ms)
+
+    def deepsleep(ms = 0):
+        raise DeepSleep(ms)
+
+    def reset():
+        raise Reset()
+
+    machine = _module('machine', Pin = Pin, I2C = I2C, UART = UART, ADC = ADC, SD = SD, RTC = RTC,
+                      sleep = sleep, deepsleep = deepsleep, reset = reset,
+                      reset_cause = lambda: sim.reset_cause, wake_reason = lambda: sim.wake_reason,
+                      pin_sleep_wakeup = lambda pins, mode, enable_pull = False: None,
+                      idle = lambda: clock.advance_us(10), unique_id = lambda: b'\x24\x0a\xc4\x00\x00\x01',
+                      PWRON_RESET = PWRON_RESET, HARD_RESET = HARD_RESET, WDT_RESET = WDT_RESET,
+                      DEEPSLEEP_RESET = DEEPSLEEP_RESET, SOFT_RESET = SOFT_RESET, BROWN_OUT_RESET = BROWN_OUT_RESET,
+                      PWRON_WAKE = PWRON_WAKE, PIN_WAKE = PIN_WAKE, RTC_WAKE = RTC_WAKE, ULP_WAKE = ULP_WAKE,
+                      WAKEUP_ALL_LOW = 0, WAKEUP_ANY_HIGH = 1)
+
+    # ----- pycom -----
+    def nvs_get(key, *default):
+        sim.nvs_reads += 1
+        if key in sim.nvs:
+            return sim.nvs[key]
+        if default:
+            return default[0]
+        return None
+
+    def nvs_set(key, value):
+        sim.nvs_writes += 1
+        sim.nvs[key] = value
+
+    def nvs_erase(key):
+        sim.nvs_writes += 1
+        sim.nvs.pop(key, None)
+
+    def ota_write(buffer):
+        sim.ota += bytes(buffer)
+
+    pycom = _module('pycom', nvs_get = nvs_get, nvs_set = nvs_set, nvs_erase = nvs_erase,
+                    nvs_erase_all = sim.nvs.clear, rgbled = lambda color: None, heartbeat = lambda on = None: False,
+                    ota_start = lambda: sim.ota.clear(), ota_write = ota_write, ota_finish = lambda: None)
+
+    # ----- network -----
+    class LoRa:
+        LORAWAN, LORA = 0, 1
+        EU868, AS923, AU915, US915 = 5, 0, 1, 2
+        OTAA, ABP = 0, 1
+        CLASS_A, CLASS_C = 0, 2
+
+        def __init__(self, mode = 0, region = 5, **kwargs):
+            sim.lora_session = None
+            sim.lora_stats = LoRaStats(0, 0, 0.0, 0, 0, 0, 14, 0, 0, 868100000)
+
+        def has_joined(self):
+            session = sim.lora_session
+            return session is not None and clock.us >= session['joined_at']
+
+        def join(self, activation, auth, dr = None, timeout = None):
+            clock.advance_ms(10)
+            sim.join_requests += 1
+            sim.airtime_ms += sim.time_on_air_ms(12 - (dr if dr is not None else 0), 23)
+            if sim.coverage:
+                delay = sim.join_delay_ms if activation == LoRa.OTAA else 0
+                sim.lora_session = {'joined_at': clock.us + delay * 1000}
+
+        def nvram_save(self):
+            clock.advance_ms(5)
+            sim.lora_nvram = dict(sim.lora_session) if self.has_joined() else None
+
+        def nvram_restore(self):
+            clock.advance_ms(5)
+            if sim.lora_nvram is not None:
+                sim.lora_session = dict(sim.lora_nvram)
+
+        def nvram_erase(self):
+            sim.lora_nvram = None
+
+        def stats(self):
+            return sim.lora_stats
+
+    LoRaStats = collections.namedtuple('LoRaStats', ('rx_timestamp', 'rssi', 'snr', 'sftx', 'sfrx', 'tx_trials',
+                                                     'tx_power', 'tx_time_on_air', 'tx_counter', 'tx_frequency'))
+    network = _module('network', LoRa = LoRa)
+
+    def receive(sf):
+        """A downlink in RX1 (same SF as the uplink): update lora.stats()."""
+        snr = round(sim.link_rng.gauss(sim.snr, sim.snr_sigma), 1)
+        sim.lora_stats = sim.lora_stats._replace(rx_timestamp = clock.us, rssi = round(-120 + snr), snr = snr,
+                                                 sfrx = sf)
+
+    # ----- socket -----
+    class LoRaSocket:
+        def __init__(self, family = None, type = None):
+            self.dr = 0
+            self.port = 1
+            self.confirmed = False
+            self.blocking = True
+
+        def setsockopt(self, level, option, value):
+            if option == SO_DR:
+                self.dr = value
+            elif option == SO_CONFIRMED:
+                self.confirmed = bool(value)
+
+        def setblocking(self, flag):
+            self.blocking = flag
+
+        def settimeout(self, value):
+            self.blocking = value is None or value > 0
+
+        def bind(self, port):
+            self.port = port
+
+        def send(self, data):
+            if sim.lora_session is None or clock.us < sim.lora_session['joined_at']:
+                raise OSError(11)                   # EAGAIN: not joined
+            sf = 12 - self.dr
+            toa = sim.time_on_air_ms(sf, len(data) + 13)
+            clock.advance_ms(toa, 'tx')
+            sim.airtime_ms += toa
+            delivered = sim.coverage and sim.link_rng.gauss(sim.snr, sim.snr_sigma) >= REQUIRED_SNR[sf]
+            sim.uplinks.append({'time': clock.us / 1e6, 'fport': self.port, 'sf': sf, 'confirmed': self.confirmed,
+                                'payload': bytes(data), 'delivered': delivered})
+            sim.lora_stats = sim.lora_stats._replace(sftx = sf, tx_trials = 1, tx_time_on_air = round(toa),
+                                                     tx_counter = sim.lora_stats.tx_counter + 1)
+            if self.blocking:
+                if delivered and (self.confirmed or sim.downlinks):
+                    receive(sf)                     # ACK and / or a queued downlink
+                clock.advance_ms(2000, 'rx')        # class A: RX1 and RX2 windows
+            return len(data)
+
+        def recv(self, nbytes):
+            return self.recvfrom(nbytes)[0]
+
+        def recvfrom(self, nbytes):
+            if sim.downlinks:
+                port, payload = sim.downlinks.pop(0)
+                return payload[:nbytes], port
+            return b'', 0
+
+        def close(self):
+            pass
+
+    AF_LORA, SOCK_RAW, SOL_LORA, SO_DR, SO_CONFIRMED = 160, 3, 0xFFFF, 0x01, 0x02
+    REQUIRED_SNR = {7: -7.5, 8: -10.0, 9: -12.5, 10: -15.0, 11: -17.5, 12: -20.0}  # demodulation floor per SF in dB
+    socket = _module('socket', socket = LoRaSocket, AF_LORA = AF_LORA, SOCK_RAW = SOCK_RAW,
+                     SOL_LORA = SOL_LORA, SO_DR = SO_DR, SO_CONFIRMED = SO_CONFIRMED)
+
+    # ----- framebuf -----
+    class FrameBuffer:
+        """MONO_VLSB frame buffer; text is drawn with a fake 8x8 font that still touches the right pages."""
+        def __init__(self, buffer, width, height, format = 0):
+            self.buffer = buffer
+            self.width = width
+            self.height = height
+
+        def fill(self, col):
+            value = 0xFF if col else 0x00
+            for i in range(self.width * (self.height // 8)):
+                self.buffer[i] = value
+
+        def pixel(self, x, y, col = None):
+            if not (0 <= x < self.width and 0 <= y < self.height):
+                return None
+            index, bit = (y // 8) * self.width + x, 1 << (y % 8)
+            if col is None:
+                return int(bool(self.buffer[index] & bit))
+            if col:
+                self.buffer[index] |= bit
+            else:
+                self.buffer[index] &= ~bit & 0xFF
+
+        def text(self, string, x, y, col = 1):
+            for n, char in enumerate(string):
+                code = ord(char)
+                if char == ' ':
+                    continue
+                for dx in range(8):
+                    for dy in range(8):
+                        if (code >> ((dx + dy) % 7)) & 1:
+                            self.pixel(x + n * 8 + dx, y + dy, col)
+
+    framebuf = _module('framebuf', FrameBuffer = FrameBuffer, FrameBuffer1 = FrameBuffer, MONO_VLSB = 0)
+
+    # ----- micropython / ucollections -----
+    micropython = _module('micropython', const = lambda value: value)
+    ucollections = _module('ucollections', OrderedDict = collections.OrderedDict,
+                           namedtuple = collections.namedtuple, deque = collections.deque)
+
+    # ----- time: MicroPython ticks on the virtual clock -----
+    simtime = _module('time',
+                      ticks_ms = lambda: clock.ticks_ms, ticks_us = lambda: clock.ticks_us,
+                      ticks_cpu = lambda: clock.ticks_us, ticks_add = lambda ticks, delta: ticks + delta,
+                      ticks_diff = lambda new, old: new - old,
+                      sleep = lambda seconds: clock.advance_us(max(0, seconds) * 1e6),
+                      sleep_ms = clock.advance_ms, sleep_us = clock.advance_us,
+                      time = lambda: int(clock.rtc()), gmtime = lambda secs = None: _time.gmtime(
+                          int(clock.rtc()) if secs is None else secs),
+                      localtime = lambda secs = None: _time.gmtime(int(clock.rtc()) if secs is None else secs),
+                      mktime = lambda t: calendar.timegm(tuple(t[:6]) + (0, 0, 0)),
+                      monotonic = lambda: clock.us / 1e6)
+
+    # ----- os: the real module with /sd mapped onto the host directory of the SD card -----
+    simos = _module('os', mount = lambda device, path: None, umount = lambda path: None,
+                    stat = lambda path: _os.stat(sim.host_path(path)),
+                    listdir = lambda path = '/flash': _os.listdir(sim.host_path(path)),
+                    remove = lambda path: _os.remove(sim.host_path(path)))
+    simos.__getattr__ = lambda name: getattr(_os, name)
+
+    # ----- secret: keys and file names that are not part of the repository -----
+    secret = _module('secret', auth = lambda: (b'\x00' * 8, b'\x00' * 16),
+                     file_upgrade = '/sd/upgrade.py', file_firmware = '/sd/firmware.bin')
+
+    return {'machine': machine, 'pycom': pycom, 'network': network, 'socket': socket, 'framebuf': framebuf,
+            'micropython': micropython, 'ucollections': ucollections, 'time': simtime, 'utime': simtime,
+            'os': simos, 'uos': simos, 'secret': secret}
+
+def time_on_air_ms(sf, length, bandwidth = 125000):
+    """Semtech LoRa time on air for EU868 LoRaWAN (CR 4/5, 8 symbol preamble, explicit header, CRC)."""
+    t_sym = (2 ** sf) / bandwidth
+    de = 1 if sf >= 11 and bandwidth == 125000 else 0
+    payload_symbols = 8 + max(math.ceil((8 * length - 4 * sf + 28 + 16) / (4 * (sf - 2 * de))) * 5, 0)
+    return ((8 + 4.25) + payload_symbols) * t_sym * 1000
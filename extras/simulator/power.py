@@ -0,0 +1,45 @@
+# current model of the sensor box, so every simulated cycle produces a current trace like the bench measurement
+# all values in mA at the battery; the peripheral values are the ones noted next to the drivers in _main.py
+# the board values are fitted to extras/power_consumption.csv (FW v2.7.0)
+
+ACTIVE, SLEEP, TX, RX, DEEPSLEEP = 'active', 'sleep', 'tx', 'rx', 'deepsleep'
+
+CURRENT_MA = {
+    'active':    45.0,                              # LoPy4 running (boot, busy waiting, I2C traffic)
+    'sleep':      6.6,                              # LoPy4 in machine.sleep()
+    'deepsleep':  2.4,                              # complete box in deepsleep (regulator and GPS held off)
+    'tx':        75.0,                              # SX1276 transmitting at 14 dBm, on top of 'active'
+    'rx':        10.0,                              # SX1276 listening in the RX windows, on top of 'active'
+    'display':    4.4,                              # SSD1306 switched on
+    'sds011':   110.0,                              # SDS011 fan and laser running
+    'scd41':     50.0,                              # SCD41 single shot measurement in progress
+    'bme680':    12.0,                              # BME680 conversion (heater) in progress
+    'tsl2591':    0.4,                              # TSL2591 enabled
+    'veml6070':   0.4,                              # VEML6070 enabled
+    'max4466':    0.3,                              # microphone amplifier, always powered
+    'gps':       45.0,                              # NEO-6M powered (acquisition)
+}
+
+def current_ma(sim, mode, currents = CURRENT_MA):
+    """Total current drawn by the box while the clock advances in the given mode."""
+    if mode == DEEPSLEEP:
+        return currents['deepsleep']
+    ma = currents[SLEEP if mode == SLEEP else ACTIVE] + currents['max4466']
+    if mode in (TX, RX):
+        ma += currents[mode]
+    now = sim.clock.us
+    if sim.display.on:
+        ma += currents['display']
+    if sim.sds011.fan and sim.sds011.powered():
+        ma += currents['sds011']
+    if sim.neo6m.powered():
+        ma += currents['gps']
+    if sim.scd41._ready_at is not None and now < sim.scd41._ready_at:
+        ma += currents['scd41']
+    if sim.bme680._ready_at is not None and now < sim.bme680._ready_at:
+        ma += currents['bme680']
+    if sim.tsl2591._enabled_at is not None:
+        ma += currents['tsl2591']
+    if not sim.veml6070.command & 0x01:
+        ma += currents['veml6070']
+    return ma
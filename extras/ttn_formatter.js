@@ -0,0 +1,131 @@
+// TTN payload formatter of the MJLO kastjes, generated by extras/payload.py from software/schema.py - do not edit
+// schema version 2
+// per fport, the layout of every schema version (newest first): [version, fields]; a frame is decoded with the version
+// of its length, so boxes that still run older firmware are decoded too
+// fields: [name, bits, offset, precision, decimals, fields marked missing by the bits of this one, bit 0 first]
+var LAYOUTS = {"1": [[2, [["temp", 16, 100, 0.01, 2, null], ["humi", 8, 0, 0.5, 1, null], ["pres", 16, 0, 0.1, 1, null], ["voc", 16, 0, 1, 0, null], ["lx", 16, 0, 1, 0, null], ["uv", 16, 0, 1, 0, null], ["volu", 8, 0, 0.5, 1, null], ["batt", 16, 0, 0.001, 3, null], ["co2", 16, 0, 0.1, 1, null], ["pm25", 16, 0, 0.1, 1, null], ["pm10", 16, 0, 0.1, 1, null], ["miss", 8, 0, 1, 0, ["co2"]]]], [1, [["temp", 16, 100, 0.01, 2, null], ["humi", 8, 0, 0.5, 1, null], ["pres", 16, 0, 0.1, 1, null], ["voc", 16, 0, 1, 0, null], ["lx", 16, 0, 1, 0, null], ["uv", 16, 0, 1, 0, null], ["volu", 8, 0, 0.5, 1, null], ["batt", 16, 0, 0.001, 3, null], ["co2", 16, 0, 0.1, 1, null], ["pm25", 16, 0, 0.1, 1, null], ["pm10", 16, 0, 0.1, 1, null]]]], "2": [[2, [["temp", 16, 100, 0.01, 2, null], ["humi", 8, 0, 0.5, 1, null], ["pres", 16, 0, 0.1, 1, null], ["voc", 16, 0, 1, 0, null], ["lx", 16, 0, 1, 0, null], ["uv", 16, 0, 1, 0, null], ["volu", 8, 0, 0.5, 1, null], ["batt", 16, 0, 0.001, 3, null], ["co2", 16, 0, 0.1, 1, null], ["pm25", 16, 0, 0.1, 1, null], ["pm10", 16, 0, 0.1, 1, null], ["lat", 24, 90, 0.0001, 4, null], ["long", 24, 180, 0.0001, 4, null], ["alt", 16, 100, 0.1, 1, null], ["hdop", 8, 0, 0.1, 1, null], ["fw", 8, 0, 1, 0, null], ["gpsq", 8, 0, 1, 0, null], ["miss", 8, 0, 1, 0, ["co2"]]]], [1, [["temp", 16, 100, 0.01, 2, null], ["humi", 8, 0, 0.5, 1, null], ["pres", 16, 0, 0.1, 1, null], ["voc", 16, 0, 1, 0, null], ["lx", 16, 0, 1, 0, null], ["uv", 16, 0, 1, 0, null], ["volu", 8, 0, 0.5, 1, null], ["batt", 16, 0, 0.001, 3, null], ["co2", 16, 0, 0.1, 1, null], ["pm25", 16, 0, 0.1, 1, null], ["pm10", 16, 0, 0.1, 1, null], ["lat", 24, 90, 0.0001, 4, null], ["long", 24, 180, 0.0001, 4, null], ["alt", 16, 100, 0.1, 1, null], ["hdop", 8, 0, 0.1, 1, null], ["fw", 8, 0, 1, 0, null], ["gpsq", 8, 0, 1, 0, null]]], [0, [["temp", 16, 100, 0.01, 2, null], ["humi", 8, 0, 0.5, 1, null], ["pres", 16, 0, 0.1, 1, null], ["voc", 16, 0, 1, 0, null], ["lx", 16, 0, 1, 0, null], ["uv", 16, 0, 1, 0, null], ["volu", 8, 0, 0.5, 1, null], ["batt", 16, 0, 0.001, 3, null], ["co2", 16, 0, 0.1, 1, null], ["pm25", 16, 0, 0.1, 1, null], ["pm10", 16, 0, 0.1, 1, null], ["lat", 24, 90, 0.0001, 4, null], ["long", 24, 180, 0.0001, 4, null], ["alt", 16, 100, 0.1, 1, null], ["hdop", 8, 0, 0.1, 1, null], ["fw", 8, 0, 1, 0, null]]]], "4": [[2, [["fw", 8, 0, 1, 0, null], ["error", 8, 128, 1, 0, null], ["batt", 16, 0, 0.001, 3, null]]]], "5": [[2, [["temp", 14, 40, 0.01, 2, null], ["humi", 8, 0, 0.5, 1, null], ["pres", 13, -300, 0.1, 1, null], ["voc", 16, 0, 1, 0, null], ["lx", 16, 0, 1, 0, null], ["uv", 16, 0, 1, 0, null], ["volu", 8, 0, 0.5, 1, null], ["batt", 11, -2.5, 0.001, 3, null], ["co2", 13, 0, 1, 0, null], ["pm25", 14, 0, 0.1, 1, null], ["pm10", 14, 0, 0.1, 1, null], ["miss", 8, 0, 1, 0, ["co2"]]]], [1, [["temp", 14, 40, 0.01, 2, null], ["humi", 8, 0, 0.5, 1, null], ["pres", 13, -300, 0.1, 1, null], ["voc", 16, 0, 1, 0, null], ["lx", 16, 0, 1, 0, null], ["uv", 16, 0, 1, 0, null], ["volu", 8, 0, 0.5, 1, null], ["batt", 11, -2.5, 0.001, 3, null], ["co2", 13, 0, 1, 0, null], ["pm25", 14, 0, 0.1, 1, null], ["pm10", 14, 0, 0.1, 1, null]]]], "6": [[2, [["temp", 14, 40, 0.01, 2, null], ["humi", 8, 0, 0.5, 1, null], ["pres", 13, -300, 0.1, 1, null], ["voc", 16, 0, 1, 0, null], ["lx", 16, 0, 1, 0, null], ["uv", 16, 0, 1, 0, null], ["volu", 8, 0, 0.5, 1, null], ["batt", 11, -2.5, 0.001, 3, null], ["co2", 13, 0, 1, 0, null], ["pm25", 14, 0, 0.1, 1, null], ["pm10", 14, 0, 0.1, 1, null], ["lat", 21, 90, 0.0001, 4, null], ["long", 22, 180, 0.0001, 4, null], ["alt", 14, 100, 0.1, 1, null], ["hdop", 8, 0, 0.1, 1, null], ["fw", 7, 0, 1, 0, null], ["gpsq", 2, 0, 1, 0, null], ["miss", 8, 0, 1, 0, ["co2"]]]], [1, [["temp", 14, 40, 0.01, 2, null], ["humi", 8, 0, 0.5, 1, null], ["pres", 13, -300, 0.1, 1, null], ["voc", 16, 0, 1, 0, null], ["lx", 16, 0, 1, 0, null], ["uv", 16, 0, 1, 0, null], ["volu", 8, 0, 0.5, 1, null], ["batt", 11, -2.5, 0.001, 3, null], ["co2", 13, 0, 1, 0, null], ["pm25", 14, 0, 0.1, 1, null], ["pm10", 14, 0, 0.1, 1, null], ["lat", 21, 90, 0.0001, 4, null], ["long", 22, 180, 0.0001, 4, null], ["alt", 14, 100, 0.1, 1, null], ["hdop", 8, 0, 0.1, 1, null], ["fw", 7, 0, 1, 0, null], ["gpsq", 2, 0, 1, 0, null]]]], "7": [[2, [["temp", 14, 40, 0.01, 2, null], ["humi", 8, 0, 0.5, 1, null], ["pres", 13, -300, 0.1, 1, null], ["voc", 16, 0, 1, 0, null], ["lx", 16, 0, 1, 0, null], ["uv", 16, 0, 1, 0, null], ["volu", 8, 0, 0.5, 1, null], ["batt", 11, -2.5, 0.001, 3, null], ["co2", 13, 0, 1, 0, null], ["pm25", 14, 0, 0.1, 1, null], ["pm10", 14, 0, 0.1, 1, null], ["miss", 8, 0, 1, 0, ["co2"]], ["age", 12, 0, 1, 0, null]]], [1, [["temp", 14, 40, 0.01, 2, null], ["humi", 8, 0, 0.5, 1, null], ["pres", 13, -300, 0.1, 1, null], ["voc", 16, 0, 1, 0, null], ["lx", 16, 0, 1, 0, null], ["uv", 16, 0, 1, 0, null], ["volu", 8, 0, 0.5, 1, null], ["batt", 11, -2.5, 0.001, 3, null], ["co2", 13, 0, 1, 0, null], ["pm25", 14, 0, 0.1, 1, null], ["pm10", 14, 0, 0.1, 1, null], ["age", 12, 0, 1, 0, null]]]]};
+var PHASES = ["boot", "setup", "bme680", "tsl2591", "veml6070", "max4466", "kp26650", "scd41", "sds011", "gps", "send", "display"];
+var NOT_RUN = 65535;
+var BATCH = 7;
+// configuration downlinks: [type, NVS keys, bytes per key, minimum, maximum]
+var DOWNLINK_PORT = 10;
+var COMMANDS = [[1, ["t_int"], 2, 120, 65535], [2, ["sf_l", "sf_h"], 1, 7, 12], [3, ["adr"], 1, 1, 255], [4, ["gps_req"], 0, 1, 1], [5, ["display"], 1, 0, 2], [6, ["t_disp"], 1, 0, 255], [7, ["batch"], 1, 0, 10]];
+
+function readBits(bytes, position, bits) {
+  var value = 0;
+  for (var i = position; i < position + bits; i++) {
+    value = value * 2 + ((bytes[i >> 3] >> (7 - (i & 7))) & 1);
+  }
+  return value;
+}
+
+function frameSize(layout) {
+  var bits = 0;
+  for (var f = 0; f < layout.length; f++) {
+    bits += layout[f][1];
+  }
+  return Math.ceil(bits / 8);
+}
+
+function selectLayout(versions, bytes, batch) {
+  var start = batch ? 1 : 0, count = batch ? bytes[0] : 1, fitting = null;
+  for (var v = 0; v < versions.length; v++) {
+    var length = start + count * frameSize(versions[v][1]);
+    if (length === bytes.length) {
+      return versions[v][1];
+    }
+    if (length <= bytes.length && !fitting) {
+      fitting = versions[v][1];
+    }
+  }
+  return fitting;
+}
+
+function decodeUplink(input) {
+  var bytes = input.bytes, data = {};
+  if (input.fPort === 3) {
+    data.records = bytes[0];
+    for (var p = 0; p < PHASES.length; p++) {
+      var mean = readBits(bytes, 8 + 32 * p, 16), max = readBits(bytes, 24 + 32 * p, 16);
+      data[PHASES[p]] = mean === NOT_RUN ? null : {mean: mean, max: max};
+    }
+    return {data: data};
+  }
+  var versions = LAYOUTS[input.fPort];
+  if (!versions) {
+    return {errors: ["unknown fport " + input.fPort]};
+  }
+  var layout = selectLayout(versions, bytes, input.fPort === BATCH);
+  if (!layout) {
+    return {errors: ["payload too short for fport " + input.fPort]};
+  }
+  if (input.fPort === BATCH) {
+    var size = frameSize(layout);
+    data.records = [];
+    for (var r = 0; r < bytes[0]; r++) {
+      var record = decodeFields(bytes.slice(1 + r * size, 1 + (r + 1) * size), layout);
+      if (!record) {
+        return {errors: ["payload too short for fport " + input.fPort]};
+      }
+      data.records.push(record);
+    }
+    return {data: data};
+  }
+  data = decodeFields(bytes, layout);
+  if (!data) {
+    return {errors: ["payload too short for fport " + input.fPort]};
+  }
+  return {data: data};
+}
+
+function decodeFields(bytes, layout) {
+  var data = {}, missing = [], position = 0;
+  for (var f = 0; f < layout.length; f++) {
+    var field = layout[f];
+    if (position + field[1] > 8 * bytes.length) {
+      return null;
+    }
+    var raw = readBits(bytes, position, field[1]);
+    data[field[0]] = Number((raw * field[3] - field[2]).toFixed(field[4]));
+    for (var m = 0; field[5] && m < field[5].length; m++) {
+      if ((raw >> m) & 1) {
+        missing.push(field[5][m]);
+      }
+    }
+    position += field[1];
+  }
+  for (m = 0; m < missing.length; m++) {
+    data[missing[m]] = null;
+  }
+  return data;
+}
+
+function encodeDownlink(input) {
+  var bytes = [];
+  for (var c = 0; c < COMMANDS.length; c++) {
+    var keys = COMMANDS[c][1], size = COMMANDS[c][2], given = 0;
+    for (var k = 0; k < keys.length; k++) {
+      given += input.data[keys[k]] === undefined ? 0 : 1;
+    }
+    if (!given) {
+      continue;
+    }
+    if (given < keys.length) {
+      return {errors: [keys.join(" and ") + " go together"]};
+    }
+    bytes.push(COMMANDS[c][0]);
+    for (k = 0; k < keys.length; k++) {
+      var value = Number(input.data[keys[k]]);
+      if (!(value >= COMMANDS[c][3] && value <= COMMANDS[c][4]) || Math.floor(value) !== value) {
+        return {errors: [keys[k] + " out of range: " + input.data[keys[k]]]};
+      }
+      for (var b = size - 1; b >= 0; b--) {
+        bytes.push(Math.floor(value / Math.pow(256, b)) % 256);
+      }
+    }
+  }
+  if (input.data.sf_l > input.data.sf_h) {
+    return {errors: ["sf_l above sf_h"]};
+  }
+  return {bytes: bytes, fPort: DOWNLINK_PORT};
+}
@@ -0,0 +1,143 @@
+# GPS session on top of the NMEA parser: aids the NEO-6M with the last good fix and keeps that fix in NVS
+# a position and time hint (UBX-AID-INI) lets the receiver search only for the satellites that are in view,
+# which shortens the time to first fix; the RTC is set from every good fix, so it can provide the time hint
+# the acquisition is bounded: it stops when hdop stops improving, when no satellites are found, or when the time budget
+# is spent, and then falls back to the cached position; the quality of the reported position goes along in the frame
+import math
+import struct
+import time
+import machine
+import storage
+from lib.NMEA import NMEA
+
+_KEY = 'gpsfix'
+_GPS_EPOCH = 315964800                              # 1980-01-06 00:00 UTC in seconds since 1970
+_LEAP_SECONDS = 18                                  # GPS time runs ahead of UTC (since 2017)
+_BOOT_MS = 1000                                     # the receiver ignores commands right after power on
+_POSITION_ACC = 10000                               # accuracy of the cached position in metres (the box may be moved)
+_EARTH_RADIUS = 6371000
+_IMPROVEMENT = 0.9                                  # hdop must drop below 90% of the best value so far to count as progress
+
+FIX, PLATEAU, CACHED, NONE = 0, 1, 2, 3             # quality of the reported position ('gpsq' in the fport 2 frame)
+
+def load_fix():
+    """Return the last good fix as (latitude, longitude, altitude, utc seconds since 1970 or 0), or None."""
+    blob = storage.load(_KEY)
+    if blob is None or len(blob) != 16:
+        return None
+    latitude, longitude, altitude, utc = struct.unpack('>iiiI', blob)
+    return latitude / 1e7, longitude / 1e7, altitude / 100, utc
+
+def save_fix(latitude, longitude, altitude, utc):
+    storage.save(_KEY, struct.pack('>iiiI', round(latitude * 1e7), round(longitude * 1e7), round(altitude * 100), utc))
+
+def distance(lat1, lon1, lat2, lon2):
+    """Distance between two positions in metres (equirectangular approximation, fine for small distances)."""
+    x = math.radians(lon2 - lon1) * math.cos(math.radians((lat1 + lat2) / 2))
+    y = math.radians(lat2 - lat1)
+    return _EARTH_RADIUS * math.sqrt(x * x + y * y)
+
+def ubx(cls, id, payload):
+    """Frame a UBX message: header, class, id, length, payload and Fletcher checksum."""
+    frame = bytearray(b'\xb5\x62') + struct.pack('<BBH', cls, id, len(payload)) + payload
+    ck_a = ck_b = 0
+    for byte in frame[2:]:
+        ck_a = (ck_a + byte) & 0xFF
+        ck_b = (ck_b + ck_a) & 0xFF
+    frame.append(ck_a)
+    frame.append(ck_b)
+    return frame
+
+def aid_ini(latitude, longitude, altitude, position_acc, utc = None, time_acc = 0):
+    """UBX-AID-INI with a position hint, and a time hint if utc (seconds since 1970) is given.
+    Accuracies are in metres and seconds."""
+    flags = 0x21                                    # position given, as latitude / longitude / altitude
+    week = tow = 0
+    if utc is not None:
+        flags |= 0x02                               # time given, as GPS week number and time of week
+        seconds = utc - _GPS_EPOCH + _LEAP_SECONDS
+        week, tow = seconds // 604800, (seconds % 604800) * 1000
+    payload = struct.pack('<iiiIhHIiIIiII',
+                          round(latitude * 1e7), round(longitude * 1e7), round(altitude * 100), position_acc * 100,
+                          0, week, tow, 0, time_acc * 1000, 0, 0, 0, flags)
+    return ubx(0x0B, 0x01, payload)
+
+class GPS(NMEA):
+    def __init__(self, uart, radius = 50, budget = 120, settle = 10, no_sky = 45):
+        super().__init__()
+        self.uart = uart
+        self.radius = radius                        # a fix within this many metres of the cached one is accepted early
+        self.budget = budget * 1000                 # give up this many seconds after power on
+        self.settle = settle * 1000                 # accept a fix whose hdop and satellites did not improve for this long
+        self.no_sky = no_sky * 1000                 # give up early if not a single satellite is tracked by then
+        self.cached = load_fix()
+        self.quality = NONE
+        self.started = time.ticks_ms()              # the receiver is powered right before this object is created
+        self._progress = self.started               # last time hdop or the number of satellites improved
+        self._best = self.hdop
+        self._satellites = 0
+
+    def aiding(self):
+        """Scheduler task: send the cached fix, and the time if the RTC is set, once the receiver has booted."""
+        if self.cached is None:
+            return
+        yield _BOOT_MS
+        latitude, longitude, altitude, utc = self.cached
+        now = time.time()
+        if utc and now >= utc:                      # the RTC was set by an earlier fix (it is lost on poweron)
+            time_acc = 2 + (now - utc) // 20        # the RTC drifts up to 5% during deepsleep
+            self.uart.write(aid_ini(latitude, longitude, altitude, _POSITION_ACC, now, time_acc))
+        else:
+            self.uart.write(aid_ini(latitude, longitude, altitude, _POSITION_ACC))
+
+    def fixed(self):
+        """Is the fix good enough: hdop <= 5, or any fix close to the cached one."""
+        if not self.valid:
+            return False
+        if self.hdop <= 5:
+            return True
+        return self.cached is not None and distance(self.latitude, self.longitude,
+                                                    self.cached[0], self.cached[1]) <= self.radius
+
+    def done(self):
+        """Should the acquisition stop? Sets quality, and falls back to the cached position if there is no fix."""
+        if self.fixed():
+            self.quality = FIX
+            return True
+        now = time.ticks_ms()
+        if self.satellites > self._satellites:
+            self._satellites = self.satellites
+            self._progress = now
+        if self.valid and self.hdop < self._best * _IMPROVEMENT:
+            self._best = self.hdop
+            self._progress = now
+        elapsed = time.ticks_diff(now, self.started)
+        if self.valid and (time.ticks_diff(now, self._progress) >= self.settle or elapsed >= self.budget):
+            self.quality = PLATEAU                  # the best fix this location allows for now
+            return True
+        if elapsed >= self.budget or (not self._satellites and elapsed >= self.no_sky):
+            self.fall_back()
+            return True
+        return False
+
+    def fall_back(self):
+        """Report the cached position (with the hdop of no fix), or zeros if there never was a fix."""
+        if self.cached is None:
+            self.quality = NONE
+            self.latitude = self.longitude = self.altitude = 0.0
+        else:
+            self.quality = CACHED
+            self.latitude, self.longitude, self.altitude, _ = self.cached
+        self.hdop = 99.99
+
+    def save(self):
+        """Set the RTC from the fix and cache the fix in NVS for the next session (only for an actual fix)."""
+        if self.quality > PLATEAU:
+            return
+        day, month, year = self.date
+        utc = 0                                     # time of the fix unknown
+        if year:
+            hours, minutes, seconds = self.timestamp
+            machine.RTC().init((2000 + year, month, day, hours, minutes, int(seconds)))
+            utc = time.time()
+        save_fix(self.latitude, self.longitude, self.altitude, utc)
@@ -1,27 +1,28 @@
 import network
 import socket
-import pycom
+import struct
 import time
+import storage
+import config
+import airtime
+import link
+import downlink
+import schema
 
-_configs = { # bytes, offset, precision
-        'temp' : (2, 100, 0.01  ),
-        'pres' : (2,   0, 0.1   ),
-        'humi' : (1,   0, 0.5   ),
-        'voc'  : (2,   0, 1     ),
-        'uv'   : (2,   0, 1     ),
-        'lx'   : (2,   0, 1     ),
-        'volu' : (1,   0, 0.5   ),
-        'batt' : (2,   0, 0.001 ),
-        'co2'  : (2,   0, 0.1   ),
-        'pm25' : (2,   0, 0.1   ),
-        'pm10' : (2,   0, 0.1   ),
-        'lat'  : (3,  90, 0.0001),
-        'long' : (3, 180, 0.0001),
-        'alt'  : (2, 100, 0.1   ),
-        'hdop' : (1,   0, 0.1   ),
-        'fw'   : (1,   0, 1     ),
-        'error': (1, 128, 1     )
-}
+BATCH_MAX = 10                                                      # records kept in NVS at most (downlink.py: the highest batch)
+_MAX_PAYLOAD = {7: 222, 8: 222, 9: 115, 10: 51, 11: 51, 12: 51}     # bytes per uplink for each SF (EU868)
+_QUEUE = 'queue'                                                    # ring of BATCH_MAX batch records (RTC time, record)
+_QHEAD = 'qhead'                                                    # oldest record in the ring
+_QLEN = 'qlen'                                                      # number of records in the ring
+_KEPT = 'kept'                                                      # a GPS frame that waits for the join (fport, frame)
+_JOIN_BACKOFF = 300                                                 # seconds before the next join request after a failure,
+_JOIN_MAX = 6 * 3600                                                # doubling up to 6 hours (the LoRaWAN join duty cycle)
+_JOIN_WAIT = 15                                                     # seconds for a join accept (RX2 comes after 6 seconds)
+_JOIN_SLACK = 60                                                    # a cycle may start this much before the next join is due
+_PRIORITY = (2, 4, 6)                                               # GPS and error frames only need to fit the daily budget
+
+_layouts = {fport: schema.layout(fport) for fport in schema.FIELDS}
+_FRAME_SIZE = max(max(size for fields, size in _layouts.values()), 1 + BATCH_MAX * _layouts[schema.BATCH][1])
 
 class LoRaWAN:
     def __init__(self, sf = None, fport = None):
@@ -35,28 +36,49 @@ class LoRaWAN:
 
         # if, after restoring data from nvram, it turns out that lora is not joined, join now
         # this join is performed non-blocking as it should have completed before sending a message
+        downlink.resume()                                           # finish a configuration interrupted by a reset
+        self.airtime = airtime.Ledger()                            # airtime of the last 24 hours, for the fair use policy
+        self._failed = 0
+        self._joining = None                                        # time of the join request of this cycle
         if not self.has_joined:
-            import secret
-            self.lora.join(activation = pycom.nvs_get('lora'),      # 0 = OTAA, 1 = ABP
-                           auth = secret.auth(),                    # get keys for this specific node
-                           dr = 12 - pycom.nvs_get('sf_h'))         # always join using maximum power
+            self._failed = config.get('jfail', 0)                   # join requests that were not answered
+            wait = config.get('jnext', 0) - time.time()
+            if not _JOIN_SLACK < wait <= _JOIN_MAX:                 # due, or the RTC was reset by a poweron
+                import secret
+                activation = config.get('lora')
+                self.lora.join(activation = activation,             # 0 = OTAA, 1 = ABP
+                               auth = secret.auth(),                # get keys for this specific node
+                               dr = 12 - config.get('sf_h'))        # always join using maximum power
+                if activation == network.LoRa.OTAA:
+                    self.airtime.add(airtime.time_on_air_ms(config.get('sf_h'), airtime.JOIN_LENGTH))
+                self._joining = time.time()
             self._fcnt = 0                                          # default LoRa frame count
         else:
-            self._fcnt = pycom.nvs_get('fcnt')                      # restore LoRa frame count from nvRAM
+            self._fcnt = config.get('fcnt')                         # restore LoRa frame count from nvRAM
 
+        self.link = link.Link()                                     # SNR of recent downlinks
+        self._confirm = False
+        sf_h = config.get('sf_h')
+        self._lowest = self.link.floor(sf_h, config.get('sf_l'))    # the fair use budget may not push the SF below it
         if sf:
             self._dr = 12 - sf
         else:
-            self._dr = 12 - pycom.nvs_get('sf_l')                   # default SF (low)
-            if self._fcnt % pycom.nvs_get('adr') == 0:
-                self._dr = 12 - pycom.nvs_get('sf_h')               # every adr'th message, send on high SF
+            sf_l = self.link.sf(sf_h)                               # lowest SF with margin, None if the link is unknown
+            self._dr = 12 - (sf_l or config.get('sf_l'))
+            if self._fcnt % config.get('adr') == 0:
+                self._confirm = self.link.probe_due()               # now and then ask for an ACK to measure the link
+                if not (self._confirm and sf_l):                    # (a known link is probed at its own SF)
+                    self._dr = 12 - sf_h                            # every adr'th message, send on high SF
 
+        self._packed = config.get('packed', 0)                     # send measurements bit-packed (fport 5 / 6)
         if fport:
             self._fport = 4
         else:
-            self._fport = 1                                         # default LoRa packet decoding type 1 (no GPS)
+            self.fport = 1                                          # default LoRa packet decoding type 1 (no GPS)
 
-        self._frame = bytes([])
+        self._buffer = bytearray(_FRAME_SIZE)                      # allocated once, every frame is written into it
+        self._view = memoryview(self._buffer)
+        self._frame = self._view[:0]
     
     @property
     def fcnt(self):
@@ -80,46 +102,186 @@ class LoRaWAN:
     
     @fport.setter
     def fport(self, port):
-        self._fport = port
+        self._fport = schema.PACKED.get(port, port) if self._packed else port
 
     @property
     def frame(self):
         return self._frame
+
+    @frame.setter
+    def frame(self, frame):
+        self._frame = bytes(frame)
     
     @property
     def has_joined(self):
         return self.lora.has_joined()
 
-    @staticmethod
-    def pack(name, values):
-        numbytes, offset, precision  = _configs[name]
-        value = round((values + offset) / precision)                # add offset, then round to precision
-        value = max(0, min(value, 2**(8*numbytes) - 1))             # stay in range 0 .. int.max_size - 1
-        out = value.to_bytes(numbytes, 'big')                       # pack to bytes
-        return out
+    def make_frame(self, values):
+        """Pack the fields of the current fport from values (a dict, missing fields are 0) into the frame buffer,
+        without allocating."""
+        fields, size = _layouts[self._fport]
+        buffer = self._buffer
+        for i in range(size):
+            buffer[i] = 0
+        schema.pack(buffer, 0, fields, values)
+        self._frame = self._view[:size]
+
+        return size
+
+    def queue(self, values):
+        """Keep the measurement as a batch record in NVS, together with the RTC time. Returns the number of queued
+        records; the oldest record is overwritten if the queue is full. Only the words of the new record are written."""
+        fields, size = _layouts[schema.BATCH]
+        if storage.get(_QUEUE) != BATCH_MAX * (4 + size):           # first use, or an older queue layout
+            storage.allocate(_QUEUE, BATCH_MAX * (4 + size))
+            config.put(_QHEAD, 0)
+            config.put(_QLEN, 0)
+        head, count = config.get(_QHEAD, 0), config.get(_QLEN, 0)
+        buffer = self._buffer
+        for i in range(4, 4 + size):                                # the buffer still holds the last frame
+            buffer[i] = 0
+        record = self._view[:4 + size]
+        struct.pack_into('>I', record, 0, time.time())
+        schema.pack(record, 32, fields, values)
+        storage.write(_QUEUE, (head + count) % BATCH_MAX * (4 + size), record)
+        if count == BATCH_MAX:
+            config.put(_QHEAD, (head + 1) % BATCH_MAX)
+        else:
+            config.put(_QLEN, count + 1)
+        return min(count + 1, BATCH_MAX)
+
+    def capacity(self):
+        """Number of batch records that one fport 7 frame carries at the current SF, at most BATCH_MAX."""
+        return min((_MAX_PAYLOAD[self.sf] - 1) // _layouts[schema.BATCH][1], BATCH_MAX)
+
+    def send_queue(self):
+        """Send the queued records as fport 7 frames, as many records per frame as the SF allows; records that were
+        not sent stay queued. Returns the number of records sent."""
+        fields, size = _layouts[schema.BATCH]
+        head, count = config.get(_QHEAD, 0), self.queued()
+        now = time.time()
+        buffer = self._buffer
+        self._fport = schema.BATCH
+        sent = 0
+        while sent < count:
+            records = min(count - sent, self.capacity())
+            sf = self._choose_sf(1 + records * size)                # the SF first: a higher SF carries fewer records
+            if sf is None:
+                break
+            self.sf = sf
+            records = min(records, self.capacity())
+            buffer[0] = records
+            for i in range(records):
+                record = storage.read(_QUEUE, (head + sent + i) % BATCH_MAX * (4 + size), 4 + size)
+                then = struct.unpack_from('>I', record, 0)[0]
+                buffer[1 + i * size:1 + (i + 1) * size] = record[4:]
+                age = {'age': (now - then) // 60 if now >= then else 4095}  # the RTC is lost on poweron
+                schema.pack(buffer, 8 + 8 * i * size, fields[-1:], age)
+            self._frame = self._view[:1 + records * size]
+            if not self.send_frame():
+                break
+            sent += records
+        config.put(_QHEAD, (head + sent) % BATCH_MAX)
+        config.put(_QLEN, count - sent)
+        return sent
+
+    def queued(self):
+        """Number of records in the queue."""
+        return config.get(_QLEN, 0)
 
-    def make_frame(self, odict):
-        for key, values in odict.items():
-            self._frame += LoRaWAN.pack(key, values)
+    def defer(self, values):
+        """Keep a measurement that could not be sent for a later cycle: as a batch record, or (a GPS or error frame)
+        as a whole frame."""
+        if self._fport in (1, 5):
+            self.queue(values)
+        else:
+            self.make_frame(values)
+            self.keep()
+
+    def keep(self):
+        """Keep the frame in NVS until the join completes (a newer frame replaces it)."""
+        frame = bytearray(1 + len(self._frame))
+        frame[0] = self._fport
+        frame[1:] = self._frame
+        storage.save(_KEPT, frame)
+
+    def send_kept(self):
+        """Send the frame kept by keep(), if any."""
+        frame = storage.load(_KEPT)
+        if frame:
+            self._fport = frame[0]
+            self._frame = bytes(frame[1:])
+            if self.send_frame():
+                storage.save(_KEPT, b'', frame)
+
+    def backoff(self):
+        """The cycle ends without a join: if a join request was sent, the next one waits _JOIN_BACKOFF seconds,
+        doubling with every failure. The stack state (DevNonce) is kept, so the next join request continues from it."""
+        if self._joining is None:
+            return
+        self._failed += 1
+        config.put('jfail', self._failed)
+        config.put('jnext', self._joining + min(_JOIN_BACKOFF << min(self._failed - 1, 10), _JOIN_MAX))
+        self.lora.nvram_save()
 
-        return len(self._frame)
+    def _choose_sf(self, length):
+        """Highest SF from the current SF down that the fair use budget allows for a frame of length bytes of the
+        current fport, or None if it does not fit."""
+        return airtime.choose_sf(self.airtime, length, self.sf, self._lowest,
+                                 priority = self._confirm or self._fport in _PRIORITY)
 
     def send_frame(self, join_flag = False):
+        """Send the frame, at the highest SF up to sf that the fair use budget allows. Returns False if the frame was
+        dropped because even SF7 would exceed the budget, or because the join did not complete."""
         if not self._frame:
             raise AttributeError("empty frame")
         
-        if join_flag:
-            while not self.has_joined:
+        if join_flag and self._joining is not None:
+            wait = _JOIN_WAIT
+            while not self.has_joined and wait:
                 time.sleep(1)
+                wait -= 1
+        if not self.has_joined:
+            self._frame = self._view[:0]
+            return False
         
+        sf = self._choose_sf(len(self._frame))
+        if sf is None:
+            self._frame = self._view[:0]
+            return False
+        self.sf = sf
+
         # send LoRa message and store LoRa context + frame count in NVRAM
+        received = self.lora.stats().rx_timestamp
         sckt = socket.socket(socket.AF_LORA, socket.SOCK_RAW)       # create a LoRa socket (blocking by default)
         sckt.setsockopt(socket.SOL_LORA, socket.SO_DR, self._dr)    # set the LoRaWAN data rate
+        sckt.setsockopt(socket.SOL_LORA, socket.SO_CONFIRMED, self._confirm)
         sckt.bind(self._fport)                                      # set the type of message used for decoding the packet
         sckt.send(self._frame)
+
+        stats = self.lora.stats()                                   # a downlink (or ACK) arrived in the receive windows?
+        if stats.rx_timestamp != received:
+            self.link.record(stats.snr)
+            sckt.setblocking(False)
+            data, port = sckt.recvfrom(64)
+            if port == downlink.PORT:
+                try:
+                    downlink.apply(data)                            # takes effect from the next cycle (t_int: now)
+                except ValueError:
+                    pass                                            # an invalid configuration is ignored as a whole
         sckt.close()
+        if self._confirm:
+            self.link.probed(stats.rx_timestamp != received)
+            self._confirm = False                                   # one probe per cycle
+        self.link.save()
 
         self.lora.nvram_save()
-        pycom.nvs_set('fcnt', self._fcnt + 1)
+        if self._failed:
+            config.put('jfail', 0)                                  # joined after all
+            self._failed = 0
+        self._fcnt += 1
+        config.put('fcnt', self._fcnt)                              # written once per wake, by config.flush()
+        self.airtime.add(airtime.time_on_air_ms(sf, len(self._frame) + airtime.OVERHEAD))
 
-        self._frame = bytes([])
\ No newline at end of file
+        self._frame = self._view[:0]
+        return True
\ No newline at end of file
@@ -3,17 +3,33 @@ version_str = "v2.7.1"
 version_int = int(version_str.replace('v', '').replace('.', ''))
 
 import time
-import pycom
 import machine
 
 t_boot = time.ticks_ms()                                # save current boot time
 
+import spans
+import storage
+import config
+span = spans.Spans()                                    # keep track of the duration of each phase
+span.enter(spans.SETUP)
+
 USE_SD   = machine.reset_cause() == machine.PWRON_RESET # check SD card if there was a reset / poweron
 USE_GPS  = machine.reset_cause() == machine.PWRON_RESET # use GPS if there was a reset / poweron
 USE_GPS |= machine.reset_cause() == machine.WDT_RESET   # use GPS if there was an update or error last time
 USE_GPS |= machine.wake_reason()[0] == machine.PIN_WAKE # use GPS if the green button was pressed
+GPS_REQ  = config.get('gps_req', 0)                     # use GPS if a configuration downlink asked for it
+USE_GPS |= GPS_REQ == 1
+
+# register 'display': 0 never, 1 only when someone is looking (default), 2 in every cycle
+# someone is looking after a poweron or reset, or when the green button was pressed; on timer wakes the display stays off
+DISPLAY  = config.get('display', 1)
+USE_DISP = DISPLAY == 2
+USE_DISP |= DISPLAY == 1 and machine.reset_cause() != machine.DEEPSLEEP_RESET
+USE_DISP |= DISPLAY == 1 and machine.wake_reason()[0] == machine.PIN_WAKE
 
 import pins
+import schema
+from lib.I2CBus   import I2CBus
 from lib.SSD1306  import SSD1306
 from lib.VEML6070 import VEML6070
 from lib.TSL2591  import TSL2591
@@ -23,24 +39,44 @@ from lib.KP26650  import KP26650
 from lib.SCD41    import SCD41
 from lib.SDS011   import SDS011
 from LoRa         import LoRaWAN
+from scheduler    import Scheduler, sensor_task
+
+i2c = I2CBus(0, pins = (pins.SDA, pins.SCL))            # shared I2C bus, in fast mode if all devices allow it
+
+# values are collected concurrently; the order of the fields in the frame is fixed per fport in schema.py
+values = {}
 
-from ucollections import OrderedDict
+def store(key):
+    def _store(value):
+        values[key] = value
+    return _store
 
-i2c = machine.I2C(0, pins = (pins.SDA, pins.SCL))       # create I2C object
-display = SSD1306(128, 64, i2c)                         # initialize display (4.4 / 0.0 mA)
+# the CO2 measurement takes longest (5 seconds), so start it before anything else; it completes in the background
+tasks = Scheduler()
+scd41 = SCD41(i2c = i2c, address = 98)                  # CO2 sensor (50 / 0.2 mA) (0x62)
+tasks.start(span.timed(spans.SCD41, sensor_task(scd41, store('co2'))))
+
+if USE_DISP or USE_SD:
+    display = SSD1306(128, 64, i2c)                     # initialize display (4.4 / 0.0 mA)
 
 # update firmware register if necessary, and check for SD card updates
 if USE_SD:
-    if pycom.nvs_get('fwversion') != version_int:
-        pycom.nvs_set('fwversion', version_int)
-    if pycom.nvs_get('error'):
-        pycom.nvs_set('error', 0)
+    config.put('fwversion', version_int)
+    config.put('error', 0)
+    config.flush()                                      # the upgrade file may change NVS itself
 
     from updateFW import check_SD
     reboot = check_SD(display)                          # check if an SD card is present and apply any changes
     if reboot:
+        config.flush()
         machine.reset()                                 # in case of an update, reboot the device
 
+# without USE_DISP, the display is only used for the SD card messages above
+if USE_SD and not USE_DISP:
+    display.poweroff()
+
+span.exit(spans.SETUP)
+
 # enable power to the voltage regulator (and in turn SDS011) which requires most time
 vr_en = machine.Pin(pins.VR, mode = machine.Pin.OUT)    # voltage regulator SHDN pin
 vr_en.hold(False)                                       # disable hold from deepsleep
@@ -48,9 +84,8 @@ vr_en.value(1)                                          # enable power
 
 uart1 = machine.UART(1, pins = (pins.TX1, pins.RX1), baudrate = 9600) # UART communication to SDS011
 sds011 = SDS011(uart1)                                  # fine particle sensor (110 / 0.0 mA)
-sds011.wake()
-
-t_start = time.ticks_ms()                               # keep track of SDS011 wake time
+sds011.wake()                                           # the driver keeps track of the wake time
+span.enter(spans.SDS011)
 
 lora = LoRaWAN()                                        # sort out all LoRa related settings (frame count, port, sf)
 
@@ -59,157 +94,180 @@ if USE_GPS:
     gps_en = machine.Pin(pins.GPS, mode = machine.Pin.OUT)  # 2N2907 (PNP) gate pin
     gps_en.hold(False)                                  # disable hold from deepsleep
     gps_en.value(0)                                     # enable GPS power
+    span.enter(spans.GPS)
+    uart2 = machine.UART(2, pins = (pins.TX2, pins.RX2), baudrate = 9600) # UART communication to GPS
+    from GPS import GPS
+    gps = GPS(uart2, radius = config.get('gps_rad', 50),    # accept a fix within this many metres of the last one
+              budget = config.get('gps_max', 120))     # seconds of GPS power before falling back to the last fix
+    tasks.add(gps.aiding())                             # send the last fix as position / time hint after boot
     lora.fport = 2                                      # set LoRa decoding type 2 (includes GPS)
-    lora.sf = pycom.nvs_get('sf_h')                     # send GPS on high SF
+    lora.sf = config.get('sf_h')                        # send GPS on high SF
 
 # show some stats on screen while sensors are busy
-display.fill(0)
-display.text("MJLO-{:>02}" .format(pycom.nvs_get('node')), 1,  1)
-display.text("FW {}"       .format(version_str),           1, 11)
-display.text("sf    {:> 4}".format(lora.sf),               1, 34)
-display.text("fport {:> 4}".format(lora.fport),            1, 44)
-display.text("fcnt {:> 5}" .format(lora.fcnt),             1, 54)
-display.show()
-
-# start collection of all sensor data
-values = OrderedDict()                                  # ordered collection of all values
-
-bme680 = BME680(i2c = i2c, address = 119)               # temp, hum, pres & voc sensor (12 / 0.0 mA) (0x77)
+if USE_DISP:
+    display.fill(0)
+    display.text("MJLO-{:>02}" .format(config.get('node')),    1,  1)
+    display.text("FW {}"       .format(version_str),           1, 11)
+    display.text("sf    {:> 4}".format(lora.sf),               1, 34)
+    display.text("fport {:> 4}".format(lora.fport),            1, 44)
+    display.text("fcnt {:> 5}" .format(lora.fcnt),             1, 54)
+    display.show()
+
+# start collection of all other sensor data
+# the calibration data of the BME680 is kept in NVS, and only read from the sensor again after a poweron
+bme680_cal = None if machine.reset_cause() == machine.PWRON_RESET else storage.load('bme680')
+bme680 = BME680(i2c = i2c, address = 119, calibration = bme680_cal) # temp, hum, pres & voc sensor (12 / 0.0 mA) (0x77)
 bme680.set_gas_heater_temperature(400, nb_profile = 1)  # set VOC plate heating temperature
 bme680.set_gas_heater_duration(50, nb_profile = 1)      # set VOC plate heating duration
 bme680.select_gas_heater_profile(1)                     # select those settings
-while not bme680.get_sensor_data():
-    machine.sleep(200)
-values['temp'] = bme680.temperature
-values['humi'] = bme680.humidity
-values['pres'] = bme680.pressure
-values['voc']  = bme680.gas / 10                        # TODO solve VOC (dirty hack /10)
-bme680.set_power_mode(0)
-
 tsl2591 =  TSL2591(i2c = i2c, address = 41)             # lux sensor (0.4 / 0.0 mA) (0x29)
-tsl2591.wake()
-values['lx'] = tsl2591.lux                              # don't ask why but this may do nothing, so poll twice
-machine.sleep(200)                                      # sensor stabilization time
-values['lx'] = tsl2591.lux
-tsl2591.sleep()
-
 veml6070 = VEML6070(i2c = i2c, address = 56)            # UV sensor (0.4 / 0.0 mA) (0x38)
-veml6070.wake()
-values['uv'] = veml6070.uv_raw                          # don't ask why but this may do nothing, so poll twice
-machine.sleep(200)                                      # sensor stabilization time
-values['uv'] = veml6070.uv_raw
-veml6070.sleep()
+max4466 =  MAX4466(pins.Vol, samples = 2048)           # analog loudness sensor (2048 samples, ~150 ms)
+battery =  KP26650(pins.Batt, samples = 256, ratio = 2) # battery voltage (256 samples, ~20 ms, 1:1 voltage divider)
+
+def store_bme680(data):
+    values['temp'], values['humi'], values['pres'], gas = data
+    values['voc'] = gas / 10                            # TODO solve VOC (dirty hack /10)
+
+# all other sensors complete in the shadow of the CO2 measurement
+tasks.add(span.timed(spans.BME680,   sensor_task(bme680,   store_bme680)))
+tasks.add(span.timed(spans.TSL2591,  sensor_task(tsl2591,  store('lx'))))
+tasks.add(span.timed(spans.VEML6070, sensor_task(veml6070, store('uv'))))
+tasks.add(span.timed(spans.MAX4466,  sensor_task(max4466,  store('volu'))))   # active: 0.3 mA, sleep: 0.3 mA (always on)
+tasks.add(span.timed(spans.KP26650,  sensor_task(battery,  store('batt'))))
+tasks.run()
+storage.save('bme680', bme680.calibration_blob, bme680_cal)  # only writes what changed (the ambient temperature)
 
-max4466 =  MAX4466(pins.Vol, duration = 500)            # analog loudness sensor (500ms measurement)
-values['volu'] = max4466.get_volume()                   # active: 0.3 mA, sleep: 0.3 mA (always on)
-
-battery =  KP26650(pins.Batt, duration = 200, ratio = 2)# battery voltage (200ms measurement, 1:1 voltage divider)
-values['batt'] = battery.get_voltage()
 perc = battery.get_percentage(lb = 3.1, ub = 4.3)       # map voltage from 3.1..4.3 V to 0..100%
 
 # write first set of values to display
-display.fill(0)
-display.text("Temp: {:> 6} C"   .format(round(values['temp'], 1)), 1,  1)
-display.text("Druk:{:> 6} hPa"  .format(round(values['pres'], 1)), 1, 11)
-display.text("Vocht: {:> 5} %"  .format(round(values['humi'], 1)), 1, 21)
-display.text("Licht: {:> 5} lx" .format(round(values[  'lx']   )), 1, 31)
-display.text("UV: {:> 8}"       .format(round(values[  'uv']   )), 1, 41)
-display.text("Accu: {:> 6} %"   .format(round(        perc     )), 1, 54)
-display.show()
-
-scd41 =    SCD41(i2c = i2c, address = 98)               # CO2 sensor (50 / 0.2 mA) (0x62)
-scd41.wake()
-machine.sleep(200)                                      # apparently needs some extra time to wake
-scd41.measure_single_shot()                             # start measurement, takes 5 seconds to complete
-machine.sleep(5000)
-values['co2'] = scd41.CO2
-scd41.sleep()
-
-# sleep for the remainder of 25 seconds
-machine.sleep(25000 - time.ticks_diff(time.ticks_ms(), t_start)) 
-
-# try to get a response from SDS011 within 5 seconds
-while (not sds011.read() and time.ticks_diff(time.ticks_ms(), t_start) < 30000):
-    machine.sleep(200)
-
-values['pm25'] = sds011.pm25
-values['pm10'] = sds011.pm10
-sds011.sleep()
+if USE_DISP:
+    display.fill(0)
+    display.text(schema.text('temp', values['temp']),    1,  1)
+    display.text(schema.text('pres', values['pres']),    1, 11)
+    display.text(schema.text('humi', values['humi']),    1, 21)
+    display.text(schema.text(  'lx', values[  'lx']),    1, 31)
+    display.text(schema.text(  'uv', values[  'uv']),    1, 41)
+    display.text("Accu: {:> 6} %".format(round(perc)),   1, 54)
+    display.show()
+
+# read the SDS011 once per second until its readings have settled (10 to 30 seconds after wake)
+def store_sds011(data):
+    values['pm25'], values['pm10'] = data
+
+tasks.add(sensor_task(sds011, store_sds011))
+tasks.run()
+span.exit(spans.SDS011)
 
 t_stop = time.ticks_ms()
 
 # write second set of values to display
-display.fill(0)
-display.text("Volume: {:> 4} dB".format(round(values['volu']   )), 1,  1)
-display.text("VOC: {:> 7}"      .format(round(values[ 'voc']   )), 1, 11)
-display.text("CO2: {:> 7} ppm"  .format(round(values[ 'co2']   )), 1, 21)
-display.text("PM2.5: {:> 5} ppm".format(round(values['pm25'], 1)), 1, 31)
-display.text("PM10: {:> 6} ppm" .format(round(values['pm10'], 1)), 1, 41)
-display.text("Accu: {:> 6} %"   .format(round(        perc     )), 1, 54)
-display.show()
+if USE_DISP:
+    display.fill(0)
+    display.text(schema.text('volu', values['volu']),    1,  1)
+    display.text(schema.text( 'voc', values[ 'voc']),    1, 11)
+    display.text(schema.text( 'co2', values[ 'co2']),    1, 21)
+    display.text(schema.text('pm25', values['pm25']),    1, 31)
+    display.text(schema.text('pm10', values['pm10']),    1, 41)
+    display.text("Accu: {:> 6} %".format(round(perc)),   1, 54)
+    display.show()
 
 # if necessary, start reading GPS to get a location fix
 if USE_GPS:
     
     # the GPS module has a pulling rate of 1Hz
     # therefore, if there is no data present within 2 seconds, raise an error
-    uart2 = machine.UART(2, pins = (pins.TX2, pins.RX2), baudrate = 9600)
     time.sleep_ms(2000)
     if not uart2.any():
         raise ModuleNotFoundError
 
-    from lib.micropyGPS import MicropyGPS
-    gps = MicropyGPS()                                  # create GPS object
-
     t = time.ticks_ms()
-    # THIS IS A BLOCKING CALL!! there MUST be a reasonable fix before sending data
-    while not gps.valid or gps.hdop > 5:
+    # read until the fix is good enough or stops improving; without a fix, the last known position is sent
+    while not gps.done():
         while uart2.any():                              # wait for incoming communication
-            my_sentence = uart2.readline()              # read NMEA sentence
-            for x in my_sentence:
-                gps.update(chr(x))                      # decode it through micropyGPS
+            gps.update(uart2.readline())                # decode a complete NMEA sentence at once
 
             # every two seconds, update some stats on the display
-            if (time.ticks_ms() - t) > 2000:
+            if USE_DISP and (time.ticks_ms() - t) > 2000:
                 display.fill(0)
                 display.text("GPS stats:",                                          1,  1)
-                display.text("fix:  {:> 4}"  .format("yes" if gps.valid else "no"), 1, 11)
+                display.text("fix:  {:>4}"   .format("yes" if gps.valid else "no"), 1, 11)
                 display.text("hdop: {:> 4}"  .format(round(gps.hdop, 1)),           1, 21)
                 display.text("sats: {:> 4}"  .format(gps.satellites),               1, 31)
-                display.text("time: {:> 4} s".format(round(t/1000)),                1, 41)
+                display.text("time: {:> 4} s".format(time.ticks_diff(time.ticks_ms(), gps.started) // 1000), 1, 41)
                 display.show()
                 t = time.ticks_ms()
 
     gps_en.value(1)                                     # disable power to GPS module
     gps_en.hold(True)                                   # hold through deepsleep
+    span.exit(spans.GPS)
+    gps.save()                                          # set the RTC and keep the fix for the next session (if any)
+    if GPS_REQ:
+        config.put('gps_req', 0)                        # the request is done, also without a fix
 
     values['lat'] = gps.latitude
     values['long'] = gps.longitude
     values['alt'] = gps.altitude
     values['hdop'] = gps.hdop
 
-    values['fw'] = pycom.nvs_get('fwversion') % 100     # add current firmware version to values (two trailing numbers)
+    values['fw'] = config.get('fwversion') % 100        # add current firmware version to values (two trailing numbers)
+    values['gpsq'] = gps.quality                        # 0 good fix, 1 best fix available, 2 last known position, 3 none
 
 vr_en.value(0)                                          # disable voltage regulator
 vr_en.hold(True)                                        # hold pin low during deepsleep
 
-# if LoRa failed to join, perform a reset which causes the device to restart from the top
-if not lora.has_joined:
-    machine.reset()
+# every 'diag'th frame, also send the timing distribution of the last cycles (fport 3)
+diag = config.get('diag')
+send_diag = diag and lora.fcnt % diag == 0
 
-lora.make_frame(values)
-lora.send_frame()
+# with 'batch' set, measurements without GPS are kept in NVS and sent together once there are 'batch' of them, or as
+# many as a single frame carries at the SF of this cycle (2 at SF10 - SF12), so that a batch is one uplink
+batch = min(config.get('batch', 0), lora.capacity())    # never more than BATCH_MAX, the size of the queue
 
-# show values on display for the remainder of 10 seconds
-machine.sleep(10000 - time.ticks_diff(time.ticks_ms(), t_stop))
-display.poweroff()
+# without a join, the measurement is kept in NVS (a GPS frame as a whole) and the join is retried with a backoff in the
+# next cycles; a reset would repeat the whole cycle straight away, GPS included
+span.enter(spans.SEND)
+if not lora.has_joined:
+    lora.defer(values)
+    lora.backoff()
+elif batch > 1 and lora.fport in (1, 5):
+    if lora.queue(values) >= batch:
+        lora.send_queue()
+    lora.send_kept()
+else:
+    lora.make_frame(values)
+    sent = lora.send_frame()
+    if not sent:                                        # over the fair use budget: sent with the queue later on
+        lora.defer(values)
+    lora.send_kept()
+    if sent and lora.queued():                          # measurements of cycles without a join or over the budget
+        lora.send_queue()
+span.exit(spans.SEND)
+
+if send_diag and lora.has_joined:
+    lora.fport = 3
+    lora.frame = spans.summary()
+    lora.send_frame()
+
+# show values on display for the remainder of 't_disp' seconds (10 by default)
+span.enter(spans.DISPLAY)
+if USE_DISP:
+    hold = config.get('t_disp', 10) * 1000 - time.ticks_diff(time.ticks_ms(), t_stop)
+    if hold > 0:
+        machine.sleep(hold)
+    display.poweroff()
+span.exit(spans.DISPLAY)
 
 # if there was an error last time, but we got here now, set register to 0
-if pycom.nvs_get("error"):
-    pycom.nvs_set("error", 0)
+config.put('error', 0)
+
+if diag or config.get('spans', 0):                      # keep the timing of this cycle for fport 3 or the SD card
+    span.save()
+config.flush()                                          # write the settings and counters that changed in this cycle
 
 # set up for deepsleep
 awake_time = time.ticks_diff(time.ticks_ms(), t_boot) - 3000                    # time in milliseconds the program has been running
 machine.Pin(pins.Wake, mode = machine.Pin.IN, pull = machine.Pin.PULL_DOWN)     # initialize wake-up pin
 machine.pin_sleep_wakeup([pins.Wake], mode = machine.WAKEUP_ANY_HIGH, enable_pull = True)   # set wake-up pin as trigger
-machine.deepsleep(pycom.nvs_get('t_int') * 1000 - awake_time)                   # deepsleep for remainder of the interval time
\ No newline at end of file
+sleep_time = config.get('t_int') * 1000 - awake_time                            # remainder of the interval time
+machine.deepsleep(max(sleep_time, 10000))                                       # a cycle longer than t_int (GPS, display) still sleeps 10 s
\ No newline at end of file
@@ -0,0 +1,97 @@
+# LoRa time on air, and a rolling 24 hour airtime ledger in NVS for the TTN fair use policy (30 s of uplink per day)
+# the ledger holds the airtime per hour of the last 24 hours, indexed by the hour of the RTC (which survives deepsleep);
+# the spreading factor of every uplink is lowered until it fits both the daily budget and a pacing window, so the
+# budget is spread over the day instead of being spent in the first hours
+# the current hour, its airtime and the total of the 24 hours before it are registers (config.py); the completed hours
+# are a blob that is read and written one hour at a time, so a wake only reads the hours of the pacing window
+import math
+import struct
+import time
+import storage
+import config
+
+BUDGET_MS = 30000                                   # TTN fair use policy: 30 seconds of uplink airtime per day
+OVERHEAD = 13                                       # LoRaWAN MHDR, FHDR, FPort and MIC around the payload
+JOIN_LENGTH = 23                                    # OTAA join request
+HOURS = 25                                          # the current hour and the 24 before it: never less than 24 hours
+_PACE_H = 3                                         # pacing window: the current hour and the 3 before it
+_PACE = 0.9                                         # regular frames are paced to 90%, the rest is kept for GPS / errors
+_KEY = 'ledger'                                     # milliseconds per completed hour (uint16), at hour % HOURS
+_HOUR = 'at_hour'                                   # the current hour
+_NOW = 'at_now'                                     # milliseconds in the current hour
+_PAST = 'at_past'                                   # milliseconds in the 24 hours before it
+_RTC_SET = 1600000000 // 3600                       # hours: an RTC below this was never set (it starts at 0 on poweron)
+
+def time_on_air_ms(sf, length, bandwidth = 125):
+    """Time on air in ms of a LoRa frame of length bytes (PHY payload) at EU868 settings: coding rate 4/5,
+    8 symbol preamble, explicit header and CRC. Low data rate optimisation is on for SF11 and SF12 at 125 kHz."""
+    t_sym = (1 << sf) / bandwidth                   # ms, as bandwidth is in kHz
+    de = 1 if sf >= 11 and bandwidth == 125 else 0
+    payload_symbols = 8 + max(math.ceil((8 * length - 4 * sf + 28 + 16) / (4 * (sf - 2 * de))) * 5, 0)
+    return (12.25 + payload_symbols) * t_sym
+
+class Ledger:
+    def __init__(self):
+        if config.get(_HOUR) is None:               # first use
+            storage.allocate(_KEY, 2 * HOURS)
+        self._hour = config.get(_HOUR, 0)
+        self._now = config.get(_NOW, 0)
+        self._past = config.get(_PAST, 0)
+        self._buckets = {}                          # completed hours read or written in this wake
+        self._roll(time.time() // 3600)
+
+    def _bucket(self, hour):
+        index = hour % HOURS
+        if index not in self._buckets:
+            self._buckets[index] = struct.unpack('>H', storage.read(_KEY, 2 * index, 2))[0]
+        return self._buckets[index]
+
+    def _roll(self, hour):
+        """Move the ledger to hour: the hours that passed since the last uplink are completed, and the hours that are
+        more than 24 hours old drop out of the total."""
+        if hour < self._hour or (hour < _RTC_SET) != (self._hour < _RTC_SET):
+            self._hour = hour                       # the RTC was lost or set: the time that passed is unknown
+        elif hour >= self._hour + HOURS:
+            storage.write(_KEY, 0, bytes(2 * HOURS))
+            self._buckets = dict.fromkeys(range(HOURS), 0)
+            self._hour, self._now, self._past = hour, 0, 0
+        else:
+            for h in range(self._hour, hour):       # hour h is completed, hour h - 24 drops out of the total
+                ms = self._now if h == self._hour else 0
+                self._past = max(0, self._past + ms - self._bucket(h - HOURS + 1))
+                if self._bucket(h) != ms:           # the bucket still holds hour h - 25
+                    storage.write(_KEY, 2 * (h % HOURS), struct.pack('>H', ms))
+                    self._buckets[h % HOURS] = ms
+            if hour != self._hour:
+                self._hour, self._now = hour, 0
+        config.put(_HOUR, self._hour)
+        config.put(_NOW, self._now)
+        config.put(_PAST, self._past)
+
+    def used(self, hours = HOURS - 1):
+        """Airtime in ms of the current hour and the hours before it."""
+        if hours >= HOURS - 1:
+            return self._now + self._past
+        return self._now + sum(self._bucket(self._hour - h) for h in range(1, hours + 1))
+
+    def add(self, ms):
+        """Book ms of airtime in the current hour (written by config.flush())."""
+        self._roll(max(self._hour, time.time() // 3600))
+        self._now = min(0xFFFF, self._now + math.ceil(ms))
+        config.put(_NOW, self._now)
+
+def choose_sf(ledger, length, sf, lowest = 7, priority = False, budget = BUDGET_MS):
+    """Highest spreading factor from sf down to lowest (the link needs at least that) for a payload of length bytes.
+    An uplink may use what is left of the budget of the pacing window (pro rata, 90% of the daily budget); below that,
+    lowest is used while the last 24 hours allow it. Priority frames (GPS, errors, link probes) only have to fit the
+    daily budget, and are sent at lowest if even that does not fit. Returns None if a regular frame does not fit."""
+    spare = budget - ledger.used()
+    window = _PACE_H * 3600 + time.time() % 3600    # seconds covered by the buckets of the pacing window
+    allowance = _PACE * budget * window / 86400 - ledger.used(_PACE_H)
+    for s in range(sf, lowest, -1):
+        toa = time_on_air_ms(s, length + OVERHEAD)
+        if toa <= spare and (priority or toa <= allowance):
+            return s
+    if priority or time_on_air_ms(lowest, length + OVERHEAD) <= spare:
+        return lowest
+    return None
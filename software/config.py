@@ -0,0 +1,28 @@
+# settings and counters in NVS, cached in RAM: a key is read at most once per wake, and changes are written back in
+# one pass by flush() right before deepsleep or a reset, only for the keys whose value actually changed
+# blobs (storage.py) are not cached, as they already write only the words that changed
+import pycom
+import storage
+
+_cache = {}
+_dirty = []
+
+def get(key, default = None):
+    """Return the NVS register key, or default if it was never set."""
+    if key not in _cache:
+        _cache[key] = storage.get(key)
+    value = _cache[key]
+    return default if value is None else value
+
+def put(key, value):
+    """Change the NVS register key, to be written by flush()."""
+    if get(key) != value:
+        _cache[key] = value
+        if key not in _dirty:
+            _dirty.append(key)
+
+def flush():
+    """Write the changed registers to NVS."""
+    for key in _dirty:
+        pycom.nvs_set(key, _cache[key])
+    _dirty.clear()
@@ -0,0 +1,62 @@
+# configuration downlinks on fport 10, so the settings in NVS can be changed remotely instead of with an SD card
+# a downlink is a sequence of commands: a type byte, then the value (big endian, its length fixed per type)
+# every command is validated before any of them is applied; the downlink is kept in NVS while it is being applied,
+# so a reset halfway is completed on the next boot (resume) instead of leaving half a configuration
+import config
+import storage
+
+PORT = 10
+_PENDING = 'dlpending'
+
+_commands = { # type: (NVS keys, bytes per key, minimum, maximum)
+        0x01: (('t_int',),       2, 120, 0xFFFF),                   # measurement interval in seconds
+        0x02: (('sf_l', 'sf_h'), 1,   7, 12    ),                   # SF of regular frames, and of every adr'th frame
+        0x03: (('adr',),         1,   1, 0xFF  ),                   # every adr'th frame is sent on sf_h
+        0x04: (('gps_req',),     0,   1, 1     ),                   # acquire a GPS fix in the next cycle (no value)
+        0x05: (('display',),     1,   0, 2     ),                   # display: never, on button presses, every cycle
+        0x06: (('t_disp',),      1,   0, 0xFF  ),                   # seconds the measurements stay on the display
+        0x07: (('batch',),       1,   0, 10    )                    # records per batch (0, 1: none), LoRa.BATCH_MAX at most
+}
+
+def parse(payload):
+    """Return the NVS settings of a configuration downlink as a dict; raises ValueError if any command is invalid."""
+    settings = {}
+    i = 0
+    while i < len(payload):
+        command = _commands.get(payload[i])
+        if command is None:
+            raise ValueError("unknown command {}".format(payload[i]))
+        keys, size, minimum, maximum = command
+        i += 1
+        if i + len(keys) * size > len(payload):
+            raise ValueError("command {} too short".format(payload[i - 1]))
+        for key in keys:
+            value = int.from_bytes(payload[i:i + size], 'big') if size else maximum
+            if not minimum <= value <= maximum:
+                raise ValueError("{} out of range: {}".format(key, value))
+            settings[key] = value
+            i += size
+    if settings.get('sf_l', 0) > settings.get('sf_h', 12):
+        raise ValueError("sf_l above sf_h")
+    return settings
+
+def _write(settings):
+    for key, value in settings.items():
+        config.put(key, value)
+    config.flush()
+
+def apply(payload):
+    """Validate a configuration downlink and write it to NVS. Returns the settings; raises ValueError (and changes
+    nothing) if the downlink is invalid."""
+    settings = parse(payload)
+    storage.save(_PENDING, payload)
+    _write(settings)
+    storage.save(_PENDING, b'', payload)
+    return settings
+
+def resume():
+    """Complete a configuration downlink that was interrupted by a reset."""
+    pending = storage.load(_PENDING)
+    if pending:
+        _write(parse(pending))
+        storage.save(_PENDING, b'', pending)
@@ -3,6 +3,7 @@ import pycom
 import time
 
 import pins
+import config
 
 sensors = { 41 : "TSL2591", 
             56 : "VEML6070", 
@@ -49,24 +50,26 @@ gps_en.value(1)                                     # disable power & hold throu
 gps_en.hold(True)
 
 from lib.KP26650 import KP26650
-batt = KP26650(pins.Batt, duration = 200, ratio = 2)  # measure battery voltage
+batt = KP26650(pins.Batt, samples = 256, ratio = 2)  # measure battery voltage
 volt = batt.get_voltage()
 
 from LoRa import LoRaWAN
-lora = LoRaWAN(sf = pycom.nvs_get('sf_h'), fport = 4) # sort out all LoRa related settings (frame count, port, sf)
+lora = LoRaWAN(sf = config.get('sf_h'), fport = 4)  # sort out all LoRa related settings (frame count, port, sf)
 
-from ucollections import OrderedDict
-values = OrderedDict()
-values['fw'] = pycom.nvs_get('fwversion') % 100     # only keep 2 trailing digits
-values['error'] = error if pycom.nvs_get('error') else -error # negative value if this is the first time (soft error)
+values = {}
+values['fw'] = config.get('fwversion') % 100        # only keep 2 trailing digits
+values['error'] = error if config.get('error') else -error # negative value if this is the first time (soft error)
 values['batt'] = volt
 
 lora.make_frame(values)
-lora.send_frame(True)                               # send frame
+if not lora.send_frame(True):                       # send frame
+    lora.defer(values)                              # no join: kept, and sent after the next join
+    lora.backoff()
 
 # if we land here from a working state, reboot to try and solve error
-if not pycom.nvs_get('error'):
-    pycom.nvs_set('error', 1)                       # set in NVRAM that we encountered an error
+if not config.get('error'):
+    config.put('error', 1)                          # set in NVRAM that we encountered an error
+    config.flush()
     
     pycom.rgbled((255 << 16) + (255 << 8) + 255)    # bright white
     machine.sleep(2000)
@@ -75,6 +78,7 @@ if not pycom.nvs_get('error'):
     machine.reset()                                 # perform a full reboot
 
 # if rebooting did not solve the error, blink slow red
+config.flush()
 red = (128 << 16)
 while True:
     pycom.rgbled(red)
@@ -0,0 +1,75 @@
+# fixed number of raw ADC samples in a preallocated buffer, shared by the analog sensors (MAX4466, KP26650)
+# the duration is known in advance (>13000 samples per second measured), and no time is spent on timing calls
+import machine
+import math
+from array import array
+
+class ADCSampler:
+    def __init__(self, pin, samples, attn = machine.ADC.ATTN_11DB):
+        adc = machine.ADC()
+        self.adc = adc.channel(pin = pin, attn = attn)  # 0 to 4095 accuracy
+        self.buffer = array('H', (0 for _ in range(samples)))
+
+    def acquire(self):
+        """Fill the buffer with raw ADC values."""
+        buffer = self.buffer
+        read = self.adc.value                       # bind the method once, outside of the loop
+        for i in range(len(buffer)):
+            buffer[i] = read()
+        return buffer
+
+    def stats(self):
+        """Return (minimum, maximum, mean, rms) of the raw values in a single pass; rms is that of the deviation from
+        the mean (the AC part of the signal). Sums are taken relative to the first sample to stay in small ints."""
+        buffer = self.buffer
+        ref = buffer[0]
+        lowest = highest = ref
+        total = squares = 0
+        for value in buffer:
+            if value < lowest:
+                lowest = value
+            elif value > highest:
+                highest = value
+            value -= ref
+            total += value
+            squares += value * value
+        n = len(buffer)
+        mean = total / n
+        return lowest, highest, ref + mean, math.sqrt(max(0, squares / n - mean * mean))
+
+    def median(self):
+        """Return the median of the raw values by quickselect, which reorders the buffer."""
+        buffer = self.buffer
+        k = len(buffer) // 2
+        lo, hi = 0, len(buffer) - 1
+        while lo < hi:
+            pivot = buffer[(lo + hi) // 2]
+            i, j = lo, hi
+            while i <= j:
+                while buffer[i] < pivot:
+                    i += 1
+                while buffer[j] > pivot:
+                    j -= 1
+                if i <= j:
+                    buffer[i], buffer[j] = buffer[j], buffer[i]
+                    i += 1
+                    j -= 1
+            if k <= j:
+                hi = j
+            elif k >= i:
+                lo = i
+            else:
+                break
+        return buffer[k]
+
+    def millivolts(self, value):
+        """Convert a raw value (may be fractional) to millivolts through the factory calibration of the ADC."""
+        low = int(value)
+        mv = self.adc.value_to_voltage(low)
+        if value != low:                            # interpolate between two calibrated points
+            mv += (value - low) * (self.adc.value_to_voltage(min(4095, low + 1)) - mv)
+        return mv
+
+    def span_millivolts(self, center, span):
+        """Convert a raw difference (peak to peak, rms) around a raw value to millivolts."""
+        return self.millivolts(min(4095, center + span / 2)) - self.millivolts(max(0, center - span / 2))
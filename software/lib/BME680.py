@@ -5,6 +5,7 @@ import time
 POLL_PERIOD_MS = 10
 SOFT_RESET_CMD = 0xb6
 SOFT_RESET_ADDR = 0xe0
+CHIP_ID_ADDR = 0xd0
 
 ADDR_RES_HEAT_VAL_ADDR = 0x00
 ADDR_RES_HEAT_RANGE_ADDR = 0x02
@@ -73,6 +74,13 @@ RUN_GAS_POS = 4
 MODE_POS = 0
 NBCONV_POS = 0
 
+# Configuration registers kept in the shadow, in burst write order: ctrl_hum only takes effect
+# after a write to ctrl_meas, which also holds the power mode, so that one goes last
+CONF_ADDRS = (CONF_ODR_RUN_GAS_NBC_ADDR, CONF_OS_H_ADDR, CONF_ODR_FILT_ADDR, CONF_T_P_MODE_ADDR)
+
+# Number of measurement cycles per over-sampling setting
+OS_CYCLES = (0, 1, 2, 4, 8, 16)
+
 # Look up tables for the possible gas range values
 lookupTable1 = [2147483647, 2147483647, 2147483647, 2147483647,
                 2147483647, 2126008810, 2147483647, 2130303777, 2147483647,
@@ -140,18 +148,30 @@ class CalibrationData:
 
 class BME680:
 
-    def __init__(self, i2c, address):
+    def __init__(self, i2c, address, calibration = None):
+        """calibration: a calibration_blob saved earlier, which saves reading the calibration data and
+        a first measurement (for the ambient temperature) if it belongs to the same type of sensor."""
 
         self.address = address
         self.i2c = i2c
+        self._field = bytearray(17)                 # field data of a conversion, read in one burst
+        self._status = bytearray(1)                 # single register reads
 
-        self.power_mode = None
+        self.power_mode = SLEEP_MODE
         self.calibration = CalibrationData()
 
+        # shadow copy of the configuration registers: set_* calls only change the shadow,
+        # which is written in a single burst when a conversion is started
+        self._shadow = {}
+        self._dirty = set()                         # registers changed since the last write
+
         self.soft_reset()
-        self.set_power_mode(SLEEP_MODE)
 
-        self._get_calibration_data()
+        cached = calibration is not None and len(calibration) == 46 and calibration[0] == self._read(CHIP_ID_ADDR)
+        if cached:
+            self._set_calibration_data(calibration)
+        else:
+            self._get_calibration_data()
 
         self.set_humidity_oversample(OS_8X)
         self.set_pressure_oversample(OS_8X)
@@ -159,23 +179,42 @@ class BME680:
         self.set_filter(FILTER_SIZE_3)
         self.set_gas_status(ENABLE_GAS_MEAS_LOW)
         self.set_temp_offset(0)
-        self.get_sensor_data()
+        if not cached:
+            self.get_sensor_data()                  # for the ambient temperature the heater calculation needs
 
     def _get_calibration_data(self):
         """Retrieve the sensor calibration data and store it in .calibration_data."""
-        calibration = self._read(COEFF_ADDR1, 25)
-        calibration += self._read(COEFF_ADDR2, 16)
-
-        heat_range = self._read(ADDR_RES_HEAT_RANGE_ADDR, 1)
-        heat_value = twos_comp(self._read(ADDR_RES_HEAT_VAL_ADDR, 1))
-        sw_error = twos_comp(self._read(ADDR_RANGE_SW_ERR_ADDR, 1))
+        blob = bytearray(46)
+        view = memoryview(blob)
+        blob[0] = self._read(CHIP_ID_ADDR)
+        self.i2c.readfrom_mem_into(self.address, COEFF_ADDR1, view[1:26])
+        self.i2c.readfrom_mem_into(self.address, COEFF_ADDR2, view[26:42])
+        blob[42] = self._read(ADDR_RES_HEAT_RANGE_ADDR)
+        blob[43] = self._read(ADDR_RES_HEAT_VAL_ADDR)
+        blob[44] = self._read(ADDR_RANGE_SW_ERR_ADDR)
+        self._set_calibration_data(blob)
+
+    def _set_calibration_data(self, blob):
+        """Parse calibration data in the format of calibration_blob."""
+        self._chip_id = blob[0]
+        self._raw_calibration = bytes(blob[1:45])
+        self.calibration.set_from_array(blob[1:42])
+        self.calibration.set_other(blob[42], twos_comp(blob[43]), twos_comp(blob[44]))
+        self.ambient_temperature = twos_comp(blob[45])
 
-        self.calibration.set_from_array(calibration)
-        self.calibration.set_other(heat_range, heat_value, sw_error)
+    @property
+    def calibration_blob(self):
+        """Calibration data as 46 bytes: chip id, 41 coefficient bytes, heater range, heater value and
+        switching error registers, and the last ambient temperature (signed, whole degrees)."""
+        temperature = max(-128, min(127, round(self.ambient_temperature)))
+        return bytes([self._chip_id]) + self._raw_calibration + bytes([temperature & 0xFF])
 
     def soft_reset(self):
-        """Trigger a soft reset."""
+        """Trigger a soft reset, which clears all configuration registers (and puts the sensor in sleep mode)."""
         self._write(SOFT_RESET_ADDR, SOFT_RESET_CMD)
+        self._shadow = dict.fromkeys(CONF_ADDRS, 0)
+        self._dirty = set()
+        self.power_mode = SLEEP_MODE
         time.sleep(POLL_PERIOD_MS / 1000.0)
 
     def set_temp_offset(self, value):
@@ -203,7 +242,7 @@ class BME680:
         self._set_bits(CONF_ODR_FILT_ADDR, FILTER_MSK, FILTER_POS, value)
 
     def get_filter(self):
-        return (self._read(CONF_ODR_FILT_ADDR, 1) & FILTER_MSK) >> FILTER_POS
+        return (self._shadow[CONF_ODR_FILT_ADDR] & FILTER_MSK) >> FILTER_POS
 
     def select_gas_heater_profile(self, value):
         """Set current gas sensor conversion profile.
@@ -217,85 +256,137 @@ class BME680:
 
     def set_gas_heater_temperature(self, value, nb_profile=0):
         """Set gas sensor heater temperature (degrees celsius, between 200 and 400)."""
-        temp = int(self._calc_heater_resistance(value))
-        self._write(RES_HEAT0_ADDR + nb_profile, temp)
+        self._shadow[RES_HEAT0_ADDR + nb_profile] = int(self._calc_heater_resistance(value))
+        self._dirty.add(RES_HEAT0_ADDR + nb_profile)
 
     def set_gas_heater_duration(self, value, nb_profile=0):
         """Set gas sensor heater duration (in milliseconds between 1 ms and 4032 (typical 20~30 ms)."""
-        temp = self._calc_heater_duration(value)
-        self._write(GAS_WAIT0_ADDR + nb_profile, temp)
+        self._shadow[GAS_WAIT0_ADDR + nb_profile] = self._calc_heater_duration(value)
+        self._dirty.add(GAS_WAIT0_ADDR + nb_profile)
 
-    def set_power_mode(self, value, blocking=True):
-        """Set power mode."""
+    def set_power_mode(self, value):
+        """Set power mode, writing any pending configuration changes in the same transaction.
+        Setting forced mode (again) starts a conversion."""
         if value not in (SLEEP_MODE, FORCED_MODE):
             raise ValueError('Power mode should be one of SLEEP_MODE or FORCED_MODE')
 
         self.power_mode = value
 
         self._set_bits(CONF_T_P_MODE_ADDR, MODE_MSK, MODE_POS, value)
-
-        while blocking and self.get_power_mode() != self.power_mode:
-            time.sleep(POLL_PERIOD_MS / 1000.0)
+        self._flush()
 
     def get_power_mode(self):
-        """Get power mode."""
-        self.power_mode = self._read(CONF_T_P_MODE_ADDR, 1)
+        """Get power mode (a forced mode conversion returns to sleep mode by itself)."""
+        self.power_mode = self._read(CONF_T_P_MODE_ADDR) & MODE_MSK
+        self._shadow[CONF_T_P_MODE_ADDR] = (self._shadow[CONF_T_P_MODE_ADDR] & ~MODE_MSK) | self.power_mode
         return self.power_mode
 
+    def _conversion_done(self):
+        """After a forced mode conversion the sensor is back in sleep mode, no need to write that."""
+        self.power_mode = SLEEP_MODE
+        self._shadow[CONF_T_P_MODE_ADDR] &= ~MODE_MSK
+
+    def get_conversion_time(self):
+        """Duration of a forced mode conversion in milliseconds as calculated by Bosch:
+        temperature, pressure and humidity measurement cycles, switching and gas measurement time, wake up,
+        plus the heater duration of the selected profile."""
+        ctrl_meas = self._shadow[CONF_T_P_MODE_ADDR]
+        cycles = (OS_CYCLES[min((ctrl_meas & OST_MSK) >> OST_POS, 5)] +
+                  OS_CYCLES[min((ctrl_meas & OSP_MSK) >> OSP_POS, 5)] +
+                  OS_CYCLES[min((self._shadow[CONF_OS_H_ADDR] & OSH_MSK) >> OSH_POS, 5)])
+        duration = (cycles * 1963 + 477 * 4 + 477 * 5 + 500) // 1000 + 1
+
+        ctrl_gas = self._shadow[CONF_ODR_RUN_GAS_NBC_ADDR]
+        if ctrl_gas & RUN_GAS_MSK:
+            wait = self._shadow.get(GAS_WAIT0_ADDR + (ctrl_gas & NBCONV_MSK), 0)
+            duration += (wait & 0x3F) << (2 * (wait >> 6))     # 6 bit value, multiplication factor 1, 4, 16 or 64
+        return duration
+
     def get_sensor_data(self):
         """Get sensor data"""
         self.set_power_mode(FORCED_MODE)
+        time.sleep(self.get_conversion_time() / 1000.0)
 
         for _ in range(10):
-            status = self._read(FIELD0_ADDR, 1)
+            status = self._read(FIELD0_ADDR)
 
             if (status & NEW_DATA_MSK) == 0:
                 time.sleep(POLL_PERIOD_MS / 1000.0)
                 continue
 
-            regs = self._read(FIELD0_ADDR, 17)
+            self._read_field_data()
+            self._conversion_done()
+            return True
+
+        return False
 
-            self.status = regs[0] & NEW_DATA_MSK
-            # Contains the nb_profile used to obtain the current measurement
-            self.gas_index = regs[0] & GAS_INDEX_MSK
-            self.meas_index = regs[1]
+    def start(self):
+        """Start a forced mode conversion, return the time in milliseconds it takes."""
+        self.set_power_mode(FORCED_MODE)
+        return self.get_conversion_time()
 
-            self.adc_pres = (regs[2] << 12) | (regs[3] << 4) | (regs[4] >> 4)
-            self.adc_temp = (regs[5] << 12) | (regs[6] << 4) | (regs[7] >> 4)
-            self.adc_hum = (regs[8] << 8) | regs[9]
-            self.adc_gas_res_low = (regs[13] << 2) | (regs[14] >> 6)
-            self.gas_range_l = regs[14] & GAS_RANGE_MSK
+    def poll(self):
+        """Return 0 if new data is available, otherwise the time in milliseconds until the next poll."""
+        if self._read(FIELD0_ADDR) & NEW_DATA_MSK:
+            return 0
+        return POLL_PERIOD_MS
 
-            self.status |= regs[14] & GASM_VALID_MSK
-            self.status |= regs[14] & HEAT_STAB_MSK
+    def finish(self):
+        """Read the finished conversion and put the sensor to sleep.
+        Returns (temperature, humidity, pressure, gas)."""
+        self._read_field_data()
+        self._conversion_done()
+        return self.temperature, self.humidity, self.pressure, self.gas
 
-            self.heat_stable = (self.status & HEAT_STAB_MSK) > 0
+    def _read_field_data(self):
+        """Read and store the raw data of a finished conversion."""
+        regs = self._field
+        self.i2c.readfrom_mem_into(self.address, FIELD0_ADDR, regs)
 
-            self.ambient_temperature = self.temperature
+        self.status = regs[0] & NEW_DATA_MSK
+        # Contains the nb_profile used to obtain the current measurement
+        self.gas_index = regs[0] & GAS_INDEX_MSK
+        self.meas_index = regs[1]
 
-            return True
+        self.adc_pres = (regs[2] << 12) | (regs[3] << 4) | (regs[4] >> 4)
+        self.adc_temp = (regs[5] << 12) | (regs[6] << 4) | (regs[7] >> 4)
+        self.adc_hum = (regs[8] << 8) | regs[9]
+        self.adc_gas_res_low = (regs[13] << 2) | (regs[14] >> 6)
+        self.gas_range_l = regs[14] & GAS_RANGE_MSK
 
-        return False
+        self.status |= regs[14] & GASM_VALID_MSK
+        self.status |= regs[14] & HEAT_STAB_MSK
+
+        self.heat_stable = (self.status & HEAT_STAB_MSK) > 0
+
+        self.ambient_temperature = self.temperature
 
     def _set_bits(self, register, mask, position, value):
-        """Mask out and set one or more bits in a register."""
-        temp = self._read(register, 1)
-        temp &= ~mask
-        temp |= value << position
-        self._write(register, temp)
+        """Mask out and set one or more bits in the shadow of a register."""
+        self._shadow[register] = (self._shadow[register] & ~mask) | (value << position)
+        self._dirty.add(register)
+
+    def _flush(self):
+        """Write all changed shadow registers in one burst of register / value pairs
+        (heater profiles first, ctrl_meas with the power mode last)."""
+        if not self._dirty:
+            return
+        registers = [register for register in sorted(self._dirty) if register not in CONF_ADDRS]
+        registers += [register for register in CONF_ADDRS if register in self._dirty]
+        buffer = bytearray(2 * len(registers))
+        for i, register in enumerate(registers):
+            buffer[2 * i] = register
+            buffer[2 * i + 1] = self._shadow[register]
+        self.i2c.writeto(self.address, buffer)
+        self._dirty = set()
 
     def _write(self, register, value):
-        buffer = bytearray(2)
-        buffer[0] = register
-        buffer[1] = value
-        self.i2c.writeto(self.address, buffer)
+        self.i2c.write_reg(self.address, register, value)
 
-    def _read(self, register, length):
-        self.i2c.writeto(self.address, bytes([register & 0xFF]))
-        result = self.i2c.readfrom(self.address, length)
-        if length <= 2:
-            return int.from_bytes(result, 'little')
-        return result
+    def _read(self, register):
+        """Read a single byte register."""
+        self.i2c.readfrom_mem_into(self.address, register, self._status)
+        return self._status[0]
 
     @property
     def temperature(self):
@@ -0,0 +1,53 @@
+# shared I2C bus of the sensors and the display: owns the machine.I2C object, runs in fast mode (400 kHz) when every
+# device on the bus allows it, and counts the transactions and bytes per device
+# register reads go into buffers of the caller (readfrom_mem_into), and register writes use a preallocated buffer,
+# so the drivers do not allocate anything per transaction
+import machine
+
+STANDARD = 100000
+FAST = 400000
+
+DEVICES = { # address: highest SCL frequency (datasheets)
+        0x29: FAST,                                 # TSL2591
+        0x38: FAST,                                 # VEML6070 command and LSB
+        0x39: FAST,                                 # VEML6070 MSB
+        0x3C: FAST,                                 # SSD1306
+        0x62: FAST,                                 # SCD41
+        0x77: FAST                                  # BME680
+}
+
+class I2CBus:
+    def __init__(self, bus, pins, devices = DEVICES):
+        self.baudrate = min(FAST, min(devices.values())) if devices else STANDARD
+        self.i2c = machine.I2C(bus, mode = machine.I2C.MASTER, pins = pins, baudrate = self.baudrate)
+        self.stats = {address: [0, 0] for address in devices}   # address: [transactions, bytes]
+        self._pair = bytearray(2)                   # register, value
+
+    def _count(self, address, nbytes):
+        if address not in self.stats:
+            self.stats[address] = [0, 0]
+        stats = self.stats[address]
+        stats[0] += 1
+        stats[1] += nbytes
+
+    def scan(self):
+        return self.i2c.scan()
+
+    def writeto(self, address, buf):
+        self._count(address, len(buf))
+        self.i2c.writeto(address, buf)
+
+    def readfrom_into(self, address, buf):
+        self._count(address, len(buf))
+        self.i2c.readfrom_into(address, buf)
+
+    def write_reg(self, address, register, value):
+        """Write a single byte register."""
+        self._pair[0] = register
+        self._pair[1] = value
+        self.writeto(address, self._pair)
+
+    def readfrom_mem_into(self, address, register, buf):
+        """Read len(buf) bytes from register onwards into buf (a bytearray or memoryview), in one transaction."""
+        self._count(address, len(buf) + 1)
+        self.i2c.readfrom_mem_into(address, register, buf)
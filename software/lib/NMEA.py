@@ -0,0 +1,83 @@
+# line based NMEA parser: works on the raw bytes of uart.readline(), validates the checksum without creating
+# strings, and only splits the sentences that are used (GGA for position / altitude / hdop, RMC for fix / date)
+# drop-in for the parts of MicropyGPS that were used: latitude, longitude, altitude, hdop, satellites and valid
+
+class NMEA:
+    def __init__(self):
+        self.latitude = 0.0                         # decimal degrees, negative for S
+        self.longitude = 0.0                        # decimal degrees, negative for W
+        self.altitude = 0.0                         # metres above mean sea level
+        self.hdop = 99.99
+        self.satellites = 0
+        self.fix_stat = 0                           # GGA fix quality: 0 no fix, 1 GPS fix, 2 DGPS fix
+        self.valid = False                          # RMC status: receiver has a valid fix
+        self.timestamp = (0, 0, 0)                  # UTC hours, minutes, seconds
+        self.date = (0, 0, 0)                       # day, month, year (two digits)
+
+    def update(self, line):
+        """Parse one line (bytes, as read from the UART). Returns True for a valid GGA or RMC sentence."""
+        if not line or line[0] != 0x24:             # '$'
+            return False
+        kind = line[3:6]
+        if kind != b'GGA' and kind != b'RMC':       # ignore all other sentences before doing any work
+            return False
+        end = line.find(b'*')
+        if end < 0 or len(line) < end + 3:
+            return False
+
+        crc = 0
+        for i in range(1, end):                     # indexing bytes gives ints, nothing is allocated
+            crc ^= line[i]
+        if crc != _hex(line[end + 1]) << 4 | _hex(line[end + 2]):
+            return False
+
+        try:
+            fields = line[7:end].decode().split(',')
+            if kind == b'GGA':
+                self._gga(fields)
+            else:
+                self._rmc(fields)
+        except (ValueError, IndexError):
+            return False
+        return True
+
+    def _gga(self, fields):
+        # time, lat, N/S, long, E/W, fix, satellites, hdop, altitude, M, geoid separation, M, ...
+        self.fix_stat = int(fields[5])
+        self.satellites = int(fields[6])
+        if fields[0]:
+            self.timestamp = _time(fields[0])
+        if self.fix_stat:
+            self.latitude = _degrees(fields[1], 2, fields[2] == 'S')
+            self.longitude = _degrees(fields[3], 3, fields[4] == 'W')
+            if fields[7]:
+                self.hdop = float(fields[7])
+            if fields[8]:
+                self.altitude = float(fields[8])
+
+    def _rmc(self, fields):
+        # time, status, lat, N/S, long, E/W, speed, course, date, ...
+        self.valid = fields[1] == 'A'
+        if fields[0]:
+            self.timestamp = _time(fields[0])
+        if fields[8]:
+            self.date = (int(fields[8][0:2]), int(fields[8][2:4]), int(fields[8][4:6]))
+        if self.valid:
+            self.latitude = _degrees(fields[2], 2, fields[3] == 'S')
+            self.longitude = _degrees(fields[4], 3, fields[5] == 'W')
+
+def _hex(byte):
+    """Value of an ASCII hex digit, or a value that never matches a checksum."""
+    if 0x30 <= byte <= 0x39:
+        return byte - 0x30
+    if 0x41 <= byte <= 0x46:
+        return byte - 0x37
+    return 0x100
+
+def _degrees(field, digits, negative):
+    """(d)ddmm.mmmm to decimal degrees."""
+    degrees = int(field[:digits]) + float(field[digits:]) / 60
+    return -degrees if negative else degrees
+
+def _time(field):
+    return int(field[0:2]), int(field[2:4]), float(field[4:])
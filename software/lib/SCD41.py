@@ -27,6 +27,11 @@ _SCD4X_MEASSINGLESHOTRHT = 0x2196
 _SCD4X_SLEEP = 0x36E0
 _SCD4X_WAKE = 0x36F6
 
+# single shot timing: the measurement takes (at most) 5 seconds, poll data_ready shortly before that
+_SINGLE_SHOT_POLL_MS = 4500
+_DATA_READY_POLL_MS = 50
+_SINGLE_SHOT_TIMEOUT_MS = 6000
+
 
 class SCD41:
     def __init__(self, i2c, address = SCD4X_DEFAULT_ADDR) -> None:
@@ -35,12 +40,18 @@ class SCD41:
         self._buffer = bytearray(18)
         self._cmd = bytearray(2)
         self._crc_buffer = bytearray(2)
+        view = memoryview(self._buffer)
+        self._value_cmd = view[:5]                  # command, value and CRC
+        self._replies = {3: view[:3], 9: view[:9]}  # one or three words, each followed by its CRC
 
         # cached readings
         self._temperature = None
         self._relative_humidity = None
         self._co2 = None
 
+        self._started = 0
+        self._ready = False
+
         try:
             self.stop_periodic_measurement()
         except:
@@ -185,10 +196,9 @@ class SCD41:
         return True
 
     def _send_command(self, cmd, cmd_delay = 0) -> None:
-        buffer = bytearray(2)
-        buffer[0] = (cmd >> 8) & 0xFF
-        buffer[1] = cmd & 0xFF
-        self.i2c.writeto(self.address, buffer)
+        self._cmd[0] = (cmd >> 8) & 0xFF
+        self._cmd[1] = cmd & 0xFF
+        self.i2c.writeto(self.address, self._cmd)
         time.sleep(cmd_delay)
 
     def _set_command_value(self, cmd, value, cmd_delay=0):
@@ -197,12 +207,13 @@ class SCD41:
         self._crc_buffer[0] = self._buffer[2] = (value >> 8) & 0xFF
         self._crc_buffer[1] = self._buffer[3] = value & 0xFF
         self._buffer[4] = self._crc8(self._crc_buffer)
-        self.i2c.writeto(self.address, self._buffer)
+        self.i2c.writeto(self.address, self._value_cmd)
         time.sleep(cmd_delay)
 
     def _read_reply(self, num):
-        self._buffer = self.i2c.readfrom(self.address, num)
-        self._check_buffer_crc(self._buffer[0:num])
+        reply = self._replies[num]
+        self.i2c.readfrom_into(self.address, reply)
+        self._check_buffer_crc(reply)
 
     @staticmethod
     def _crc8(buffer: bytearray) -> int:
@@ -226,8 +237,33 @@ class SCD41:
         self._send_command(_SCD4X_SLEEP, cmd_delay=0.001)
 
     def wake(self) -> None:
-        # sensor does not send an ACK on wake, so discard the error
+        # sensor does not send an ACK on wake, so discard the error (which also skips cmd_delay)
         try: 
-            self._send_command(_SCD4X_WAKE, cmd_delay=0.02)
+            self._send_command(_SCD4X_WAKE)
         except:
-            pass
\ No newline at end of file
+            pass
+        time.sleep(0.02)                            # the sensor accepts commands 20 ms after wake
+
+    def start(self) -> int:
+        """Wake the sensor and start a single shot measurement, return the time in milliseconds until the first poll."""
+        self.wake()
+        self.measure_single_shot()
+        self._started = time.ticks_ms()
+        self._ready = False
+        return _SINGLE_SHOT_POLL_MS
+
+    def poll(self) -> int:
+        """Check the data ready status, return 0 when the measurement has completed (or timed out)."""
+        self._ready = self.data_ready
+        if self._ready or time.ticks_diff(time.ticks_ms(), self._started) > _SINGLE_SHOT_TIMEOUT_MS:
+            return 0
+        return _DATA_READY_POLL_MS
+
+    def finish(self):
+        """Read the CO2 concentration (None if the measurement did not complete) and put the sensor to sleep."""
+        co2 = None
+        if self._ready:
+            self._read_data()
+            co2 = self._co2
+        self.sleep()
+        return co2
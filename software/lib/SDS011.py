@@ -13,6 +13,7 @@ Reading format. See http://cl.ly/ekot
 9 Tail     '\xab'
 """
 
+import time
 import struct
 
 _SDS011_CMDS = {'SET': b'\x01',
@@ -23,11 +24,21 @@ _SDS011_CMDS = {'SET': b'\x01',
         'SLEEPWAKE': b'\x06'}
 
 class SDS011:
-    def __init__(self, uart):
+    def __init__(self, uart, tolerance = 0.5, relative = 0.05, window = 5, min_ms = 10000, max_ms = 30000):
         self._uart = uart
         self._pm25 = 0.0
         self._pm10 = 0.0
 
+        # warm-up: readings are accepted once the last <window> readings (one per second) lie within
+        # <tolerance> ug/m^3 or <relative> of the value (whichever is larger), but not before min_ms after wake
+        self.tolerance = tolerance
+        self.relative = relative
+        self.window = window
+        self.min_ms = min_ms
+        self.max_ms = max_ms                # hard upper bound: accept whatever was read last
+        self._woken = None
+        self._samples = []
+
         self.set_reporting_mode_query()
 
     @property
@@ -43,10 +54,10 @@ class SDS011:
     def make_command(self, cmd, mode, param):
         header = b'\xaa\xb4'
         padding = b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\xff\xff'
-        checksum = chr(( ord(cmd) + ord(mode) + ord(param) + 255 + 255) % 256)
-        checksum = bytes(checksum, 'utf8')
+        data = bytes([ord(cmd), ord(mode), ord(param)])  # accept both str and bytes arguments
+        checksum = bytes([(sum(data) + 255 + 255) % 256])
         tail = b'\xab'
-        return header + cmd + mode + param + padding + checksum + tail
+        return header + data + padding + checksum + tail
 
     def get_response(self, command_ID):
         # try for 120 bytes (0.2) second to get a response from sensor (typical response time 12~33 bytes)
@@ -72,6 +83,8 @@ class SDS011:
         cmd = self.make_command(_SDS011_CMDS['SLEEPWAKE'],
                 _SDS011_CMDS['SET'], chr(1))
         self._uart.write(cmd)
+        self._woken = time.ticks_ms()
+        self._samples = []
         return self.get_response(b'\xc5')
 
     def sleep(self):
@@ -79,6 +92,7 @@ class SDS011:
         cmd = self.make_command(_SDS011_CMDS['SLEEPWAKE'],
                 _SDS011_CMDS['SET'], chr(0))
         self._uart.write(cmd)
+        self._woken = None
         return self.get_response(b'\xc5')
 
     def set_reporting_mode_query(self):
@@ -102,3 +116,34 @@ class SDS011:
     def read(self):
         self.query()                        # query measurement
         return self.get_response(b'\xc0')   # try to get values from the response
+
+    def _stable(self):
+        if len(self._samples) < self.window:
+            return False
+        for i in (0, 1):
+            values = [sample[i] for sample in self._samples]
+            if max(values) - min(values) > max(self.tolerance, self.relative * max(values)):
+                return False
+        return True
+
+    def start(self):
+        """Wake the sensor if necessary; returns the time until the first reading in ms."""
+        if self._woken is None:
+            self.wake()
+        return 1000
+
+    def poll(self):
+        """Read once per second until the readings have settled; returns 0 when done."""
+        if self.read():
+            self._samples.append((self._pm25, self._pm10))
+            if len(self._samples) > self.window:
+                self._samples.pop(0)
+        elapsed = time.ticks_diff(time.ticks_ms(), self._woken)
+        if elapsed >= self.max_ms or (elapsed >= self.min_ms and self._stable()):
+            return 0
+        return min(1000, self.max_ms - elapsed)
+
+    def finish(self):
+        """Stop fan and laser; returns (pm25, pm10)."""
+        self.sleep()
+        return self._pm25, self._pm10
@@ -33,21 +33,48 @@ class SSD1306:
         self.width = width
         self.height = height
         self.pages = self.height // 8
+        self._shown = bytearray(self.pages * width)     # GDDRAM contents of the pages in _known
+        self._known = 0                                 # bit mask of the pages whose GDDRAM matches _shown
+        self._dirty = 0                                 # bit mask of the pages drawn on since the last show
+        # views of every page in the buffer and in _shown, so show() compares and copies pages without allocating
+        drawn, shown = memoryview(self.buffer), memoryview(self._shown)
+        self._drawn = [drawn[1 + page * width:1 + (page + 1) * width] for page in range(self.pages)]
+        self._shown_pages = [shown[page * width:(page + 1) * width] for page in range(self.pages)]
+        self._cmd = bytearray(3)                        # Co=0, D/C=0: the rest of the transaction are commands
+        self._cmd1 = memoryview(self._cmd)[:2]          # a command without argument
+        self._window = bytearray((0x00, SET_COL_ADDR, 0, width - 1, SET_PAGE_ADDR, 0, self.pages - 1))
         self._power = False
         self.poweron()
         self.init_display()
 
-    def write_cmd(self, cmd) -> None:
-        buffer = bytearray(2)
-        buffer[0] = 0x80
-        buffer[1] = cmd
-        self.i2c.writeto(self.address, buffer)
+    def write_cmd(self, cmd, arg = None) -> None:
+        "Send a command, and its argument byte if given, in a single transaction."
+        self._cmd[1] = cmd
+        if arg is None:
+            self.i2c.writeto(self.address, self._cmd1)
+        else:
+            self._cmd[2] = arg
+            self.i2c.writeto(self.address, self._cmd)
 
-    def write_framebuf(self) -> None:
-        self.i2c.writeto(self.address, self.buffer)
+    def write_window(self, first, last) -> None:
+        "Set the GDDRAM window to the full width of pages first to last, in a single transaction."
+        self._window[5] = first
+        self._window[6] = last
+        self.i2c.writeto(self.address, self._window)
+
+    def write_framebuf(self, first = 0, last = None) -> None:
+        "Send pages first to last of the buffer as one data transaction."
+        if last is None:
+            last = self.pages - 1
+        start = first * self.width                  # the byte before the first page holds the control byte
+        previous = self.buffer[start]
+        self.buffer[start] = 0x40
+        self.i2c.writeto(self.address, memoryview(self.buffer)[start:(last + 1) * self.width + 1])
+        self.buffer[start] = previous
 
     def init_display(self) -> None:
-        for cmd in (
+        self.i2c.writeto(self.address, bytes((
+            0x00,  # Co=0, D/C=0: commands only
             SET_DISP | 0x00,  # off
             # address setting
             SET_MEM_ADDR, 0x00,  # Horizontal Addressing Mode
@@ -69,8 +96,8 @@ class SSD1306:
             SET_IREF_SELECT, 0x30,  # enable internal IREF during display on
             # charge pump
             SET_CHARGE_PUMP, 0x14,
-            SET_DISP | 0x01):  # display on
-            self.write_cmd(cmd)
+            SET_DISP | 0x01)))  # display on
+        self._known = 0                             # GDDRAM is undefined after power up
         self.fill(0)
         self.show()
 
@@ -91,22 +118,38 @@ class SSD1306:
 
     def contrast(self, contrast: int) -> None:
         """Adjust the contrast"""
-        self.write_cmd(SET_CONTRAST)
-        self.write_cmd(contrast)
+        self.write_cmd(SET_CONTRAST, contrast)
 
     def show(self) -> None:
-        xpos0 = 0
-        xpos1 = self.width - 1
-        self.write_cmd(SET_COL_ADDR)
-        self.write_cmd(xpos0)
-        self.write_cmd(xpos1)
-        self.write_cmd(SET_PAGE_ADDR)
-        self.write_cmd(0)
-        self.write_cmd(self.pages - 1)
-        self.write_framebuf()
-    
+        "Send the pages that were drawn on and changed since the last show; contiguous pages in one transaction."
+        if not self._power:                         # nothing visible: only the buffer is updated
+            return
+        changed = 0
+        for page in range(self.pages):              # a page redrawn with the same contents is not sent again
+            if self._dirty >> page & 1:
+                drawn, shown = self._drawn[page], self._shown_pages[page]
+                if not self._known >> page & 1 or drawn != shown:
+                    shown[:] = drawn
+                    changed |= 1 << page
+        self._known |= self._dirty
+        self._dirty = 0
+        page = 0
+        while page < self.pages:
+            if changed >> page & 1:
+                last = page
+                while changed >> (last + 1) & 1:
+                    last += 1
+                self.write_window(page, last)
+                self.write_framebuf(page, last)
+                page = last
+            page += 1
+
     def fill(self, col):
         self.framebuf.fill(col)
+        self._dirty = (1 << self.pages) - 1
 
     def text(self, string, x, y, col=1):
-        self.framebuf.text(string, x, y, col)
\ No newline at end of file
+        self.framebuf.text(string, x, y, col)
+        if string and -8 < y < self.height:         # characters are 8 rows high: rows y to y + 7
+            for page in range(max(0, y) >> 3, (min(y + 7, self.height - 1) >> 3) + 1):
+                self._dirty |= 1 << page
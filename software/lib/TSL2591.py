@@ -58,23 +58,14 @@ class TSL2591:
         self.sensor_id = sensor_id
         self.address = address
         self.i2c = i2c
+        self._buffer = bytearray(4)                 # CH0 and CH1 data, little endian
         self.integration_time = integration
         self.gain = gain
         self.set_timing(self.integration_time)
         self.set_gain(self.gain)
 
     def _write(self, register, value):
-        buffer = bytearray(2)
-        buffer[0] = register
-        buffer[1] = value
-        self.i2c.writeto(self.address, buffer)
-
-    def _read(self, register, length):
-        self.i2c.writeto(self.address, bytes([register & 0xFF]))
-        result = self.i2c.readfrom(self.address, length)
-        if length <= 2:
-            return int.from_bytes(result, 'little')
-        return result
+        self.i2c.write_reg(self.address, register, value)
 
     def set_timing(self, integration):
         self.integration_time = integration
@@ -140,14 +131,27 @@ class TSL2591:
                     ENABLE_POWEROFF
                     )
 
+    def start(self):
+        """Wake the sensor, return the stabilization time in milliseconds."""
+        self.wake()
+        self.lux                                    # don't ask why but the first read may do nothing
+        return 200
+
+    def poll(self):
+        return 0
+
+    def finish(self):
+        """Read the lux value and put the sensor to sleep."""
+        lux = self.lux
+        self.sleep()
+        return lux
+
     def get_full_luminosity(self):
         time.sleep(0.12 * self.integration_time)
-        full = self._read(
-                    COMMAND_BIT | REGISTER_CHAN0_LOW, 2
-                    )
-        ir = self._read(
-                    COMMAND_BIT | REGISTER_CHAN1_LOW, 2
-                    )                    
+        # both channels in one auto-increment read
+        self.i2c.readfrom_mem_into(self.address, COMMAND_BIT | REGISTER_CHAN0_LOW, self._buffer)
+        full = self._buffer[0] | (self._buffer[1] << 8)
+        ir = self._buffer[2] | (self._buffer[3] << 8)
         return full, ir
 
     def get_luminosity(self, channel):
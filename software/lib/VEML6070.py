@@ -31,6 +31,8 @@ class VEML6070:
         self.address_h = address + 1
 
         self.buf = bytearray(1)
+        self._low = bytearray(1)
+        self._high = bytearray(1)
         self.buf[0] = (
             self._ack << 5 | _VEML6070_INTEGRATION_TIME[self._it][0] << 2 | 0x02
         )
@@ -40,19 +42,19 @@ class VEML6070:
     def _write(self, buffer):
         self.i2c.writeto(self.address_cmd, buffer)
 
-    def _read(self, address, length):
-        return self.i2c.readfrom(address, length)
+    def _read(self, address, buffer):
+        self.i2c.readfrom_into(address, buffer)
 
     @property
     def uv_raw(self):
-        buflow = self._read(self.address_l, 1)
-        bufhigh = self._read(self.address_h, 1)
+        self._read(self.address_l, self._low)
+        self._read(self.address_h, self._high)
 
         # poll a second time: this looks like BS but it is necessary? :(
-        buflow = self._read(self.address_l, 1)
-        bufhigh = self._read(self.address_h, 1)
+        self._read(self.address_l, self._low)
+        self._read(self.address_h, self._high)
 
-        return bufhigh[0] << 8 | buflow[0]
+        return self._high[0] << 8 | self._low[0]
 
     @property
     def integration_time(self):
@@ -95,6 +97,25 @@ class VEML6070:
         )
         self._write(self.buf)
 
+    def start(self):
+        """
+        Wakes the VEML6070 and returns the stabilization time in milliseconds.
+        """
+        self.wake()
+        self.uv_raw                                 # don't ask why but the first read may do nothing
+        return 200
+
+    def poll(self):
+        return 0
+
+    def finish(self):
+        """
+        Reads the raw UV value and puts the VEML6070 back to sleep.
+        """
+        uv = self.uv_raw
+        self.sleep()
+        return uv
+
     def get_index(self, buf):
         adjusted = int(buf/1)
         for levels in _VEML6070_RISK_LEVEL:
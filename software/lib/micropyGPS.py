@@ -1,401 +0,0 @@
-"""
-# MicropyGPS - a GPS NMEA sentence parser for Micropython/Python 3.X
-# Copyright (c) 2017 Michael Calvin McCoy (calvin.mccoy@protonmail.com)
-# The MIT License (MIT) - see LICENSE file
-"""
-
-class MicropyGPS(object):
-    """GPS NMEA Sentence Parser. Creates object that stores all relevant GPS data and statistics.
-    Parses sentences one character at a time using update(). """
-
-    # Max Number of Characters a valid sentence can be (based on GGA sentence)
-    SENTENCE_LIMIT = 90
-    __HEMISPHERES = ('N', 'S', 'E', 'W')
-
-    def __init__(self, local_offset=0):
-        """
-        Setup GPS Object Status Flags, Internal Data Registers, etc
-            local_offset (int): Timzone Difference to UTC
-        """
-
-        # Object Status Flags
-        self.sentence_active = False
-        self.active_segment = 0
-        self.process_crc = False
-        self.gps_segments = []
-        self.crc_xor = 0
-        self.char_count = 0
-
-        # Data From Sentences
-        # Time
-        self.timestamp = [0, 0, 0]
-        self.date = [0, 0, 0]
-        self.local_offset = local_offset
-
-        # Position/Motion
-        self._latitude = [0, 0.0, 'N']
-        self._longitude = [0, 0.0, 'W']
-        self.speed = [0.0, 0.0, 0.0]
-        self.course = 0.0
-        self._altitude = 0.0
-
-        # GPS Info
-        self.satellites_in_use = 0
-        self._hdop = 99.99
-        self._valid = False
-        self.fix_stat = 0
-
-    # Coordinates Translation Functions
-    @property
-    def latitude(self):
-        """Format Latitude Data Correctly"""
-        decimal_degrees = self._latitude[0] + (self._latitude[1] / 60)
-        return decimal_degrees
-
-    @property
-    def longitude(self):
-        """Format Longitude Data Correctly"""
-        decimal_degrees = self._longitude[0] + (self._longitude[1] / 60)
-        return decimal_degrees
-
-    @property
-    def altitude(self):
-        return self._altitude
-
-    @property
-    def hdop(self):
-        return self._hdop
-
-    @property
-    def satellites(self):
-        return self.satellites_in_use
-
-    @property
-    def valid(self):
-        return self._valid
-
-    # Sentence Parsers
-    def gprmc(self):
-        """Parse Recommended Minimum Specific GPS/Transit data (RMC)Sentence.
-        Updates UTC timestamp, latitude, longitude, Course, Speed, Date, and fix status
-        """
-
-        # UTC Timestamp
-        try:
-            utc_string = self.gps_segments[1]
-
-            if utc_string:  # Possible timestamp found
-                hours = (int(utc_string[0:2]) + self.local_offset) % 24
-                minutes = int(utc_string[2:4])
-                seconds = float(utc_string[4:])
-                self.timestamp = (hours, minutes, seconds)
-            else:  # No Time stamp yet
-                self.timestamp = (0, 0, 0)
-
-        except ValueError:  # Bad Timestamp value present
-            return False
-
-        # Date stamp
-        try:
-            date_string = self.gps_segments[9]
-
-            # Date string printer function assumes to be year >=2000,
-            # date_string() must be supplied with the correct century argument to display correctly
-            if date_string:  # Possible date stamp found
-                day = int(date_string[0:2])
-                month = int(date_string[2:4])
-                year = int(date_string[4:6])
-                self.date = (day, month, year)
-            else:  # No Date stamp yet
-                self.date = (0, 0, 0)
-
-        except ValueError:  # Bad Date stamp value present
-            return False
-
-        # Check Receiver Data Valid Flag
-        if self.gps_segments[2] == 'A':  # Data from Receiver is Valid/Has Fix
-
-            # Longitude / Latitude
-            try:
-                # Latitude
-                l_string = self.gps_segments[3]
-                lat_degs = int(l_string[0:2])
-                lat_mins = float(l_string[2:])
-                lat_hemi = self.gps_segments[4]
-
-                # Longitude
-                l_string = self.gps_segments[5]
-                lon_degs = int(l_string[0:3])
-                lon_mins = float(l_string[3:])
-                lon_hemi = self.gps_segments[6]
-            except ValueError:
-                return False
-
-            if lat_hemi not in self.__HEMISPHERES:
-                return False
-
-            if lon_hemi not in self.__HEMISPHERES:
-                return False
-
-            # Speed
-            try:
-                spd_knt = float(self.gps_segments[7])
-            except ValueError:
-                return False
-
-            # Course
-            try:
-                if self.gps_segments[8]:
-                    course = float(self.gps_segments[8])
-                else:
-                    course = 0.0
-            except ValueError:
-                return False
-
-            # TODO - Add Magnetic Variation
-
-            # Update Object Data
-            self._latitude = [lat_degs, lat_mins, lat_hemi]
-            self._longitude = [lon_degs, lon_mins, lon_hemi]
-            # Include mph and hm/h
-            self.speed = [spd_knt, spd_knt * 1.151, spd_knt * 1.852]
-            self.course = course
-            self._valid = True
-
-        else:  # Clear Position Data if Sentence is 'Invalid'
-            self._latitude = [0, 0.0, 'N']
-            self._longitude = [0, 0.0, 'W']
-            self.speed = [0.0, 0.0, 0.0]
-            self.course = 0.0
-            self._valid = False
-
-        return True
-
-    def gpgll(self):
-        """Parse Geographic Latitude and Longitude (GLL)Sentence. Updates UTC timestamp, latitude,
-        longitude, and fix status"""
-
-        # UTC Timestamp
-        try:
-            utc_string = self.gps_segments[5]
-
-            if utc_string:  # Possible timestamp found
-                hours = (int(utc_string[0:2]) + self.local_offset) % 24
-                minutes = int(utc_string[2:4])
-                seconds = float(utc_string[4:])
-                self.timestamp = (hours, minutes, seconds)
-            else:  # No Time stamp yet
-                self.timestamp = (0, 0, 0)
-
-        except ValueError:  # Bad Timestamp value present
-            return False
-
-        # Check Receiver Data Valid Flag
-        if self.gps_segments[6] == 'A':  # Data from Receiver is Valid/Has Fix
-
-            # Longitude / Latitude
-            try:
-                # Latitude
-                l_string = self.gps_segments[1]
-                lat_degs = int(l_string[0:2])
-                lat_mins = float(l_string[2:])
-                lat_hemi = self.gps_segments[2]
-
-                # Longitude
-                l_string = self.gps_segments[3]
-                lon_degs = int(l_string[0:3])
-                lon_mins = float(l_string[3:])
-                lon_hemi = self.gps_segments[4]
-            except ValueError:
-                return False
-
-            if lat_hemi not in self.__HEMISPHERES:
-                return False
-
-            if lon_hemi not in self.__HEMISPHERES:
-                return False
-
-            # Update Object Data
-            self._latitude = [lat_degs, lat_mins, lat_hemi]
-            self._longitude = [lon_degs, lon_mins, lon_hemi]
-            self._valid = True
-
-        else:  # Clear Position Data if Sentence is 'Invalid'
-            self._latitude = [0, 0.0, 'N']
-            self._longitude = [0, 0.0, 'W']
-            self._valid = False
-
-        return True
-
-    def gpgga(self):
-        """Parse Global Positioning System Fix Data (GGA) Sentence. Updates UTC timestamp, latitude, longitude,
-        fix status, satellites in use, Horizontal Dilution of Precision (HDOP), altitude, geoid height and fix status"""
-
-        try:
-            # UTC Timestamp
-            utc_string = self.gps_segments[1]
-
-            # Skip timestamp if receiver doesn't have on yet
-            if utc_string:
-                hours = (int(utc_string[0:2]) + self.local_offset) % 24
-                minutes = int(utc_string[2:4])
-                seconds = float(utc_string[4:])
-            else:
-                hours = 0
-                minutes = 0
-                seconds = 0.0
-
-            # Number of Satellites in Use
-            satellites_in_use = int(self.gps_segments[7])
-
-            # Get Fix Status
-            fix_stat = int(self.gps_segments[6])
-
-        except (ValueError, IndexError):
-            return False
-
-        try:
-            # Horizontal Dilution of Precision
-            hdop = float(self.gps_segments[8])
-        except (ValueError, IndexError):
-            hdop = 0.0
-
-        # Process Location and Speed Data if Fix is GOOD
-        if fix_stat:
-
-            # Longitude / Latitude
-            try:
-                # Latitude
-                l_string = self.gps_segments[2]
-                lat_degs = int(l_string[0:2])
-                lat_mins = float(l_string[2:])
-                lat_hemi = self.gps_segments[3]
-
-                # Longitude
-                l_string = self.gps_segments[4]
-                lon_degs = int(l_string[0:3])
-                lon_mins = float(l_string[3:])
-                lon_hemi = self.gps_segments[5]
-            except ValueError:
-                return False
-
-            if lat_hemi not in self.__HEMISPHERES:
-                return False
-
-            if lon_hemi not in self.__HEMISPHERES:
-                return False
-
-            # Altitude / Height Above Geoid
-            try:
-                altitude = float(self.gps_segments[9])
-            except ValueError:
-                altitude = 0
-
-            # Update Object Data
-            self._latitude = [lat_degs, lat_mins, lat_hemi]
-            self._longitude = [lon_degs, lon_mins, lon_hemi]
-            self._altitude = altitude
-
-        # Update Object Data
-        self.timestamp = [hours, minutes, seconds]
-        self.satellites_in_use = satellites_in_use
-        self._hdop = hdop
-        self.fix_stat = fix_stat
-
-        return True
-
-    def new_sentence(self):
-        """Adjust Object Flags in Preparation for a New Sentence"""
-        self.gps_segments = ['']
-        self.active_segment = 0
-        self.crc_xor = 0
-        self.sentence_active = True
-        self.process_crc = True
-        self.char_count = 0
-
-    def update(self, new_char):
-        """Process a new input char and updates GPS object if necessary based on special characters ('$', ',', '*')
-        Function builds a list of received string that are validate by CRC prior to parsing by the  appropriate
-        sentence function. Returns sentence type on successful parse, None otherwise"""
-
-        valid_sentence = False
-
-        # Validate new_char is a printable char
-        ascii_char = ord(new_char)
-
-        if 10 <= ascii_char <= 126:
-            self.char_count += 1
-
-            # Check if a new string is starting ($)
-            if new_char == '$':
-                self.new_sentence()
-                return None
-
-            elif self.sentence_active:
-
-                # Check if sentence is ending (*)
-                if new_char == '*':
-                    self.process_crc = False
-                    self.active_segment += 1
-                    self.gps_segments.append('')
-                    return None
-
-                # Check if a section is ended (,), Create a new substring to feed
-                # characters to
-                elif new_char == ',':
-                    self.active_segment += 1
-                    self.gps_segments.append('')
-
-                # Store All Other printable character and check CRC when ready
-                else:
-                    self.gps_segments[self.active_segment] += new_char
-
-                    # When CRC input is disabled, sentence is nearly complete
-                    if not self.process_crc:
-
-                        if len(self.gps_segments[self.active_segment]) == 2:
-                            try:
-                                final_crc = int(self.gps_segments[self.active_segment], 16)
-                                if self.crc_xor == final_crc:
-                                    valid_sentence = True
-                            except ValueError:
-                                pass  # CRC Value was deformed and could not have been correct
-
-                # Update CRC
-                if self.process_crc:
-                    self.crc_xor ^= ascii_char
-
-                # If a Valid Sentence Was received and it's a supported sentence, then parse it!!
-                if valid_sentence:
-                    self.sentence_active = False  # Clear Active Processing Flag
-
-                    if self.gps_segments[0] in self.supported_sentences:
-
-                        # parse the Sentence Based on the message type, return True if parse is clean
-                        if self.supported_sentences[self.gps_segments[0]](self):
-
-                            # Let host know that the GPS object was updated by returning parsed sentence type
-                            return self.gps_segments[0]
-
-                # Check that the sentence buffer isn't filling up with Garage waiting for the sentence to complete
-                if self.char_count > self.SENTENCE_LIMIT:
-                    self.sentence_active = False
-
-        # Tell Host no new sentence was parsed
-        return None
-
-    def date_string(self, century = 20):
-        """
-        01/11/2014 (DD/MM/YYYY)
-        :return: date_string  string with short format date with padded zeroes
-        """
-
-        return "{:0>2}/{:0>2}/{}{:0>2}".format(self.date[0], self.date[1], century, self.date[2])
-
-    # All the currently supported NMEA sentences
-    supported_sentences = {'GPRMC': gprmc, 'GLRMC': gprmc,
-                           'GPGGA': gpgga, 'GLGGA': gpgga,
-                           'GPGLL': gpgll, 'GLGLL': gpgll,
-                           'GNGGA': gpgga, 'GNRMC': gprmc, 
-                           'GNGLL': gpgll,
-                          }
\ No newline at end of file
@@ -0,0 +1,68 @@
+# link quality from the SNR of received downlinks (ACKs of confirmed probes and any other downlink), kept in NVS
+# the data SF is the lowest SF whose required demodulation SNR is at least MARGIN below the best recent SNR, like the
+# LoRaWAN ADR algorithm of the network server; the SNR hardly depends on the SF, as the bandwidth stays 125 kHz
+# the fair use budget may lower the SF down to the floor: the lowest SF that would have received the worst recent SNR
+# TTN allows 10 downlinks per day, so a confirmed probe is sent at most once every PROBE_S seconds
+import struct
+import time
+import storage
+
+_REQUIRED_SNR = {7: -7.5, 8: -10.0, 9: -12.5, 10: -15.0, 11: -17.5, 12: -20.0}  # dB, SX1276 datasheet
+MARGIN = 10                                         # dB, the default installation margin of the LoRaWAN ADR algorithm
+PROBE_S = 3 * 3600
+SAMPLES = 8                                         # SNR of the last 8 downlinks
+_KEY = 'link'
+_FORMAT = '>IBB8b'                                  # time of the last probe, number of samples, probe missed, samples
+
+class Link:
+    def __init__(self):
+        self._blob = storage.load(_KEY)
+        if self._blob is None or len(self._blob) != struct.calcsize(_FORMAT):
+            self._blob = None
+            self._probed, self._count, self.missed, self._samples = 0, 0, False, [0] * SAMPLES
+        else:
+            values = struct.unpack(_FORMAT, self._blob)
+            self._probed, self._count, self.missed, self._samples = values[0], values[1], bool(values[2]), list(values[3:])
+
+    def probe_due(self):
+        """Is it time for a confirmed uplink? Also after the RTC was lost, as the time that passed is unknown."""
+        now = time.time()
+        return now < self._probed or now - self._probed >= PROBE_S
+
+    def probed(self, answered):
+        """Note that a probe was sent, and whether it was answered."""
+        self._probed = time.time()
+        self.missed = not answered
+
+    def record(self, snr):
+        """Add the SNR of a received downlink."""
+        self._samples = [max(-128, min(127, round(snr)))] + self._samples[:-1]    # newest first
+        self._count = min(self._count + 1, SAMPLES)
+        self.missed = False
+
+    def sf(self, highest):
+        """Lowest SF with MARGIN dB to spare, at most highest; None without samples or after an unanswered probe."""
+        if self.missed or not self._count:
+            return None
+        snr = max(self._samples[:self._count])
+        for sf in range(7, highest):
+            if snr - _REQUIRED_SNR[sf] >= MARGIN:
+                return sf
+        return highest
+
+    def floor(self, highest, configured):
+        """Lowest SF that would have received every recent downlink, at most highest; the configured SF (sf_l) without
+        samples or after an unanswered probe, as only a known good link may lower the SF."""
+        if self.missed or not self._count:
+            return configured
+        snr = min(self._samples[:self._count])
+        for sf in range(7, highest):
+            if snr >= _REQUIRED_SNR[sf]:
+                return sf
+        return highest
+
+    def save(self):
+        blob = struct.pack(_FORMAT, self._probed, self._count, int(self.missed), *self._samples)
+        if blob != self._blob:
+            storage.save(_KEY, blob, self._blob)
+            self._blob = blob
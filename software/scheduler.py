@@ -0,0 +1,67 @@
+# cooperative scheduler to overlap the conversion times of several sensors
+# tasks are plain generators that yield the number of milliseconds they want to wait,
+# which keeps them portable between MicroPython (uasyncio style) and CPython
+import time
+
+try:
+    from machine import sleep as _sleep                     # light sleep on the LoPy4
+except ImportError:
+    def _sleep(ms):                                         # CPython fallback
+        time.sleep(ms / 1000)
+
+try:
+    _ticks_ms = time.ticks_ms
+    _ticks_add = time.ticks_add
+    _ticks_diff = time.ticks_diff
+except AttributeError:                                      # CPython fallback
+    def _ticks_ms():
+        return int(time.monotonic() * 1000)
+    def _ticks_add(ticks, delta):
+        return ticks + delta
+    def _ticks_diff(new, old):
+        return new - old
+
+def sensor_task(sensor, store):
+    """Drive a sensor through its start / poll / finish steps and hand the result to store().
+    start() and poll() return the number of milliseconds until the next poll, or 0 when done."""
+    delay = sensor.start()
+    while delay:
+        yield delay
+        delay = sensor.poll()
+    store(sensor.finish())
+
+class Scheduler:
+    def __init__(self):
+        self._tasks = []                                    # list of [due time, generator]
+
+    def add(self, task, delay = 0):
+        self._tasks.append([_ticks_add(_ticks_ms(), delay), task])
+
+    def start(self, task):
+        """Advance a task up to its first wait right away, so it runs in the shadow of the code before run()."""
+        try:
+            delay = next(task)
+        except StopIteration:
+            return
+        self.add(task, delay)
+
+    def run(self):
+        """Run all tasks until completion, sleeping whenever no task is due."""
+        while self._tasks:
+            # find the task that is due first (tasks are few, so a linear search is fastest)
+            entry = self._tasks[0]
+            for other in self._tasks:
+                if _ticks_diff(other[0], entry[0]) < 0:
+                    entry = other
+
+            wait = _ticks_diff(entry[0], _ticks_ms())
+            if wait > 0:
+                _sleep(wait)
+
+            try:
+                delay = next(entry[1])
+            except StopIteration:
+                self._tasks.remove(entry)
+                continue
+
+            entry[0] = _ticks_add(_ticks_ms(), delay)
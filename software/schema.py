@@ -0,0 +1,146 @@
+# single definition of the measurement fields, the frames they are sent in and how they are shown on the display
+# the firmware packer (LoRa.py), the host decoder and the TTN payload formatter (extras/payload.py) are all derived
+# from these tables; add a version to LAYOUTS for every change to a frame, and regenerate extras/ttn_formatter.js
+# (python payload.py --roundtrip fails while it is stale)
+VERSION = 2                                                         # the newest version in LAYOUTS
+
+BYTES = { # bytes, offset, precision
+        'temp' : (2, 100, 0.01  ),
+        'pres' : (2,   0, 0.1   ),
+        'humi' : (1,   0, 0.5   ),
+        'voc'  : (2,   0, 1     ),
+        'uv'   : (2,   0, 1     ),
+        'lx'   : (2,   0, 1     ),
+        'volu' : (1,   0, 0.5   ),
+        'batt' : (2,   0, 0.001 ),
+        'co2'  : (2,   0, 0.1   ),
+        'pm25' : (2,   0, 0.1   ),
+        'pm10' : (2,   0, 0.1   ),
+        'lat'  : (3,  90, 0.0001),
+        'long' : (3, 180, 0.0001),
+        'alt'  : (2, 100, 0.1   ),
+        'hdop' : (1,   0, 0.1   ),
+        'fw'   : (1,   0, 1     ),
+        'gpsq' : (1,   0, 1     ),
+        'miss' : (1,   0, 1     ),
+        'error': (1, 128, 1     )
+}
+
+# bit-packed alternative (fport 5 and 6): every field gets the minimum number of bits for its range and precision
+BITS = { # bits, offset, precision
+        'temp' : (14,  40, 0.01  ),                                 # -40 .. 123.83 C
+        'pres' : (13,-300, 0.1   ),                                 # 300 .. 1119.1 hPa
+        'humi' : ( 8,   0, 0.5   ),                                 # 0 .. 127.5 %
+        'voc'  : (16,   0, 1     ),
+        'uv'   : (16,   0, 1     ),
+        'lx'   : (16,   0, 1     ),
+        'volu' : ( 8,   0, 0.5   ),                                 # 0 .. 127.5 dB
+        'batt' : (11,-2.5, 0.001 ),                                 # 2.5 .. 4.547 V
+        'co2'  : (13,   0, 1     ),                                 # 0 .. 8191 ppm (the SCD41 reports whole ppm)
+        'pm25' : (14,   0, 0.1   ),                                 # 0 .. 1638.3 ug/m3 (the SDS011 goes up to 999.9)
+        'pm10' : (14,   0, 0.1   ),
+        'lat'  : (21,  90, 0.0001),                                 # -90 .. 119.7151
+        'long' : (22, 180, 0.0001),                                 # -180 .. 239.4303
+        'alt'  : (14, 100, 0.1   ),                                 # -100 .. 1538.3 m
+        'hdop' : ( 8,   0, 0.1   ),
+        'fw'   : ( 7,   0, 1     ),
+        'gpsq' : ( 2,   0, 1     ),
+        'miss' : ( 8,   0, 1     ),                                 # a bit per field of MISSING
+        'age'  : (12,   0, 1     )                                  # minutes before the uplink, 4095: unknown
+}
+
+# measurements that can be missing (None: the sensor did not answer in time): such a value is sent as 0, and bit i of
+# the miss field marks MISSING[i] as missing, so the decoders return None (null) for it; before version 2, a CO2
+# timeout went out as 0 ppm
+MISSING = ('co2',)
+
+# the fields of each fport, in the order of the frame, for every version of the schema: a layout is never changed in
+# place, but added as a new version (with all fports), so the decoders keep decoding the frames of boxes that still
+# run older firmware; they tell the versions apart by the length of the frame, so every version needs another length
+# the encoding of a field (BYTES, BITS) is never changed either: a field with a different encoding gets a new name
+LAYOUTS = {
+        0: {1: ('temp', 'humi', 'pres', 'voc', 'lx', 'uv', 'volu', 'batt', 'co2', 'pm25', 'pm10'),
+            2: ('temp', 'humi', 'pres', 'voc', 'lx', 'uv', 'volu', 'batt', 'co2', 'pm25', 'pm10',
+                'lat', 'long', 'alt', 'hdop', 'fw'),                # before the GPS quality byte: 30 bytes
+            4: ('fw', 'error', 'batt') },
+        1: {1: ('temp', 'humi', 'pres', 'voc', 'lx', 'uv', 'volu', 'batt', 'co2', 'pm25', 'pm10'),
+            2: ('temp', 'humi', 'pres', 'voc', 'lx', 'uv', 'volu', 'batt', 'co2', 'pm25', 'pm10',
+                'lat', 'long', 'alt', 'hdop', 'fw', 'gpsq'),
+            4: ('fw', 'error', 'batt'),
+            5: ('temp', 'humi', 'pres', 'voc', 'lx', 'uv', 'volu', 'batt', 'co2', 'pm25', 'pm10'),
+            6: ('temp', 'humi', 'pres', 'voc', 'lx', 'uv', 'volu', 'batt', 'co2', 'pm25', 'pm10',
+                'lat', 'long', 'alt', 'hdop', 'fw', 'gpsq'),
+            7: ('temp', 'humi', 'pres', 'voc', 'lx', 'uv', 'volu', 'batt', 'co2', 'pm25', 'pm10', 'age') },
+        2: {1: ('temp', 'humi', 'pres', 'voc', 'lx', 'uv', 'volu', 'batt', 'co2', 'pm25', 'pm10', 'miss'),
+            2: ('temp', 'humi', 'pres', 'voc', 'lx', 'uv', 'volu', 'batt', 'co2', 'pm25', 'pm10',
+                'lat', 'long', 'alt', 'hdop', 'fw', 'gpsq', 'miss'),
+            4: ('fw', 'error', 'batt'),
+            5: ('temp', 'humi', 'pres', 'voc', 'lx', 'uv', 'volu', 'batt', 'co2', 'pm25', 'pm10', 'miss'),
+            6: ('temp', 'humi', 'pres', 'voc', 'lx', 'uv', 'volu', 'batt', 'co2', 'pm25', 'pm10',
+                'lat', 'long', 'alt', 'hdop', 'fw', 'gpsq', 'miss'),
+            7: ('temp', 'humi', 'pres', 'voc', 'lx', 'uv', 'volu', 'batt', 'co2', 'pm25', 'pm10', 'miss', 'age') }
+}
+FIELDS = LAYOUTS[VERSION]                                           # the frames this firmware sends
+PACKED = {1: 5, 2: 6}                                               # fport of the bit-packed version of a frame
+BIT_PACKED = (5, 6, 7)
+BATCH = 7                                                           # batch of records: number of records, then the records
+
+DISPLAY = { # line on the display (16 characters), decimals (None: whole number)
+        'temp' : ("Temp: {:> 6} C",    1   ),
+        'pres' : ("Druk:{:> 6} hPa",   1   ),
+        'humi' : ("Vocht: {:> 5} %",   1   ),
+        'lx'   : ("Licht: {:> 5} lx",  None),
+        'uv'   : ("UV: {:> 8}",        None),
+        'volu' : ("Volume: {:> 4} dB", None),
+        'voc'  : ("VOC: {:> 7}",       None),
+        'co2'  : ("CO2: {:> 7} ppm",   None),
+        'pm25' : ("PM2.5: {:> 5} ppm", 1   ),
+        'pm10' : ("PM10: {:> 6} ppm",  1   )
+}
+
+def layout(fport, version = VERSION):
+    """Resolve the fields of a fport in a version of the schema into (key, bit position, bits, offset, precision,
+    maximum), and return them with the frame size in bytes. The byte aligned fports are laid out the same way, as
+    multiples of 8 bits."""
+    packed = fport in BIT_PACKED
+    fields = []
+    position = 0
+    for key in LAYOUTS[version][fport]:
+        length, offset, precision = BITS[key] if packed else BYTES[key]
+        bits = length if packed else 8 * length
+        fields.append((key, position, bits, offset, precision, (1 << bits) - 1))
+        position += bits
+    return tuple(fields), (position + 7) // 8
+
+def pack(buffer, start, fields, values):
+    """Write the fields (from layout) into a zeroed buffer, starting at bit start; missing values are 0, and None
+    (a field of MISSING) is 0 as well, marked in the miss field."""
+    for key, position, bits, offset, precision, maximum in fields:
+        value = missing(values) if key == 'miss' else values.get(key, 0)
+        if value is None:
+            value = 0
+        value = round((value + offset) / precision)                 # add offset, then round to precision
+        value = max(0, min(value, maximum))                         # stay in range 0 .. 2**bits - 1
+        position += start
+        while bits:                                                 # most significant bits first, up to a byte at a time
+            index = position >> 3
+            free = 8 - (position & 7)                               # bits left in this byte
+            n = min(free, bits)
+            bits -= n
+            buffer[index] |= ((value >> bits) & ((1 << n) - 1)) << (free - n)
+            position += n
+
+def missing(values):
+    """Value of the miss field: bit i is set if MISSING[i] is None in values."""
+    mask = 0
+    for i, key in enumerate(MISSING):
+        if key in values and values[key] is None:
+            mask |= 1 << i
+    return mask
+
+def text(key, value):
+    """Line on the display for a measurement ('-' without a value)."""
+    line, decimals = DISPLAY[key]
+    if value is None:
+        return line.replace('{:> ', '{:>').format('-')              # the sign option is only for numbers
+    return line.format(round(value) if decimals is None else round(value, decimals))
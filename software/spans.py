@@ -0,0 +1,80 @@
+# lightweight per-phase timing of the wake cycle, kept in NVS across deepsleep
+# every cycle produces one fixed-size record (milliseconds per phase); the last RECORDS cycles are kept in a ring,
+# whose position is kept in two registers, so that saving a cycle only writes the words of its own record
+import time
+import struct
+import storage
+import config
+
+# phases of a wake cycle; sensor phases run concurrently and may overlap
+BOOT, SETUP, BME680, TSL2591, VEML6070, MAX4466, KP26650, SCD41, SDS011, GPS, SEND, DISPLAY = range(12)
+NAMES = ('boot', 'setup', 'bme680', 'tsl2591', 'veml6070', 'max4466', 'kp26650', 'scd41', 'sds011', 'gps', 'send', 'display')
+PHASES = len(NAMES)
+RECORDS = 8                                         # number of cycles kept in NVS
+NOT_RUN = 0xFFFF                                    # marker for a phase that did not occur in a cycle
+_KEY = 'spans'
+_NEXT = 'spnext'                                    # next record to write
+_COUNT = 'spcount'                                  # number of valid records
+_FORMAT = '>' + 'H' * PHASES
+_SIZE = 2 * PHASES                                  # bytes per record
+
+class Spans:
+    def __init__(self):
+        self._start = [0] * PHASES
+        self._us = [-1] * PHASES                    # accumulated microseconds, -1 if not run
+        self._us[BOOT] = time.ticks_us()            # ticks start at reset, so this is the boot time
+
+    def enter(self, phase):
+        self._start[phase] = time.ticks_us()
+
+    def exit(self, phase):
+        self._us[phase] = max(0, self._us[phase]) + time.ticks_diff(time.ticks_us(), self._start[phase])
+
+    def timed(self, phase, task):
+        """Wrap a scheduler task (generator) in an enter / exit pair."""
+        self.enter(phase)
+        yield from task
+        self.exit(phase)
+
+    def record(self):
+        """Return this cycle as a record of milliseconds per phase."""
+        return [NOT_RUN if us < 0 else min(NOT_RUN - 1, us // 1000) for us in self._us]
+
+    def save(self):
+        """Write the record of this cycle over the oldest one in the ring in NVS."""
+        if storage.get(_KEY) != _SIZE * RECORDS:    # first use, or an older layout
+            storage.allocate(_KEY, _SIZE * RECORDS)
+            config.put(_NEXT, 0)
+            config.put(_COUNT, 0)
+        index = config.get(_NEXT, 0)
+        storage.write(_KEY, _SIZE * index, struct.pack(_FORMAT, *self.record()))
+        config.put(_NEXT, (index + 1) % RECORDS)
+        config.put(_COUNT, min(RECORDS, config.get(_COUNT, 0) + 1))
+
+def history():
+    """Return the stored records, oldest first."""
+    if storage.get(_KEY) != _SIZE * RECORDS:
+        return []
+    index, count = config.get(_NEXT, 0), config.get(_COUNT, 0)
+    return [struct.unpack(_FORMAT, storage.read(_KEY, _SIZE * ((index - count + n) % RECORDS), _SIZE))
+            for n in range(count)]
+
+def summary():
+    """Diagnostics frame: number of records, then mean and maximum milliseconds per phase (uint16 each)."""
+    records = history()
+    frame = bytearray(1 + 4 * PHASES)
+    frame[0] = len(records)
+    for phase in range(PHASES):
+        values = [record[phase] for record in records if record[phase] != NOT_RUN]
+        if values:
+            struct.pack_into('>HH', frame, 1 + 4 * phase, sum(values) // len(values), max(values))
+        else:
+            struct.pack_into('>HH', frame, 1 + 4 * phase, NOT_RUN, NOT_RUN)
+    return frame
+
+def dump(path):
+    """Write the stored records as CSV (milliseconds, empty if the phase did not run)."""
+    with open(path, 'w') as f:
+        f.write(','.join(NAMES) + '\n')
+        for record in history():
+            f.write(','.join('' if ms == NOT_RUN else str(ms) for ms in record) + '\n')
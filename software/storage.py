@@ -0,0 +1,69 @@
+# store small binary blobs in NVS, which survives deepsleep and power cycles
+# Pycom NVS only holds 32-bit integers, so a blob is split into words: <key> holds the length, <key>0.. the data
+# only words that changed are written, as every NVS write costs flash wear and time
+import pycom
+
+def get(key, default = None):
+    """Return the NVS register key, or default if it was never set."""
+    try:
+        value = pycom.nvs_get(key)
+    except ValueError:                              # some firmware versions raise on unknown keys
+        value = None
+    return default if value is None else value
+
+def load(key):
+    """Return the blob stored under key as bytearray, or None if there is none."""
+    length = get(key)
+    if length is None:
+        return None
+    data = bytearray(length)
+    for i in range(0, length, 4):
+        word = get(key + str(i // 4))
+        if word is None:
+            return None
+        for j in range(min(4, length - i)):
+            data[i + j] = (word >> (24 - 8 * j)) & 0xFF
+    return data
+
+def save(key, data, old = None):
+    """Store data under key (at most 12 characters). Pass the previously loaded blob as old to skip reading it."""
+    if old is None:
+        old = load(key)
+    if old is None or len(old) != len(data):
+        old = None
+        pycom.nvs_set(key, len(data))
+    for i in range(0, len(data), 4):
+        if old is not None and old[i:i + 4] == data[i:i + 4]:
+            continue
+        word = 0
+        for j in range(4):
+            word = (word << 8) | (data[i + j] if i + j < len(data) else 0)
+        pycom.nvs_set(key + str(i // 4), word)
+
+def allocate(key, length):
+    """Set the length of the blob stored under key without writing its data, for blobs that are only accessed with
+    read() and write(): words that were never written read as 0."""
+    pycom.nvs_set(key, length)
+
+def read(key, offset, length):
+    """Return length bytes of the blob stored under key from offset on, reading only the words they cover."""
+    data = bytearray(length)
+    for i in range(offset - offset % 4, offset + length, 4):
+        word = get(key + str(i // 4), 0)
+        for j in range(4):
+            if 0 <= i + j - offset < length:
+                data[i + j - offset] = (word >> (24 - 8 * j)) & 0xFF
+    return data
+
+def write(key, offset, data):
+    """Write data into the blob stored under key from offset on, without loading the rest of the blob: only the words
+    that data covers are written (and read, if data covers them partly). The blob must already be long enough."""
+    for w in range(offset // 4, (offset + len(data) + 3) // 4):
+        word = 0
+        if w * 4 < offset or w * 4 + 4 > offset + len(data):
+            word = get(key + str(w), 0)
+        for j in range(4):
+            i = w * 4 + j - offset
+            if 0 <= i < len(data):
+                word = (word & ~(0xFF << (24 - 8 * j))) | (data[i] << (24 - 8 * j))
+        pycom.nvs_set(key + str(w), word)
@@ -2,6 +2,8 @@ import machine
 import pycom
 import os
 import secret
+import spans
+import config
 
 BLOCKSIZE = const(4096)
 
@@ -32,6 +34,12 @@ def check_SD(display):
 	display.text(ret, 1, 41)
 	display.show()
 
+	# dump the wake cycle timing records for analysis
+	try:
+		spans.dump('/sd/spans_{:>02}.csv'.format(config.get('node')))
+	except:
+		pass
+
 	# prepare for safe SD card removal
 	os.umount('/sd')
 	sd.deinit()
@@ -68,7 +76,7 @@ def check_firmware():
 		return ("No firmware", 0)
 
 	# check if firmware file has identical size to last update (approx. zero chance randomly)
-	if filesize == pycom.nvs_get('fwsize'):
+	if filesize == config.get('fwsize'):
 		return ("Same firmware", 0)
 
 	return ("New firmware", filesize)
@@ -97,7 +105,7 @@ def do_firmware(display, filesize):
 					last_prog = prog                # update old value
 				chunk = f.readinto(buffer)
 			pycom.ota_finish()                  	# finish Over The Air update
-			pycom.nvs_set('fwsize', filesize)		# save firmware filesize in NVRAM
+			config.put('fwsize', filesize)			# save firmware filesize in NVRAM (written before the reboot)
 		return "Update done"
 	except:
 		return "Update failed"
\ No newline at end of file